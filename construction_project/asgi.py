@@ -3,6 +3,13 @@ ASGI config for construction_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+In production it is served by gunicorn with uvicorn workers (see render.yaml):
+
+    gunicorn construction_project.asgi:application \
+        --worker-class uvicorn_worker.UvicornWorker --workers 2
+
+Locally, ``uvicorn construction_project.asgi:application --reload`` works too.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
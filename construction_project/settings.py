@@ -45,6 +45,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'ledger.tracking.change_tracking_middleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -61,6 +62,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'ledger.projects.projects',
             ],
         },
     },
@@ -74,10 +76,74 @@ WSGI_APPLICATION = 'construction_project.wsgi.application'
 
 DATABASES = {
     'default': dj_database_url.config(
-        default=f'sqlite:///{BASE_DIR / "db.sqlite3"}'
+        default=f'sqlite:///{BASE_DIR / "db.sqlite3"}',
+        conn_max_age=int(os.environ.get('DB_CONN_MAX_AGE', '0')),
+        conn_health_checks=os.environ.get('DB_CONN_HEALTH_CHECKS', 'True').lower() in ('true', '1', 'yes'),
     )
 }
 
+# Native psycopg connection pool (PostgreSQL with psycopg 3). Prefer this over
+# DB_CONN_MAX_AGE when serving through ASGI, where each request may run on a
+# different thread and persistent per-thread connections are not reused.
+if (
+    os.environ.get('DB_POOL', 'False').lower() in ('true', '1', 'yes')
+    and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql'
+):
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+        'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+        'timeout': int(os.environ.get('DB_POOL_TIMEOUT', '10')),
+    }
+
+
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# Set REDIS_URL (requires the redis package) so every worker shares one cache;
+# the per-process default is fine for a single worker.
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Answer dashboard and entry_list totals from numpy arrays held in each
+# process (requires numpy; see ledger/engine.py). Set REDIS_URL as well when
+# running several processes so they all see ledger changes.
+LEDGER_VECTOR_ENGINE = os.environ.get('LEDGER_VECTOR_ENGINE', 'False').lower() in ('true', '1', 'yes')
+
+# Past this many suppliers, supplier selectors list only the selected one and
+# search the rest as the user types (see ledger/choices.py).
+LEDGER_SUPPLIER_SELECT_LIMIT = int(os.environ.get('LEDGER_SUPPLIER_SELECT_LIMIT', '200'))
+
+# Load the logged-in user from the cache instead of the database on every
+# request (see ledger/permissions.py). On by default only with a shared
+# cache, so a deactivated user is logged out by every worker at once.
+LEDGER_CACHE_USERS = os.environ.get(
+    'LEDGER_CACHE_USERS', 'True' if os.environ.get('REDIS_URL') else 'False',
+).lower() in ('true', '1', 'yes')
+
+
+# Answer permission checks from the cache (see ledger/permissions.py). On by
+# default only with a shared cache, so a revoked permission or membership
+# applies on every worker at once.
+LEDGER_CACHE_PERMISSIONS = os.environ.get(
+    'LEDGER_CACHE_PERMISSIONS', 'True' if os.environ.get('REDIS_URL') else 'False',
+).lower() in ('true', '1', 'yes')
+
+# The model backend, plus the caching that LEDGER_CACHE_USERS and
+# LEDGER_CACHE_PERMISSIONS turn on.
+AUTHENTICATION_BACKENDS = ['ledger.permissions.CachedModelBackend']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -115,9 +181,35 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+# Hashed (fingerprinted) files are served with a far-future, immutable
+# Cache-Control header by WhiteNoise; this applies to the unhashed originals.
+WHITENOISE_MAX_AGE = 60 * 60 * 24 if not DEBUG else 0
+
+# Uploaded workbooks and job results. The run_jobs worker must see the same
+# directory as the web process.
+MEDIA_ROOT = Path(os.environ.get('MEDIA_ROOT', BASE_DIR / 'media'))
+
+# Where `snapshot_ledger` writes the columnar analytics snapshot.
+LEDGER_SNAPSHOT_DIR = Path(os.environ.get('LEDGER_SNAPSHOT_DIR', BASE_DIR / 'snapshot'))
 
 # Authentication
 LOGIN_URL = '/accounts/login/'
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/accounts/login/'
+
+# Sessions. SESSION_BACKEND picks the engine: 'cached_db' reads sessions from
+# the cache and only queries the database on a miss, 'signed_cookies' keeps
+# them in the cookie and needs no storage, 'db' always queries. cached_db is
+# the default only with a shared cache; with per-process caches one worker
+# would keep serving a session another worker has changed.
+SESSION_ENGINE = 'django.contrib.sessions.backends.' + os.environ.get(
+    'SESSION_BACKEND', 'cached_db' if os.environ.get('REDIS_URL') else 'db',
+)
@@ -1,5 +1,15 @@
 from django.contrib import admin
-from .models import Supplier, TypeDescription, ConstructionEntry, EntryChangeLog
+from .models import (
+    Project, Supplier, TypeDescription, ConstructionEntry, EntryChangeLog, Job, DuplicateSuspect, InvoiceSummary,
+    PeriodClose,
+)
+
+
+@admin.register(Project)
+class ProjectAdmin(admin.ModelAdmin):
+    list_display = ['name', 'created_at']
+    search_fields = ['name']
+    filter_horizontal = ['members']
 
 
 @admin.register(Supplier)
@@ -16,16 +26,52 @@ class TypeDescriptionAdmin(admin.ModelAdmin):
 @admin.register(ConstructionEntry)
 class ConstructionEntryAdmin(admin.ModelAdmin):
     list_display = [
-        'date', 'description', 'stage', 'lc_stage', 'supplier',
+        'date', 'project', 'description', 'stage', 'lc_stage', 'supplier',
         'cost', 'posted', 'lm', 'invoice_number',
     ]
-    list_filter = ['posted', 'lm', 'delivery_type', 'type_description', 'supplier']
+    list_filter = ['project', 'posted', 'lm', 'delivery_type', 'type_description', 'supplier']
     search_fields = ['description', 'notes', 'invoice_number']
     date_hierarchy = 'date'
 
 
 @admin.register(EntryChangeLog)
 class EntryChangeLogAdmin(admin.ModelAdmin):
-    list_display = ['timestamp', 'action', 'entry_id_snapshot', 'user', 'notes']
-    list_filter = ['action', 'user']
-    readonly_fields = ['timestamp', 'entry', 'entry_id_snapshot', 'user', 'action', 'changes', 'notes']
+    list_display = ['timestamp', 'project', 'action', 'model', 'object_id', 'user', 'notes']
+    list_filter = ['project', 'model', 'action', 'user']
+    readonly_fields = ['timestamp', 'project', 'model', 'object_id', 'entry', 'user', 'action', 'changes', 'notes']
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'project', 'kind', 'status', 'progress', 'total', 'created_by', 'message']
+    list_filter = ['project', 'kind', 'status']
+
+
+@admin.register(DuplicateSuspect)
+class DuplicateSuspectAdmin(admin.ModelAdmin):
+    list_display = ['entry', 'original', 'reason', 'status', 'created_at', 'reviewed_by']
+    list_filter = ['reason', 'status']
+    raw_id_fields = ['entry', 'original']
+
+
+@admin.register(InvoiceSummary)
+class InvoiceSummaryAdmin(admin.ModelAdmin):
+    list_display = [
+        'project', 'supplier', 'invoice_number', 'entry_count', 'cost_total', 'invoiced_total', 'difference', 'status',
+    ]
+    list_filter = ['project', 'status']
+    search_fields = ['supplier__name', 'invoice_number']
+
+
+@admin.register(PeriodClose)
+class PeriodCloseAdmin(admin.ModelAdmin):
+    list_display = ['project', 'start', 'end', 'entry_count', 'cost_total', 'closed_by', 'closed_at']
+    list_filter = ['project']
+    # Closes change only through the Periods page, which keeps entries and totals in step.
+    readonly_fields = ['project', 'start', 'end', 'entry_count', 'cost_total', 'closed_by', 'closed_at']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
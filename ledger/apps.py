@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class LedgerConfig(AppConfig):
     name = 'ledger'
+
+    def ready(self):
+        from . import signals  # noqa: F401
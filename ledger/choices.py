@@ -0,0 +1,82 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Supplier, TypeDescription
+
+# Choice lists are cached under a version token that is replaced whenever the
+# underlying table changes, so stale lists are never read back after a write.
+CHOICES_TIMEOUT = 60 * 5
+
+
+def _version_key(name):
+    return f'ledger:choices:{name}:version'
+
+
+def _get_version(name):
+    key = _version_key(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def _invalidate(name):
+    cache.set(_version_key(name), time.time_ns(), None)
+
+
+def _cached_choices(name, build):
+    key = f'ledger:choices:{name}:{_get_version(name)}'
+    choices = cache.get(key)
+    if choices is None:
+        choices = build()
+        cache.set(key, choices, CHOICES_TIMEOUT)
+    return choices
+
+
+def supplier_choices():
+    """Return [(id, name), ...] for every supplier, ordered by name."""
+    return _cached_choices(
+        'supplier',
+        lambda: list(Supplier.objects.order_by('name').values_list('id', 'name')),
+    )
+
+
+def supplier_select_choices(selected=None):
+    """
+    Return (choices, searchable) for a supplier selector. Past
+    LEDGER_SUPPLIER_SELECT_LIMIT suppliers only the `selected` one is
+    listed, and the page searches the rest through supplier_autocomplete.
+    """
+    choices = supplier_choices()
+    if len(choices) <= settings.LEDGER_SUPPLIER_SELECT_LIMIT:
+        return choices, False
+    selected = str(selected or '')
+    return [choice for choice in choices if str(choice[0]) == selected], True
+
+
+def type_choices():
+    """Return [(id, "code - description"), ...] for every type, ordered by code."""
+    return _cached_choices(
+        'type',
+        lambda: [
+            (pk, f"{code} - {description}")
+            for pk, code, description in
+            TypeDescription.objects.order_by('code').values_list('id', 'code', 'description')
+        ],
+    )
+
+
+def choices_version():
+    """Return a token that changes whenever any supplier or type changes."""
+    return f"{_get_version('supplier')}.{_get_version('type')}"
+
+
+def invalidate_supplier_choices():
+    _invalidate('supplier')
+
+
+def invalidate_type_choices():
+    _invalidate('type')
@@ -0,0 +1,103 @@
+"""
+Duplicate-entry detection.
+
+A project's entries are streamed once, ordered by (supplier, date, id)
+through the project/supplier/date index, so each supplier's rows arrive
+together and in date order. Two rules flag a later entry against an
+earlier one:
+
+* invoice: same supplier, same invoice number and same cost. Entries of a
+  split keep the invoice number but divide the cost, so they are not
+  flagged.
+* amount: same supplier and same cost within DATE_WINDOW_DAYS days.
+
+Both are dictionary lookups into buckets that only hold the current
+supplier's rows, so the pass is linear in the number of entries.
+"""
+from collections import deque
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ConstructionEntry, DuplicateSuspect
+
+DATE_WINDOW_DAYS = 3
+
+
+def _invoice_key(invoice_number):
+    return ''.join(invoice_number.split()).upper().lstrip('#')
+
+
+def find_duplicates(project, window_days=DATE_WINDOW_DAYS, progress=None, progress_every=10000):
+    """Yield (entry_id, original_id, reason) for every suspected duplicate in `project`."""
+    entries = ConstructionEntry.objects.filter(project=project, supplier__isnull=False)
+    total = entries.count()
+    rows = (
+        entries.order_by('supplier_id', 'date', 'id')
+        .values_list('id', 'supplier_id', 'date', 'invoice_number', 'cost')
+        .iterator(chunk_size=5000)
+    )
+    current_supplier = None
+    for done, (pk, supplier_id, date, invoice_number, cost) in enumerate(rows, 1):
+        if progress and done % progress_every == 0:
+            progress(done, total)
+        if supplier_id != current_supplier:
+            current_supplier = supplier_id
+            invoices = {}       # (invoice key, cost) -> first entry id
+            window = deque()    # (date, cost, id) of entries within the date window
+            by_cost = {}        # cost -> deque of ids in the window
+
+        invoice_key = _invoice_key(invoice_number)
+        if invoice_key and cost is not None:
+            first = invoices.setdefault((invoice_key, cost), pk)
+            if first != pk:
+                yield pk, first, 'invoice'
+                continue
+
+        if not cost or date is None:
+            continue
+        while window and (date - window[0][0]).days > window_days:
+            _, old_cost, _ = window.popleft()
+            ids = by_cost[old_cost]
+            ids.popleft()
+            if not ids:
+                del by_cost[old_cost]
+        if cost in by_cost:
+            yield pk, by_cost[cost][0], 'amount'
+        window.append((date, cost, pk))
+        by_cost.setdefault(cost, deque()).append(pk)
+
+    if progress:
+        progress(total, total)
+
+
+def detect_duplicates(project, window_days=DATE_WINDOW_DAYS, progress=None):
+    """
+    Refresh the review queue of `project` from a detection pass.
+
+    New suspects are added as open, open suspects that no longer match are
+    removed and dismissed ones are kept so they are not raised again.
+    Returns a dict with `found`, `added` and `removed` counts.
+    """
+    found = set(find_duplicates(project, window_days, progress))
+    existing = {
+        (entry_id, original_id, reason): (pk, status)
+        for pk, entry_id, original_id, reason, status in
+        DuplicateSuspect.objects.filter(entry__project=project).values_list('id', 'entry_id', 'original_id', 'reason', 'status')
+    }
+    new = [
+        DuplicateSuspect(entry_id=entry_id, original_id=original_id, reason=reason)
+        for entry_id, original_id, reason in found - existing.keys()
+    ]
+    stale = [pk for key, (pk, status) in existing.items() if status == 'open' and key not in found]
+    with transaction.atomic():
+        DuplicateSuspect.objects.bulk_create(new, batch_size=1000, ignore_conflicts=True)
+        DuplicateSuspect.objects.filter(pk__in=stale).delete()
+    return {'found': len(found), 'added': len(new), 'removed': len(stale)}
+
+
+def dismiss_suspect(suspect, user):
+    suspect.status = 'dismissed'
+    suspect.reviewed_by = user
+    suspect.reviewed_at = timezone.now()
+    suspect.save(update_fields=['status', 'reviewed_by', 'reviewed_at'])
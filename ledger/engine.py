@@ -0,0 +1,176 @@
+"""
+Optional in-process aggregation over the whole ledger.
+
+With LEDGER_VECTOR_ENGINE enabled and numpy installed, `get_frame(project)`
+loads the numeric columns and coded dimensions of the project's entries
+into numpy arrays once per data version and keeps them in the process. Totals and group-bys
+are then computed with array operations instead of one SQL aggregate per
+dimension. When the engine is off or numpy is missing `get_frame()`
+returns None and callers use the ORM.
+
+The data version is a token in the cache that changes whenever an entry,
+supplier or type is saved or deleted (see signals.py) and after bulk
+writes that bypass signals, which call `invalidate_ledger()`.
+"""
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import ConstructionEntry
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional
+    np = None
+
+VERSION_KEY = 'ledger:data:version'
+VALUE_COLUMNS = ['cost', 'estimate', 'qty', 'invoiced_amt']
+
+# Filters from filters.ENTRY_FILTER_PARAMS the engine can apply; anything
+# else (the free-text search) has to go to the database.
+FRAME_FILTERS = {'supplier', 'type', 'lm', 'posted', 'date_from', 'date_to'}
+
+
+def data_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate_ledger():
+    # After commit, so no process can load the old rows under the new version.
+    transaction.on_commit(lambda: cache.set(VERSION_KEY, time.time_ns(), None))
+
+
+def engine_enabled():
+    return np is not None and settings.LEDGER_VECTOR_ENGINE
+
+
+def to_decimal(value):
+    """Round an array sum to cents, matching the Decimal totals the ORM returns."""
+    return Decimal(f'{value:.2f}')
+
+
+class LedgerFrame:
+    """The ledger as parallel numpy arrays, one element per entry."""
+
+    def __init__(self, rows, version=None, project_id=None):
+        self.version = version
+        self.project_id = project_id
+        rows = list(rows)
+        ids, dates, suppliers, types, lms, posteds, *values = zip(*rows) if rows else [()] * 10
+        self.id = np.array(ids, dtype=np.int64)
+        self.date = np.array([d or 'NaT' for d in dates], dtype='datetime64[D]')
+        # 0 stands for "no supplier/type"; primary keys start at 1.
+        self.supplier = np.array([s or 0 for s in suppliers], dtype=np.int64)
+        self.type = np.array([t or 0 for t in types], dtype=np.int64)
+        self.lm_codes, self.lm = np.unique(np.array(lms, dtype=object).astype(str), return_inverse=True)
+        self.posted_codes, self.posted = np.unique(
+            np.array(posteds, dtype=object).astype(str), return_inverse=True,
+        )
+        for name, column in zip(VALUE_COLUMNS, values):
+            setattr(self, name, np.array(
+                [np.nan if v is None else float(v) for v in column], dtype=np.float64,
+            ))
+
+    @classmethod
+    def load(cls, project_id, version=None):
+        rows = ConstructionEntry.objects.filter(project_id=project_id).values_list(
+            'id', 'date', 'supplier_id', 'type_description_id', 'lm', 'posted', *VALUE_COLUMNS,
+        ).order_by().iterator(chunk_size=10000)
+        return cls(rows, version, project_id)
+
+    def __len__(self):
+        return len(self.id)
+
+    def _code_mask(self, codes, column, value):
+        matches = np.flatnonzero(codes == value)
+        if not len(matches):
+            return np.zeros(len(self), dtype=bool)
+        return column == matches[0]
+
+    def lm_mask(self, *values):
+        mask = np.zeros(len(self), dtype=bool)
+        for value in values:
+            mask |= self._code_mask(self.lm_codes, self.lm, value)
+        return mask
+
+    def mask(self, filters=None):
+        """Boolean mask for entry_list filters (see filters.entry_filter_values)."""
+        filters = filters or {}
+        mask = np.ones(len(self), dtype=bool)
+        if filters.get('supplier'):
+            mask &= self.supplier == int(filters['supplier'])
+        if filters.get('type'):
+            mask &= self.type == int(filters['type'])
+        if filters.get('lm'):
+            mask &= self.lm_mask(filters['lm'])
+        if filters.get('posted'):
+            mask &= self._code_mask(self.posted_codes, self.posted, filters['posted'])
+        if filters.get('date_from'):
+            mask &= self.date >= np.datetime64(filters['date_from'])
+        if filters.get('date_to'):
+            mask &= self.date <= np.datetime64(filters['date_to'])
+        return mask
+
+    def can_filter(self, filters):
+        return not any(value for name, value in filters.items() if name not in FRAME_FILTERS)
+
+    def total(self, column='cost', mask=None):
+        """Sum of a value column, or None when no selected row has a value (like SQL SUM)."""
+        values = getattr(self, column) if mask is None else getattr(self, column)[mask]
+        present = ~np.isnan(values)
+        return to_decimal(values[present].sum()) if present.any() else None
+
+    def group_totals(self, by, column='cost', mask=None):
+        """
+        Return {key: (total, count)} of a value column grouped by `by`
+        ('supplier', 'type', 'lm' or 'posted'); keys are primary keys or codes.
+        """
+        keys = getattr(self, by)
+        values = getattr(self, column)
+        if mask is not None:
+            keys, values = keys[mask], values[mask]
+        uniques, inverse = np.unique(keys, return_inverse=True)
+        totals = np.bincount(inverse, weights=np.nan_to_num(values), minlength=len(uniques))
+        counts = np.bincount(inverse, minlength=len(uniques))
+        # Like SQL SUM, a group whose values are all NULL totals None, not 0.
+        present = np.bincount(inverse, weights=~np.isnan(values), minlength=len(uniques))
+        if by in ('lm', 'posted'):
+            uniques = getattr(self, f'{by}_codes')[uniques]
+        return {
+            (key.item() if hasattr(key, 'item') else key): (to_decimal(total) if seen else None, int(count))
+            for key, total, count, seen in zip(uniques, totals, counts, present)
+        }
+
+    def date_range(self, mask=None):
+        dates = self.date if mask is None else self.date[mask]
+        dates = dates[~np.isnat(dates)]
+        if not len(dates):
+            return {'min_date': None, 'max_date': None}
+        return {'min_date': dates.min().item(), 'max_date': dates.max().item()}
+
+
+_frames = {}  # project id -> LedgerFrame
+_frame_lock = threading.Lock()
+
+
+def get_frame(project):
+    """Return the project's LedgerFrame for the current data version, or None if the engine is off."""
+    if not engine_enabled():
+        return None
+    version = data_version()
+    frame = _frames.get(project.pk)
+    if frame is not None and frame.version == version:
+        return frame
+    with _frame_lock:
+        frame = _frames.get(project.pk)
+        if frame is None or frame.version != version:
+            frame = _frames[project.pk] = LedgerFrame.load(project.pk, version)
+        return frame
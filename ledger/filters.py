@@ -0,0 +1,116 @@
+import datetime
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+ENTRY_FILTER_PARAMS = ['supplier', 'type', 'lm', 'posted', 'date_from', 'date_to', 'search']
+
+
+def entry_filter_values(data):
+    """Return the entry_list filter parameters from a QueryDict or dict, as strings."""
+    values = {name: data.get(name) or '' for name in ENTRY_FILTER_PARAMS}
+    values['search'] = values['search'].strip()
+    return values
+
+
+def filter_entries(entries, filters):
+    """Apply entry_list filters (see entry_filter_values) to a ConstructionEntry queryset."""
+    if filters.get('supplier'):
+        entries = entries.filter(supplier_id=filters['supplier'])
+    if filters.get('type'):
+        entries = entries.filter(type_description_id=filters['type'])
+    if filters.get('lm'):
+        entries = entries.filter(lm=filters['lm'])
+    if filters.get('posted'):
+        entries = entries.filter(posted=filters['posted'])
+    if filters.get('date_from'):
+        entries = entries.filter(date__gte=filters['date_from'])
+    if filters.get('date_to'):
+        entries = entries.filter(date__lte=filters['date_to'])
+    search = filters.get('search')
+    if search:
+        entries = entries.filter(
+            Q(description__icontains=search) |
+            Q(notes__icontains=search) |
+            Q(invoice_number__icontains=search)
+        )
+    return entries
+
+
+RECONCILIATION_FILTER_PARAMS = ['status', 'supplier', 'date_from', 'date_to']
+
+
+def reconciliation_filter_values(data):
+    """Return the reconciliation filter parameters; status defaults to 'unreconciled'."""
+    values = {name: data.get(name) or '' for name in RECONCILIATION_FILTER_PARAMS}
+    values['status'] = data.get('status', 'unreconciled')
+    return values
+
+
+def filter_summaries(summaries, filters):
+    """Apply reconciliation filters to an InvoiceSummary queryset; dates match the last entry."""
+    status = filters.get('status')
+    if status == 'unreconciled':
+        summaries = summaries.filter(status__in=summaries.model.UNRECONCILED)
+    elif status:
+        summaries = summaries.filter(status=status)
+    if filters.get('supplier', '').isdigit():
+        summaries = summaries.filter(supplier_id=filters['supplier'])
+    if filters.get('date_from'):
+        summaries = summaries.filter(last_date__gte=filters['date_from'])
+    if filters.get('date_to'):
+        summaries = summaries.filter(last_date__lte=filters['date_to'])
+    return summaries
+
+
+AUDIT_FILTER_PARAMS = ['user', 'action', 'model', 'date_from', 'date_to', 'entry', 'field']
+
+
+def audit_filter_values(data):
+    """Return the audit_log filter parameters from a QueryDict or dict, as strings."""
+    return {name: (data.get(name) or '').strip() for name in AUDIT_FILTER_PARAMS}
+
+
+def _day_start(value):
+    """Midnight in the current time zone at the start of an ISO date string, or None if invalid."""
+    try:
+        day = parse_date(value)
+    except ValueError:
+        return None
+    if day is None:
+        return None
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def audit_entry_ids(value):
+    """Entry ids from a comma- or space-separated string; anything else is ignored."""
+    return [int(part) for part in value.replace(',', ' ').split() if part.isdigit()]
+
+
+def filter_logs(logs, filters):
+    """
+    Apply audit_log filters to an EntryChangeLog queryset. Dates are whole
+    days in the current time zone; `model` is 'constructionentry', 'supplier'
+    or 'typedescription'; `entry` takes several entry ids and matches deleted
+    entries too; `field` keeps logs whose changes include that field.
+    """
+    if filters.get('user', '').isdigit():
+        logs = logs.filter(user_id=filters['user'])
+    if filters.get('action'):
+        logs = logs.filter(action=filters['action'])
+    if filters.get('model'):
+        logs = logs.filter(model=filters['model'])
+    # Compare timestamps with bounds rather than timestamp__date, which
+    # wraps the column in a function and so cannot use the indexes.
+    start = _day_start(filters.get('date_from', ''))
+    if start:
+        logs = logs.filter(timestamp__gte=start)
+    end = _day_start(filters.get('date_to', ''))
+    if end:
+        logs = logs.filter(timestamp__lt=end + datetime.timedelta(days=1))
+    if filters.get('entry'):
+        logs = logs.filter(model='constructionentry', object_id__in=audit_entry_ids(filters['entry']))
+    if filters.get('field'):
+        logs = logs.filter(changes__has_key=filters['field'])
+    return logs
@@ -1,9 +1,17 @@
+import datetime
+
 from django import forms
 from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import Group
+from django.urls import reverse
+from django.utils import timezone
 
-from .models import ConstructionEntry
+from .choices import supplier_select_choices, type_choices
+from .importer import inspect_workbook
+from .models import ConstructionEntry, Project
+from .periods import closed_through, is_closed
+from .preferences import ENTRY_COLUMN_CHOICES, PAGE_SIZES
 
 
 class ConstructionEntryForm(forms.ModelForm):
@@ -39,6 +47,37 @@ class ConstructionEntryForm(forms.ModelForm):
             'type_description': forms.Select(attrs={'class': 'form-select'}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Render the dropdowns from the shared choice cache instead of
+        # querying suppliers and types once per form (and per split form).
+        supplier_field = self.fields['supplier']
+        choices, searchable = supplier_select_choices(self['supplier'].value())
+        supplier_field.choices = [('', supplier_field.empty_label), *choices]
+        if searchable:
+            supplier_field.widget.attrs['data-autocomplete-url'] = reverse('ledger:supplier_autocomplete')
+        type_field = self.fields['type_description']
+        type_field.choices = [('', type_field.empty_label), *type_choices()]
+
+    def clean(self):
+        cleaned_data = super().clean()
+        # The instance still has the saved date here; both must be open.
+        through = closed_through(self.instance.project_id) if self.instance.project_id else None
+        if is_closed(through, self.instance.date, cleaned_data.get('date')):
+            raise forms.ValidationError(
+                f'Entries dated up to {through:%Y-%m-%d} are in a closed period and cannot be added or changed.'
+            )
+        return cleaned_data
+
+
+class EntryEditForm(ConstructionEntryForm):
+    # The entry version the user started editing from; see ConstructionEntry.save().
+    version = forms.IntegerField(widget=forms.HiddenInput, required=False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['version'].initial = self.instance.version
+
 
 class UserCreateForm(UserCreationForm):
     email = forms.EmailField(
@@ -51,11 +90,17 @@ class UserCreateForm(UserCreationForm):
         widget=forms.CheckboxSelectMultiple(),
         help_text='Assign the user to one or more groups.',
     )
+    projects = forms.ModelMultipleChoiceField(
+        queryset=Project.objects.all(),
+        required=False,
+        widget=forms.CheckboxSelectMultiple(),
+        help_text='Projects the user can see and work on.',
+    )
     is_staff = forms.BooleanField(required=False, label='Admin (staff access)')
 
     class Meta(UserCreationForm.Meta):
         model = get_user_model()
-        fields = ['username', 'email', 'password1', 'password2', 'groups', 'is_staff']
+        fields = ['username', 'email', 'password1', 'password2', 'groups', 'projects', 'is_staff']
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -70,6 +115,7 @@ class UserCreateForm(UserCreationForm):
         if commit:
             user.save()
             user.groups.set(self.cleaned_data.get('groups') or [])
+            user.ledger_projects.set(self.cleaned_data.get('projects') or [])
         return user
 
 
@@ -79,6 +125,11 @@ class UserEditForm(forms.ModelForm):
         required=False,
         widget=forms.CheckboxSelectMultiple(),
     )
+    projects = forms.ModelMultipleChoiceField(
+        queryset=Project.objects.all(),
+        required=False,
+        widget=forms.CheckboxSelectMultiple(),
+    )
     new_password1 = forms.CharField(
         required=False,
         label='New password',
@@ -102,6 +153,7 @@ class UserEditForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         if self.instance.pk:
             self.fields['groups'].initial = self.instance.groups.all()
+            self.fields['projects'].initial = self.instance.ledger_projects.all()
 
     def clean(self):
         cleaned_data = super().clean()
@@ -119,6 +171,7 @@ class UserEditForm(forms.ModelForm):
         if commit:
             user.save()
             user.groups.set(self.cleaned_data.get('groups') or [])
+            user.ledger_projects.set(self.cleaned_data.get('projects') or [])
         return user
 
 
@@ -138,6 +191,9 @@ LEDGER_PERMISSIONS = [
     # Type descriptions
     ('view_typedescription',     'View type descriptions', 'Type Descriptions'),
     ('change_typedescription',   'Edit type descriptions', 'Type Descriptions'),
+    # Periods
+    ('add_periodclose',          'Close periods',          'Periods'),
+    ('delete_periodclose',       'Reopen periods',         'Periods'),
 ]
 
 LEDGER_PERMISSION_CHOICES = [(code, label) for code, label, _ in LEDGER_PERMISSIONS]
@@ -153,3 +209,68 @@ class GroupForm(forms.Form):
         required=False,
         widget=forms.CheckboxSelectMultiple(),
     )
+
+
+class WorkbookUploadForm(forms.Form):
+    file = forms.FileField(
+        label='Workbook (.xlsx)',
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.xlsx'}),
+    )
+
+    def clean_file(self):
+        f = self.cleaned_data['file']
+        if not f.name.lower().endswith('.xlsx'):
+            raise forms.ValidationError('Upload an .xlsx workbook.')
+        try:
+            errors, self.preview = inspect_workbook(f)
+        except ValueError as e:
+            raise forms.ValidationError(str(e))
+        if errors:
+            raise forms.ValidationError(errors)
+        f.seek(0)
+        return f
+
+
+class ImportConfirmForm(forms.Form):
+    confirm_replace = forms.BooleanField(
+        label="Replace all of this project's entries with the contents of this workbook",
+    )
+
+
+class PeriodCloseForm(forms.Form):
+    month = forms.DateField(
+        label='Close through the end of',
+        input_formats=['%Y-%m'],
+        widget=forms.DateInput(attrs={'type': 'month', 'class': 'form-control'}, format='%Y-%m'),
+        help_text='Pick December to close a whole year.',
+    )
+
+    def __init__(self, *args, project=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.project = project
+
+    def clean_month(self):
+        month = self.cleaned_data['month']
+        next_month = (month.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+        end = next_month - datetime.timedelta(days=1)
+        if end >= timezone.localdate():
+            raise forms.ValidationError('Only past months can be closed.')
+        through = closed_through(self.project.pk)
+        if through is not None and end <= through:
+            raise forms.ValidationError(f'Entries up to {through:%Y-%m-%d} are already closed.')
+        self.end = end
+        return month
+
+
+class EntryListPreferencesForm(forms.Form):
+    page_size = forms.TypedChoiceField(
+        label='Rows per page',
+        choices=[(size, size) for size in PAGE_SIZES],
+        coerce=int,
+        widget=forms.Select(attrs={'class': 'form-select form-select-sm'}),
+    )
+    columns = forms.MultipleChoiceField(
+        choices=ENTRY_COLUMN_CHOICES,
+        widget=forms.CheckboxSelectMultiple(),
+        error_messages={'required': 'Choose at least one column.'},
+    )
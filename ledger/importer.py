@@ -0,0 +1,235 @@
+import datetime
+from decimal import Decimal, InvalidOperation
+
+import openpyxl
+from django.db import transaction
+
+from .engine import invalidate_ledger
+from .models import Supplier, TypeDescription, ConstructionEntry
+from .periods import closed_through
+from .reconciliation import refresh_invoice_summaries
+from .suppliers import SupplierIndex
+
+SHEET_NAME = 'Const Actual'
+HEADER_ROW = 8
+FIRST_DATA_ROW = 9
+BATCH_SIZE = 1000
+
+# Columns 1-22 of the header row, in order.
+WORKBOOK_HEADERS = [
+    'Date', 'Description', 'Stage', 'LC-Stage', 'Supplier', 'Estimate', 'QTY',
+    'Supplies Cost', 'Tax/Fees', 'Cost', 'Invoiced Amt', 'Posted', 'L/M',
+    'Supervisor', 'Invoice #', 'Delivery Type', 'Materials', 'Book #', 'Notes',
+    'Type Description', 'Type', 'TypDesc',
+]
+
+
+def _to_decimal(val):
+    if val is None:
+        return None
+    try:
+        return Decimal(str(val))
+    except (InvalidOperation, ValueError):
+        return None
+
+
+def _clean_str(val, max_len=200):
+    if val is None:
+        return ''
+    return str(val).strip()[:max_len]
+
+
+def _parse_date(date_val):
+    if isinstance(date_val, datetime.datetime):
+        return date_val.date()
+    if isinstance(date_val, str):
+        try:
+            return datetime.datetime.strptime(date_val, '%Y-%m-%d').date()
+        except ValueError:
+            return None
+    return date_val
+
+
+def _open_sheet(source):
+    """Open the 'Const Actual' sheet of a path or file object in streaming mode."""
+    try:
+        wb = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    except Exception as e:
+        raise ValueError(f"Could not read the workbook: {e}") from e
+    if SHEET_NAME not in wb.sheetnames:
+        wb.close()
+        raise ValueError(f"The workbook has no '{SHEET_NAME}' sheet.")
+    return wb, wb[SHEET_NAME]
+
+
+def inspect_workbook(source, preview_rows=10):
+    """
+    Check the header row against WORKBOOK_HEADERS and read the first data rows.
+
+    Returns `(errors, preview)`: a list of header problems (empty when the
+    layout matches) and up to `preview_rows` non-empty rows as lists of
+    strings. Raises ValueError if the file is not a workbook with the
+    expected sheet.
+    """
+    wb, ws = _open_sheet(source)
+    try:
+        rows = ws.iter_rows(min_row=HEADER_ROW, max_col=len(WORKBOOK_HEADERS), values_only=True)
+        header = next(rows, ())
+        header = list(header) + [None] * (len(WORKBOOK_HEADERS) - len(header))
+        errors = []
+        for col, (expected, found) in enumerate(zip(WORKBOOK_HEADERS, header), 1):
+            if _clean_str(found).lower() != expected.lower():
+                errors.append(f"Column {col} of row {HEADER_ROW} should be '{expected}', found '{_clean_str(found)}'.")
+        preview = []
+        for row in rows:
+            if len(preview) >= preview_rows:
+                break
+            if row[0] is None and row[1] is None:
+                continue
+            preview.append(['' if v is None else str(v) for v in row])
+        return errors, preview
+    finally:
+        wb.close()
+
+
+def _row_to_entry(row, project, supplier_for, type_map):
+    def cell(col):
+        return row[col - 1] if col <= len(row) else None
+
+    supplier_name = _clean_str(cell(5))
+    type_code = cell(21)
+    return ConstructionEntry(
+        project=project,
+        date=_parse_date(cell(1)),
+        description=_clean_str(cell(2), 500),
+        stage=_clean_str(cell(3), 20),
+        lc_stage=_clean_str(cell(4), 20),
+        supplier=supplier_for(supplier_name) if supplier_name else None,
+        estimate=_to_decimal(cell(6)),
+        qty=_to_decimal(cell(7)),
+        supplies_cost=_to_decimal(cell(8)),
+        tax_fees=_to_decimal(cell(9)),
+        cost=_to_decimal(cell(10)),
+        invoiced_amt=_to_decimal(cell(11)),
+        posted=_clean_str(cell(12), 10),
+        lm=_clean_str(cell(13), 5),
+        supervisor=_clean_str(cell(14)),
+        invoice_number=_clean_str(cell(15), 50),
+        delivery_type=_clean_str(cell(16), 20),
+        materials=_clean_str(cell(17)),
+        book_number=_clean_str(cell(18), 20),
+        notes=_clean_str(cell(19), 5000),
+        type_description=type_map.get(str(type_code).strip()) if type_code else None,
+    )
+
+
+def import_workbook(filepath, project, progress=None, log=None, checkpoint=None, resume_after=None,
+                    batch_size=BATCH_SIZE):
+    """
+    Replace the entries of `project` with the rows of a 'Const Actual' sheet.
+
+    Rows are inserted in batches of `batch_size`, each in its own
+    transaction. After every batch `checkpoint(row)` is called inside that
+    transaction with the last sheet row it covered, so a caller that stores
+    the value can pass it back as `resume_after` to continue after a crash
+    without clearing the ledger again or inserting rows twice.
+
+    `progress(done, total)` is called after every batch; `log(message)`
+    receives informational messages. Returns a dict with `created`,
+    `skipped` and `types` counts for this run.
+    """
+    log = log or (lambda message: None)
+    checkpoint = checkpoint or (lambda row: None)
+    through = closed_through(project.pk)
+    if through is not None:
+        raise ValueError(
+            f'Entries up to {through:%Y-%m-%d} are in closed periods; reopen them before replacing the ledger.'
+        )
+    wb, ws = _open_sheet(filepath)
+    try:
+        total = max((ws.max_row or 0) - FIRST_DATA_ROW + 1, 0) or None
+
+        # Pre-build TypeDescription lookup from spreadsheet data
+        type_map = {}  # code -> TypeDescription instance
+        for type_code, typ_desc in ws.iter_rows(min_row=FIRST_DATA_ROW, min_col=21, max_col=22, values_only=True):
+            if type_code and typ_desc:
+                code_str = str(type_code).strip()
+                desc_str = str(typ_desc).strip()
+                if code_str in ('#VALUE!', '') or desc_str in ('#VALUE!', '0', ''):
+                    continue
+                if code_str not in type_map:
+                    obj, _ = TypeDescription.objects.get_or_create(
+                        code=code_str, defaults={'description': desc_str}
+                    )
+                    type_map[code_str] = obj
+        log(f"Type descriptions loaded: {len(type_map)}")
+
+        suppliers = {}
+        index = SupplierIndex.build()
+
+        def supplier_for(name):
+            # Reuse a supplier whose name matches after normalization or is
+            # nearly identical, so spelling variants do not become new rows.
+            if name not in suppliers:
+                supplier = Supplier.objects.filter(name=name).first()
+                if supplier is None:
+                    match = index.match(name)
+                    if match is not None:
+                        supplier = Supplier.objects.get(pk=match)
+                        log(f"Supplier '{name}' filed under '{supplier.name}'")
+                    else:
+                        supplier = Supplier.objects.create(name=name)
+                        index.add(supplier.pk, supplier.name, supplier.normalized_name)
+                suppliers[name] = supplier
+            return suppliers[name]
+
+        if resume_after is None:
+            # Clear existing entries to avoid duplicates
+            with transaction.atomic():
+                deleted_count = ConstructionEntry.objects.filter(project=project).delete()[0]
+                checkpoint(FIRST_DATA_ROW - 1)
+            if deleted_count:
+                log(f"Cleared {deleted_count} existing entries")
+            resume_after = FIRST_DATA_ROW - 1
+        else:
+            log(f"Resuming after row {resume_after}")
+
+        created_count = 0
+        skipped_count = 0
+        batch = []
+        row_num = resume_after
+
+        def flush():
+            with transaction.atomic():
+                ConstructionEntry.objects.bulk_create(batch)
+                checkpoint(row_num)
+                invalidate_ledger()
+            if progress:
+                progress(row_num - FIRST_DATA_ROW + 1, total)
+            batch.clear()
+
+        for row_num, row in enumerate(
+            ws.iter_rows(min_row=resume_after + 1, max_col=22, values_only=True), resume_after + 1,
+        ):
+            # Skip completely empty rows
+            if not row or (row[0] is None and (len(row) < 2 or row[1] is None)):
+                skipped_count += 1
+                continue
+            batch.append(_row_to_entry(row, project, supplier_for, type_map))
+            created_count += 1
+            if len(batch) >= batch_size:
+                try:
+                    flush()
+                except Exception as e:
+                    log(f"Error in the batch ending at row {row_num}: {e}")
+                    raise
+        try:
+            flush()
+        except Exception as e:
+            log(f"Error in the batch ending at row {row_num}: {e}")
+            raise
+    finally:
+        wb.close()
+
+    refresh_invoice_summaries(project_id=project.pk)
+    return {'created': created_count, 'skipped': skipped_count, 'types': len(type_map)}
@@ -0,0 +1,164 @@
+"""
+A small database-backed job queue.
+
+Views enqueue Job rows; the `run_jobs` management command claims them one at a
+time and runs the handler registered for the job's kind. Handlers report
+progress with Job.set_progress so the job page can poll it.
+"""
+import csv
+import logging
+import os
+import tempfile
+from datetime import timedelta
+
+from django.core.files import File
+from django.utils import timezone
+
+from .duplicates import detect_duplicates
+from .filters import filter_entries
+from .importer import import_workbook
+from .models import ConstructionEntry, Job
+from .reconciliation import refresh_invoice_summaries
+from .tracking import tracking_context
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {}
+
+
+def job_handler(kind):
+    """Register a function(job) -> final message as the handler for `kind`."""
+    def decorator(func):
+        HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+def enqueue(kind, project=None, user=None, params=None, file=None, status='queued'):
+    job = Job(kind=kind, project=project, created_by=user, params=params or {}, status=status)
+    if file is not None:
+        job.file.save(os.path.basename(file.name), file, save=False)
+    job.save()
+    return job
+
+
+def claim_next_job():
+    """Atomically move the oldest queued job to running and return it (or None)."""
+    while True:
+        job = Job.objects.filter(status='queued').order_by('created_at', 'id').first()
+        if job is None:
+            return None
+        started_at = timezone.now()
+        claimed = Job.objects.filter(pk=job.pk, status='queued').update(
+            status='running', started_at=started_at, heartbeat_at=started_at,
+        )
+        if claimed:
+            job.status = 'running'
+            job.started_at = job.heartbeat_at = started_at
+            return job
+
+
+def requeue_stale_jobs(stale_after):
+    """Queue running jobs again if they have not reported progress for `stale_after` seconds."""
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+    return Job.objects.filter(status='running', heartbeat_at__lt=cutoff).update(
+        status='queued', message='Worker stopped responding; queued again.',
+    )
+
+
+def run_job(job):
+    """Run a claimed job and record its outcome."""
+    try:
+        with tracking_context(job.created_by_id, job.project_id):
+            message = HANDLERS[job.kind](job)
+    except Exception as exc:
+        logger.exception('Job %s failed', job.pk)
+        job.status = 'failed'
+        job.message = f"{type(exc).__name__}: {exc}"[:500]
+    else:
+        job.status = 'done'
+        job.message = (message or job.message)[:500]
+    job.finished_at = timezone.now()
+    Job.objects.filter(pk=job.pk).update(
+        status=job.status, message=job.message, finished_at=job.finished_at,
+    )
+    return job
+
+
+@job_handler('import_workbook')
+def import_workbook_job(job):
+    counts = import_workbook(
+        job.file.path,
+        job.project,
+        progress=lambda done, total: job.set_progress(done, total),
+        log=lambda message: job.set_progress(job.progress, message=message),
+        checkpoint=job.set_last_row,
+        resume_after=job.last_row,
+    )
+    return f"{counts['created']} entries created, {counts['skipped']} empty rows skipped."
+
+
+EXPORT_COLUMNS = [
+    ('id', 'ID'),
+    ('date', 'Date'),
+    ('description', 'Description'),
+    ('stage', 'Stage'),
+    ('lc_stage', 'LC-Stage'),
+    ('supplier__name', 'Supplier'),
+    ('estimate', 'Estimate'),
+    ('qty', 'QTY'),
+    ('supplies_cost', 'Supplies Cost'),
+    ('tax_fees', 'Tax/Fees'),
+    ('cost', 'Cost'),
+    ('invoiced_amt', 'Invoiced Amt'),
+    ('posted', 'Posted'),
+    ('lm', 'L/M'),
+    ('supervisor', 'Supervisor'),
+    ('invoice_number', 'Invoice #'),
+    ('delivery_type', 'Delivery Type'),
+    ('materials', 'Materials'),
+    ('book_number', 'Book #'),
+    ('notes', 'Notes'),
+    ('type_description__code', 'Type'),
+    ('type_description__description', 'Type Description'),
+]
+
+
+@job_handler('export_entries')
+def export_entries_job(job):
+    entries = filter_entries(ConstructionEntry.objects.filter(project=job.project), job.params).order_by('date', 'id')
+    total = entries.count()
+    job.set_progress(0, total)
+    fields = [field for field, _ in EXPORT_COLUMNS]
+
+    with tempfile.NamedTemporaryFile('w', newline='', suffix='.csv', delete=False) as fh:
+        path = fh.name
+        writer = csv.writer(fh)
+        writer.writerow([label for _, label in EXPORT_COLUMNS])
+        for done, row in enumerate(entries.values_list(*fields).iterator(chunk_size=2000), 1):
+            writer.writerow(['' if v is None else v for v in row])
+            if done % 1000 == 0:
+                job.set_progress(done)
+    try:
+        with open(path, 'rb') as fh:
+            job.result_file.save(f"entries-{job.pk}.csv", File(fh), save=False)
+    finally:
+        os.remove(path)
+    Job.objects.filter(pk=job.pk).update(result_file=job.result_file.name)
+    job.set_progress(total)
+    return f"Exported {total} entries."
+
+
+@job_handler('detect_duplicates')
+def detect_duplicates_job(job):
+    counts = detect_duplicates(job.project, progress=lambda done, total: job.set_progress(done, total))
+    return (
+        f"{counts['found']} suspected duplicates: {counts['added']} new, "
+        f"{counts['removed']} no longer matching."
+    )
+
+
+@job_handler('rebuild_invoice_summaries')
+def rebuild_invoice_summaries_job(job):
+    written = refresh_invoice_summaries(project_id=job.project_id)
+    return f"{written} invoice summaries rebuilt."
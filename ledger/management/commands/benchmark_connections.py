@@ -0,0 +1,102 @@
+import copy
+import datetime
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.utils import load_backend
+
+QUERY = 'SELECT COUNT(*) FROM ledger_supplier'
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure per-request database latency with a fresh connection per request, '
+        'persistent connections and (on PostgreSQL with psycopg 3) the native pool'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Simulated requests per mode')
+        parser.add_argument('--database', default='default', help='Database alias to benchmark')
+        parser.add_argument('--output', default=None, help='Write JSON results to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        base = connections[options['database']].settings_dict
+        modes = {
+            'fresh_connection': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'pool': None},
+            'persistent_connection': {'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': True, 'pool': None},
+        }
+        if self._pool_supported(base):
+            modes['pool'] = {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'pool': {'min_size': 1, 'max_size': 2}}
+
+        results = []
+        for mode, overrides in modes.items():
+            wrapper = self._make_wrapper(base, f"benchmark_{mode}", overrides)
+            try:
+                timings = self._simulate_requests(wrapper, options['requests'])
+            finally:
+                wrapper.close()
+                if overrides['pool']:
+                    wrapper.close_pool()
+            results.append({
+                'mode': mode,
+                'requests': len(timings),
+                'first_ms': round(timings[0], 3),
+                'median_ms': round(statistics.median(timings), 3),
+                'p95_ms': round(sorted(timings)[int(len(timings) * 0.95) - 1], 3),
+                'mean_ms': round(statistics.fmean(timings), 3),
+            })
+
+        report = {
+            'generated_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'database': base['ENGINE'],
+            'configured': {
+                'CONN_MAX_AGE': base.get('CONN_MAX_AGE'),
+                'CONN_HEALTH_CHECKS': base.get('CONN_HEALTH_CHECKS'),
+                'pool': bool(base.get('OPTIONS', {}).get('pool')),
+            },
+            'results': results,
+        }
+        payload = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.write(payload + '\n')
+            for r in results:
+                self.stdout.write(f"{r['mode']:<24} median {r['median_ms']:>8.3f} ms  p95 {r['p95_ms']:>8.3f} ms")
+        else:
+            self.stdout.write(payload)
+
+    def _pool_supported(self, settings_dict):
+        if settings_dict['ENGINE'] != 'django.db.backends.postgresql':
+            return False
+        from django.db.backends.postgresql.psycopg_any import is_psycopg3
+        return is_psycopg3
+
+    def _make_wrapper(self, settings_dict, alias, overrides):
+        """Build a private connection with the given reuse settings."""
+        settings_dict = copy.deepcopy(settings_dict)
+        settings_dict['CONN_MAX_AGE'] = overrides['CONN_MAX_AGE']
+        settings_dict['CONN_HEALTH_CHECKS'] = overrides['CONN_HEALTH_CHECKS']
+        settings_dict.setdefault('OPTIONS', {}).pop('pool', None)
+        if overrides['pool']:
+            settings_dict['OPTIONS']['pool'] = overrides['pool']
+        backend = load_backend(settings_dict['ENGINE'])
+        return backend.DatabaseWrapper(settings_dict, alias)
+
+    def _simulate_requests(self, wrapper, count):
+        """
+        Run `count` request cycles: the connection housekeeping Django does on
+        request_started/request_finished around a single small query.
+        """
+        timings = []
+        for _ in range(count):
+            start = time.perf_counter()
+            wrapper.close_if_unusable_or_obsolete()
+            with wrapper.cursor() as cursor:
+                cursor.execute(QUERY)
+                cursor.fetchall()
+            wrapper.close_if_unusable_or_obsolete()
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
@@ -0,0 +1,247 @@
+import datetime
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+from io import StringIO
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Q
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from ledger.models import ConstructionEntry, Project, Supplier, TypeDescription
+from ledger.preferences import DEFAULT_COLUMNS, ENTRY_COLUMNS
+from ledger.synthetic import SYNTHETIC_PROJECT, generate_ledger, write_workbook
+
+ENTRY_LIST_FILTERS = [
+    ('supplier', 'supplier={supplier_id}'),
+    ('type', 'type={type_id}'),
+    ('lm', 'lm=M'),
+    ('posted', 'posted=Inv'),
+    ('date_range', 'date_from=2022-03-01&date_to=2022-06-30'),
+    ('search', 'search=lumber'),
+]
+
+# Session engines compared on dashboard and entry_list; each but 'db' also
+# loads the user from the cache (LEDGER_CACHE_USERS).
+SESSION_BACKENDS = ['db', 'cached_db', 'signed_cookies']
+
+# The sort keys entry_list accepts for its default columns.
+ENTRY_LIST_SORTS = [sort for key, _, _, _, sort in ENTRY_COLUMNS if key in DEFAULT_COLUMNS and sort]
+
+
+class QueryCounter:
+    """Database execute wrapper that only counts queries (no SQL is kept)."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark ledger views and import_excel against synthetic ledgers of increasing size'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', default='10000,100000,1000000',
+            help='Comma-separated ledger sizes (entries) to benchmark',
+        )
+        parser.add_argument(
+            '--import-sizes', default=None,
+            help='Comma-separated workbook sizes for import_excel (defaults to --sizes)',
+        )
+        parser.add_argument('--skip-import', action='store_true', help='Do not benchmark import_excel')
+        parser.add_argument(
+            '--session-backends', default=','.join(SESSION_BACKENDS),
+            help='Comma-separated session engines to compare on dashboard and entry_list (empty to skip)',
+        )
+        parser.add_argument('--repeat', type=int, default=5, help='Timed requests per view')
+        parser.add_argument('--suppliers', type=int, default=200)
+        parser.add_argument('--types', type=int, default=12)
+        parser.add_argument('--changelog-density', type=float, default=0.3)
+        parser.add_argument('--seed', type=int, default=2022)
+        parser.add_argument('--output', default=None, help='Write JSON results to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        sizes = self._parse_sizes(options['sizes'])
+        import_sizes = [] if options['skip_import'] else self._parse_sizes(options['import_sizes'] or options['sizes'])
+
+        # Always run against a throwaway test database, never the real ledger.
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with override_settings(STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+            }):
+                results = self._run(sizes, import_sizes, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            'generated_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'database': connection.vendor,
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'repeat': options['repeat'],
+            'seed': options['seed'],
+            'results': results,
+        }
+        payload = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.write(payload + '\n')
+            for r in results:
+                self.stdout.write(
+                    f"{r['size']:>8} {r['case']:<40} {r['queries']:>5} queries "
+                    f"{r['median_ms']:>10.1f} ms"
+                )
+            self.stdout.write(self.style.SUCCESS(f"Wrote {len(results)} results to {options['output']}"))
+        else:
+            self.stdout.write(payload)
+
+    def _parse_sizes(self, value):
+        try:
+            sizes = sorted({int(s) for s in value.split(',') if s.strip()})
+        except ValueError:
+            raise CommandError(f"Invalid size list: {value!r}")
+        if not sizes or sizes[0] < 1:
+            raise CommandError('Sizes must be positive integers')
+        return sizes
+
+    def _run(self, sizes, import_sizes, options):
+        user = get_user_model().objects.create_superuser('benchmark', 'benchmark@example.com', 'benchmark')
+        project, _ = Project.objects.get_or_create(name=SYNTHETIC_PROJECT)
+        client = self._login(user, project)
+        session_backends = [b.strip() for b in options['session_backends'].split(',') if b.strip()]
+        results = []
+
+        for size in sizes:
+            missing = size - ConstructionEntry.objects.filter(project=project).count()
+            if missing > 0:
+                self.stderr.write(f"Generating {missing} entries for size {size}...")
+                generate_ledger(
+                    entries=missing,
+                    suppliers=options['suppliers'],
+                    types=options['types'],
+                    changelog_density=options['changelog_density'],
+                    seed=options['seed'] + size,
+                    user=user,
+                    project=project,
+                )
+            cache.clear()
+            for case, url in self._view_cases(project):
+                results.append(self._time_request(client, size, case, url, options['repeat']))
+            for backend in session_backends:
+                with override_settings(
+                    SESSION_ENGINE=f'django.contrib.sessions.backends.{backend}',
+                    LEDGER_CACHE_USERS=backend != 'db',
+                ):
+                    session_client = self._login(user, project)
+                    for case in ('dashboard', 'entry_list'):
+                        results.append(self._time_request(
+                            session_client, size, f'{case} session={backend}',
+                            reverse(f'ledger:{case}'), options['repeat'],
+                        ))
+
+        for size in import_sizes:
+            results.append(self._time_import(size, options))
+
+        return results
+
+    def _login(self, user, project):
+        client = Client()
+        client.force_login(user)
+        client.post(reverse('ledger:project_switch'), {'project': project.pk})
+        return client
+
+    def _view_cases(self, project):
+        top_supplier = (
+            Supplier.objects.annotate(n=Count('constructionentry', filter=Q(constructionentry__project=project)))
+            .order_by('-n').first()
+        )
+        ids = {
+            'supplier_id': top_supplier.pk,
+            'type_id': TypeDescription.objects.order_by('id').values_list('id', flat=True).first(),
+        }
+        entry_id = ConstructionEntry.objects.filter(project=project).order_by('id').values_list('id', flat=True).first()
+        entry_list = reverse('ledger:entry_list')
+
+        cases = [
+            ('dashboard', reverse('ledger:dashboard')),
+            ('entry_list', entry_list),
+        ]
+        for name, query in ENTRY_LIST_FILTERS:
+            cases.append((f'entry_list filter={name}', f'{entry_list}?{query.format(**ids)}'))
+        for sort in ENTRY_LIST_SORTS:
+            cases.append((f'entry_list sort={sort}', f'{entry_list}?sort={sort}&dir=desc'))
+        cases += [
+            ('supplier_detail', reverse('ledger:supplier_detail', args=[top_supplier.pk])),
+            ('audit_log', reverse('ledger:audit_log')),
+            ('entry_split', reverse('ledger:entry_split', args=[entry_id]) + '?n=4'),
+        ]
+        return cases
+
+    def _time_request(self, client, size, case, url, repeat):
+        counter = QueryCounter()
+        timings = []
+        # The first (cold cache) request also counts queries; the rest are timed bare.
+        for i in range(repeat + 1):
+            start = time.perf_counter()
+            if i == 0:
+                with connection.execute_wrapper(counter):
+                    response = client.get(url)
+            else:
+                response = client.get(url)
+            elapsed = (time.perf_counter() - start) * 1000
+            if response.status_code != 200:
+                raise CommandError(f"{url} returned {response.status_code}")
+            timings.append(elapsed)
+        warm = timings[1:] or timings
+        return {
+            'size': size,
+            'case': case,
+            'url': url,
+            'queries': counter.count,
+            'cold_ms': round(timings[0], 3),
+            'median_ms': round(statistics.median(warm), 3),
+            'min_ms': round(min(warm), 3),
+            'max_ms': round(max(warm), 3),
+        }
+
+    def _time_import(self, size, options):
+        fd, path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(fd)
+        try:
+            self.stderr.write(f"Writing {size}-row workbook...")
+            write_workbook(path, size, suppliers=options['suppliers'], types=options['types'], seed=options['seed'])
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                start = time.perf_counter()
+                call_command('import_excel', file=path, stdout=StringIO())
+                elapsed = (time.perf_counter() - start) * 1000
+        finally:
+            os.remove(path)
+        return {
+            'size': size,
+            'case': 'import_excel',
+            'url': None,
+            'queries': counter.count,
+            'cold_ms': round(elapsed, 3),
+            'median_ms': round(elapsed, 3),
+            'min_ms': round(elapsed, 3),
+            'max_ms': round(elapsed, 3),
+        }
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ledger.models import ConstructionEntry, EntryChangeLog, PeriodClose, Project
+from ledger.synthetic import SYNTHETIC_PROJECT, generate_ledger
+
+
+class Command(BaseCommand):
+    help = 'Generate a synthetic construction ledger for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entries', type=int, default=10000, help='Number of entries to create')
+        parser.add_argument('--suppliers', type=int, default=200, help='Total number of suppliers')
+        parser.add_argument('--types', type=int, default=12, help='Total number of type descriptions')
+        parser.add_argument(
+            '--changelog-density', type=float, default=0.3,
+            help='Fraction of entries that get a change history (0-1)',
+        )
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for repeatable data')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert')
+        parser.add_argument(
+            '--project', default=SYNTHETIC_PROJECT, help='Name of the project to add entries to (created if missing)',
+        )
+        parser.add_argument(
+            '--clear', action='store_true',
+            help=(
+                "Delete the project's entries, change logs and closed periods first "
+                '(suppliers and types are shared by all projects and kept)'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            project, _ = Project.objects.get_or_create(name=options['project'])
+            if options['clear']:
+                # Closes go too: their frozen totals describe the deleted entries.
+                PeriodClose.objects.filter(project=project).delete()
+                EntryChangeLog.objects.filter(project=project).delete()
+                ConstructionEntry.objects.filter(project=project).delete()
+                self.stdout.write(f'Cleared the ledger of {project}')
+            counts = generate_ledger(
+                entries=options['entries'],
+                suppliers=options['suppliers'],
+                types=options['types'],
+                changelog_density=options['changelog_density'],
+                seed=options['seed'],
+                batch_size=options['batch_size'],
+                project=project,
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {counts['entries']} entries and {counts['change_logs']} change logs "
+            f"({counts['suppliers']} suppliers, {counts['types']} types)."
+        ))
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from ledger.jobs import claim_next_job, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = (
+        'Run queued background jobs (imports, exports, duplicate scans, invoice summary rebuilds). '
+        'Must run where MEDIA_ROOT is shared with the web process.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds between polls when idle')
+        parser.add_argument(
+            '--stale-after', type=int, default=600,
+            help='Requeue running jobs with no progress for this many seconds (imports resume from their checkpoint)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Job worker started')
+        while True:
+            close_old_connections()
+            requeued = requeue_stale_jobs(options['stale_after'])
+            if requeued:
+                self.stdout.write(self.style.WARNING(f'Requeued {requeued} stale job(s)'))
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+                continue
+            self.stdout.write(f'Running {job}')
+            job = run_job(job)
+            style = self.style.SUCCESS if job.status == 'done' else self.style.ERROR
+            self.stdout.write(style(f'{job}: {job.message}'))
@@ -1,49 +1,91 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth.models import Group, Permission
-from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Q
 
-from ledger.models import ConstructionEntry, Supplier, TypeDescription
+from ledger.permissions import invalidate_permissions
+
+VIEW_PERMISSIONS = [
+    'view_constructionentry',
+    'view_supplier',
+    'view_typedescription',
+]
+
+# Desired ledger permissions of each managed group. The groups end up with
+# exactly these; permissions added to them by hand are removed.
+GROUPS = {
+    'Viewer': VIEW_PERMISSIONS,
+    'Editor': VIEW_PERMISSIONS + [
+        'change_constructionentry',
+        'add_constructionentry',
+        'delete_constructionentry',
+        'change_supplier',
+        'add_supplier',
+        'delete_supplier',
+        'change_typedescription',
+        'add_periodclose',
+        'delete_periodclose',
+    ],
+}
 
 
 class Command(BaseCommand):
-    help = 'Create Viewer and Editor permission groups'
+    help = 'Create or update the Viewer and Editor permission groups'
 
-    def handle(self, *args, **options):
-        # Content types
-        entry_ct = ContentType.objects.get_for_model(ConstructionEntry)
-        supplier_ct = ContentType.objects.get_for_model(Supplier)
-        type_ct = ContentType.objects.get_for_model(TypeDescription)
-
-        # View permissions
-        view_perms = Permission.objects.filter(
-            codename__startswith='view_',
-            content_type__in=[entry_ct, supplier_ct, type_ct],
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Report differences from the desired groups and exit non-zero instead of applying them.',
         )
 
-        # Edit permissions (change + add + delete for entries/suppliers)
-        edit_perms = Permission.objects.filter(
-            content_type__in=[entry_ct, supplier_ct, type_ct],
-            codename__in=[
-                'change_constructionentry',
-                'add_constructionentry',
-                'delete_constructionentry',
-                'change_supplier',
-                'add_supplier',
-                'delete_supplier',
-                'change_typedescription',
-            ],
-        )
+    def handle(self, *args, **options):
+        codenames = {code for codes in GROUPS.values() for code in codes}
+        permission_ids = dict(Permission.objects.filter(
+            content_type__app_label='ledger', codename__in=codenames,
+        ).values_list('codename', 'id'))
+        missing = sorted(codenames - permission_ids.keys())
+        if missing:
+            raise CommandError(f'Missing permissions (run migrate first): {", ".join(missing)}')
+
+        groups = {}   # name -> id
+        current = {}  # (group name, permission label) -> permission id
+        for pk, name, permission_id, app_label, codename in Group.objects.filter(name__in=GROUPS).values_list(
+            'id', 'name', 'permissions__id', 'permissions__content_type__app_label', 'permissions__codename',
+        ):
+            groups[name] = pk
+            if permission_id is not None:
+                label = codename if app_label == 'ledger' else f'{app_label}.{codename}'
+                current[name, label] = permission_id
+        desired = {(name, code) for name, codes in GROUPS.items() for code in codes}
+        new_groups = [name for name in GROUPS if name not in groups]
+        added = sorted(desired - current.keys())
+        removed = sorted(current.keys() - desired)
 
-        # Viewer group
-        viewer, created = Group.objects.get_or_create(name='Viewer')
-        viewer.permissions.set(view_perms)
-        status = 'Created' if created else 'Updated'
-        self.stdout.write(f'{status} Viewer group with {viewer.permissions.count()} permissions')
+        changes = [f'Create group {name}' for name in new_groups]
+        changes += [f'{name}: add {label}' for name, label in added]
+        changes += [f'{name}: remove {label}' for name, label in removed]
+        if not changes:
+            self.stdout.write(self.style.SUCCESS('Permission groups up to date.'))
+            return
+        for change in changes:
+            self.stdout.write(change)
+        if options['check']:
+            raise CommandError(f'Permission groups differ from the desired state ({len(changes)} changes).')
 
-        # Editor group
-        editor, created = Group.objects.get_or_create(name='Editor')
-        editor.permissions.set(view_perms | edit_perms)
-        status = 'Created' if created else 'Updated'
-        self.stdout.write(f'{status} Editor group with {editor.permissions.count()} permissions')
+        Membership = Group.permissions.through
+        with transaction.atomic():
+            for group in Group.objects.bulk_create([Group(name=name) for name in new_groups]):
+                groups[group.name] = group.pk
+            stale = Q()
+            for name, label in removed:
+                stale |= Q(group_id=groups[name], permission_id=current[name, label])
+            if stale:
+                Membership.objects.filter(stale).delete()
+            Membership.objects.bulk_create([
+                Membership(group_id=groups[name], permission_id=permission_ids[code])
+                for name, code in added
+            ])
+            # Bulk writes send no m2m_changed signals.
+            invalidate_permissions()
 
-        self.stdout.write(self.style.SUCCESS('Permission groups ready.'))
+        self.stdout.write(self.style.SUCCESS(f'Permission groups updated ({len(changes)} changes).'))
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ledger.snapshot import write_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        'Write or update the columnar ledger snapshot used for offline analysis '
+        '(see ledger/snapshot.py for the file layout)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', default=str(settings.LEDGER_SNAPSHOT_DIR),
+            help='Snapshot directory (default: LEDGER_SNAPSHOT_DIR)',
+        )
+        parser.add_argument('--full', action='store_true', help='Rebuild instead of appending changes')
+
+    def handle(self, *args, **options):
+        result = write_snapshot(options['output'], full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['mode'].capitalize()} snapshot in {options['output']}: "
+            f"{result['appended']} rows appended, {result['retired']} retired, "
+            f"{result['live_rows']} live of {result['rows']}"
+        ))
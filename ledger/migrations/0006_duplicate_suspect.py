@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ledger', '0005_job_checkpoint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DuplicateSuspect',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reason', models.CharField(choices=[('invoice', 'Same supplier and invoice #'), ('amount', 'Same supplier and cost within a few days')], max_length=10)),
+                ('status', models.CharField(choices=[('open', 'Open'), ('dismissed', 'Not a duplicate')], default='open', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('reviewed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-created_at', 'id'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='job',
+            name='kind',
+            field=models.CharField(choices=[('import_workbook', 'Import workbook'), ('export_entries', 'Export entries'), ('detect_duplicates', 'Detect duplicates')], max_length=30),
+        ),
+        migrations.AddIndex(
+            model_name='constructionentry',
+            index=models.Index(fields=['supplier', 'date'], name='ledger_cons_supplie_63cdd9_idx'),
+        ),
+        migrations.AddField(
+            model_name='duplicatesuspect',
+            name='entry',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='duplicate_suspects', to='ledger.constructionentry'),
+        ),
+        migrations.AddField(
+            model_name='duplicatesuspect',
+            name='original',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ledger.constructionentry'),
+        ),
+        migrations.AddField(
+            model_name='duplicatesuspect',
+            name='reviewed_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='duplicatesuspect',
+            index=models.Index(fields=['status', 'created_at'], name='ledger_dupl_status_ac40dc_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='duplicatesuspect',
+            constraint=models.UniqueConstraint(fields=('entry', 'original', 'reason'), name='unique_duplicate_suspect'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:55
+
+from django.db import migrations, models
+
+from ledger.models import normalize_supplier_name
+
+
+def fill_normalized_names(apps, schema_editor):
+    Supplier = apps.get_model('ledger', 'Supplier')
+    suppliers = list(Supplier.objects.only('name'))
+    for supplier in suppliers:
+        supplier.normalized_name = normalize_supplier_name(supplier.name)
+    Supplier.objects.bulk_update(suppliers, ['normalized_name'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ledger', '0006_duplicate_suspect'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='supplier',
+            name='normalized_name',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=200),
+        ),
+        migrations.RunPython(fill_normalized_names, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:59
+
+import django.db.models.deletion
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Q, Sum
+
+
+def fill_invoice_summaries(apps, schema_editor):
+    # A copy of reconciliation.refresh_invoice_summaries as of this migration.
+    ConstructionEntry = apps.get_model('ledger', 'ConstructionEntry')
+    InvoiceSummary = apps.get_model('ledger', 'InvoiceSummary')
+    groups = (
+        ConstructionEntry.objects.filter(supplier__isnull=False).exclude(invoice_number='')
+        .order_by().values('supplier_id', 'invoice_number')
+        .annotate(
+            entry_count=Count('id'),
+            inv_count=Count('id', filter=Q(posted='Inv')),
+            cost_total=Sum('cost'),
+            invoiced_total=Sum('invoiced_amt'),
+            first_date=Min('date'),
+            last_date=Max('date'),
+        )
+    )
+    cent = Decimal('0.01')
+    rows = []
+    for g in groups.iterator(chunk_size=5000):
+        cost, invoiced = g['cost_total'] or 0, g['invoiced_total']
+        if invoiced is None:
+            status = 'open' if g['inv_count'] else 'paid'
+        else:
+            status = 'matched' if Decimal(cost).quantize(cent) == invoiced.quantize(cent) else 'mismatch'
+        rows.append(InvoiceSummary(**g, difference=(invoiced or 0) - cost, status=status))
+    InvoiceSummary.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ledger', '0007_supplier_normalized_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('invoice_number', models.CharField(max_length=50)),
+                ('entry_count', models.PositiveIntegerField()),
+                ('inv_count', models.PositiveIntegerField()),
+                ('cost_total', models.DecimalField(blank=True, decimal_places=2, max_digits=20, null=True)),
+                ('invoiced_total', models.DecimalField(blank=True, decimal_places=2, max_digits=20, null=True)),
+                ('difference', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('first_date', models.DateField(blank=True, null=True)),
+                ('last_date', models.DateField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('matched', 'Matched'), ('mismatch', 'Invoiced amount differs'), ('open', 'Not invoiced yet'), ('paid', 'Paid, no invoice')], max_length=10)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('supplier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='ledger.supplier')),
+            ],
+            options={
+                'ordering': ['supplier__name', 'invoice_number'],
+                'indexes': [models.Index(fields=['status', 'last_date'], name='ledger_invo_status_83a2f5_idx')],
+                'constraints': [models.UniqueConstraint(fields=('supplier', 'invoice_number'), name='unique_invoice_summary')],
+            },
+        ),
+        migrations.RunPython(fill_invoice_summaries, migrations.RunPython.noop),
+    ]
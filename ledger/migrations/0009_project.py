@@ -0,0 +1,104 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Existing data predates projects and was all one build.
+FIRST_PROJECT_NAME = 'Construction 2022'
+
+
+def assign_first_project(apps, schema_editor):
+    Project = apps.get_model('ledger', 'Project')
+    ConstructionEntry = apps.get_model('ledger', 'ConstructionEntry')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    if not ConstructionEntry.objects.exists() and not User.objects.exists():
+        return
+    project = Project.objects.create(name=FIRST_PROJECT_NAME)
+    project.members.set(User.objects.all())
+    for name in ['ConstructionEntry', 'EntryChangeLog', 'InvoiceSummary', 'Job']:
+        apps.get_model('ledger', name).objects.update(project=project)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ledger', '0008_invoice_summary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Project',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.RemoveConstraint(
+            model_name='invoicesummary',
+            name='unique_invoice_summary',
+        ),
+        migrations.RemoveIndex(
+            model_name='constructionentry',
+            name='ledger_cons_supplie_63cdd9_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='invoicesummary',
+            name='ledger_invo_status_83a2f5_idx',
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='members',
+            field=models.ManyToManyField(blank=True, related_name='ledger_projects', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='constructionentry',
+            name='project',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='entries', to='ledger.project'),
+        ),
+        migrations.AddField(
+            model_name='entrychangelog',
+            name='project',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='ledger.project'),
+        ),
+        migrations.AddField(
+            model_name='invoicesummary',
+            name='project',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='ledger.project'),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='project',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='ledger.project'),
+        ),
+        migrations.AddIndex(
+            model_name='constructionentry',
+            index=models.Index(fields=['project', 'date'], name='ledger_cons_project_5f9fd7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='constructionentry',
+            index=models.Index(fields=['project', 'supplier', 'date'], name='ledger_cons_project_eacc74_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entrychangelog',
+            index=models.Index(fields=['project', 'timestamp'], name='ledger_entr_project_ba957a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoicesummary',
+            index=models.Index(fields=['project', 'status', 'last_date'], name='ledger_invo_project_58a7bc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['project', 'created_at'], name='ledger_job_project_d03a0a_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='invoicesummary',
+            constraint=models.UniqueConstraint(fields=('project', 'supplier', 'invoice_number'), name='unique_invoice_summary'),
+        ),
+        migrations.RunPython(assign_first_project, migrations.RunPython.noop),
+    ]
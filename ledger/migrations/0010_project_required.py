@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Separate from 0009 so PostgreSQL does not alter tables with the
+    # backfill's foreign key checks still pending.
+
+    dependencies = [
+        ('ledger', '0009_project'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='constructionentry',
+            name='project',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='entries', to='ledger.project'),
+        ),
+        migrations.AlterField(
+            model_name='invoicesummary',
+            name='project',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='ledger.project'),
+        ),
+    ]
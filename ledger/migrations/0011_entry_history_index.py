@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ledger', '0010_project_required'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Add the history index before dropping the plain entry index it covers.
+        migrations.AddIndex(
+            model_name='entrychangelog',
+            index=models.Index(fields=['entry', '-timestamp', '-id'], name='ledger_entr_entry_i_6c9ab8_idx'),
+        ),
+        migrations.AlterField(
+            model_name='entrychangelog',
+            name='entry',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='change_logs', to='ledger.constructionentry'),
+        ),
+    ]
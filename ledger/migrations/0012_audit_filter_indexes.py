@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+GIN_INDEX = 'ledger_changelog_changes_gin'
+
+
+def create_changes_gin_index(apps, schema_editor):
+    # Serves the audit log's changed-field filter (changes ? 'field').
+    # jsonb and GIN indexes are PostgreSQL only; other databases filter
+    # the rows the other indexes select.
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {GIN_INDEX} ON ledger_entrychangelog USING gin (changes)')
+
+
+def drop_changes_gin_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {GIN_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ledger', '0011_entry_history_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='entrychangelog',
+            index=models.Index(fields=['project', 'user', 'timestamp'], name='ledger_entr_project_ff3eae_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entrychangelog',
+            index=models.Index(fields=['project', 'action', 'timestamp'], name='ledger_entr_project_4fefbe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entrychangelog',
+            index=models.Index(fields=['project', 'entry_id_snapshot'], name='ledger_entr_project_a3dbdb_idx'),
+        ),
+        migrations.RunPython(create_changes_gin_index, drop_changes_gin_index),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ledger', '0012_audit_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='entrychangelog',
+            name='ledger_entr_project_a3dbdb_idx',
+        ),
+        migrations.RenameField(
+            model_name='entrychangelog',
+            old_name='entry_id_snapshot',
+            new_name='object_id',
+        ),
+        migrations.AddField(
+            model_name='entrychangelog',
+            name='model',
+            field=models.CharField(choices=[('constructionentry', 'Entry'), ('supplier', 'Supplier'), ('typedescription', 'Type')], default='constructionentry', max_length=30),
+        ),
+        migrations.AddIndex(
+            model_name='entrychangelog',
+            index=models.Index(fields=['project', 'model', 'object_id'], name='ledger_entr_project_791d71_idx'),
+        ),
+    ]
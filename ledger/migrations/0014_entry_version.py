@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ledger', '0013_change_log_model'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='constructionentry',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
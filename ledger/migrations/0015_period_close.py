@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ledger', '0014_entry_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PeriodClose',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.DateField(blank=True, null=True)),
+                ('end', models.DateField()),
+                ('entry_count', models.PositiveIntegerField(default=0)),
+                ('cost_total', models.DecimalField(blank=True, decimal_places=2, max_digits=20, null=True)),
+                ('closed_at', models.DateTimeField(auto_now_add=True)),
+                ('closed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='period_closes', to='ledger.project')),
+            ],
+            options={
+                'ordering': ['project', '-end'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PeriodTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lm', models.CharField(blank=True, max_length=5)),
+                ('posted', models.CharField(blank=True, max_length=10)),
+                ('entry_count', models.PositiveIntegerField()),
+                ('cost_total', models.DecimalField(blank=True, decimal_places=2, max_digits=20, null=True)),
+                ('first_date', models.DateField(blank=True, null=True)),
+                ('last_date', models.DateField(blank=True, null=True)),
+                ('close', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='totals', to='ledger.periodclose')),
+                ('supplier', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='ledger.supplier')),
+                ('type_description', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='ledger.typedescription')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='periodclose',
+            constraint=models.UniqueConstraint(fields=('project', 'end'), name='unique_period_close'),
+        ),
+    ]
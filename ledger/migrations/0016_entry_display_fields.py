@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:34
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_display_fields(apps, schema_editor):
+    ConstructionEntry = apps.get_model('ledger', 'ConstructionEntry')
+    Supplier = apps.get_model('ledger', 'Supplier')
+    TypeDescription = apps.get_model('ledger', 'TypeDescription')
+    ConstructionEntry.objects.filter(supplier__isnull=False).update(
+        supplier_name=Subquery(Supplier.objects.filter(pk=OuterRef('supplier_id')).values('name')[:1]),
+    )
+    ConstructionEntry.objects.filter(type_description__isnull=False).update(
+        type_code=Subquery(TypeDescription.objects.filter(pk=OuterRef('type_description_id')).values('code')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ledger', '0015_period_close'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='constructionentry',
+            name='supplier_name',
+            field=models.CharField(blank=True, default='', editable=False, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='constructionentry',
+            name='type_code',
+            field=models.CharField(blank=True, default='', editable=False, max_length=10),
+        ),
+        migrations.RunPython(copy_display_fields, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ledger', '0017_user_preference'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='job',
+            name='kind',
+            field=models.CharField(choices=[('import_workbook', 'Import workbook'), ('export_entries', 'Export entries'), ('detect_duplicates', 'Detect duplicates'), ('rebuild_invoice_summaries', 'Rebuild invoice summaries')], max_length=30),
+        ),
+    ]
@@ -1,15 +1,69 @@
+import re
+import unicodedata
+
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.core.exceptions import PermissionDenied
+from django.db import models, transaction
+from django.utils import timezone
+
+from .tracking import TrackedModel, TrackedQuerySet
+
+# Words that do not distinguish one supplier from another.
+SUPPLIER_NOISE_WORDS = {'the', 'inc', 'llc', 'ltd', 'co', 'corp', 'company', 'and'}
+
+
+def normalize_supplier_name(name):
+    """
+    Reduce a supplier name to the key used to spot duplicates: accents,
+    case, punctuation, store numbers ("#123") and noise words are dropped,
+    so "HOME DEPOT #123" and "Home Depot, Inc." both become "home depot".
+    """
+    name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode().lower()
+    name = re.sub(r'#\s*\w+', ' ', name).replace("'", '')
+    words = re.sub(r'[^a-z0-9]+', ' ', name).split()
+    return ' '.join(w for w in words if w not in SUPPLIER_NOISE_WORDS) or ' '.join(words)
+
+
+class Supplier(TrackedModel):
+    name = models.CharField(max_length=200, unique=True)
+    normalized_name = models.CharField(max_length=200, blank=True, db_index=True, editable=False)
+
+    def __str__(self):
+        return self.name
+
+    def save(self, *args, **kwargs):
+        self.normalized_name = normalize_supplier_name(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'normalized_name'}
+        renamed = not self._state.adding and 'name' in self.tracked_changes(update_fields)
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            super().save(*args, **kwargs)
+            if renamed:
+                ConstructionEntry.objects.filter(supplier=self).update(supplier_name=self.name)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            ConstructionEntry.objects.filter(supplier=self).update(supplier_name='')
+            return super().delete(*args, **kwargs)
 
 
-class Supplier(models.Model):
+class Project(models.Model):
+    """A build with its own ledger. Suppliers and types are shared by all projects."""
+
     name = models.CharField(max_length=200, unique=True)
+    # Users who may see and work on the project; superusers see every project.
+    members = models.ManyToManyField(get_user_model(), blank=True, related_name='ledger_projects')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['name']
 
     def __str__(self):
         return self.name
 
 
-class TypeDescription(models.Model):
+class TypeDescription(TrackedModel):
     code = models.CharField(max_length=10)
     description = models.CharField(max_length=100)
 
@@ -20,8 +74,61 @@ class TypeDescription(models.Model):
     def __str__(self):
         return f"{self.code} - {self.description}"
 
+    def save(self, *args, **kwargs):
+        recoded = not self._state.adding and 'code' in self.tracked_changes(kwargs.get('update_fields'))
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            super().save(*args, **kwargs)
+            if recoded:
+                ConstructionEntry.objects.filter(type_description=self).update(type_code=self.code)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            ConstructionEntry.objects.filter(type_description=self).update(type_code='')
+            return super().delete(*args, **kwargs)
+
+
+class EntryConflict(Exception):
+    """An entry saved with `expected_version` had been changed by someone else."""
+
+
+class PeriodClosed(PermissionDenied):
+    """An entry inside a closed period was to be created, changed or deleted."""
+
+
+class EntryQuerySet(TrackedQuerySet):
+    def update(self, **kwargs):
+        kwargs.setdefault('version', models.F('version') + 1)
+        for name, (column, source) in self.model.DISPLAY_FIELDS.items():
+            field = self.model._meta.get_field(name)
+            for key in (name, field.attname):
+                if key in kwargs and column not in kwargs:
+                    value = kwargs[key]
+                    if isinstance(value, models.Model):
+                        kwargs[column] = getattr(value, source)
+                    elif value is None:
+                        kwargs[column] = ''
+                    else:
+                        kwargs[column] = field.related_model.objects.filter(pk=value).values_list(
+                            source, flat=True,
+                        ).first() or ''
+        updated = super().update(**kwargs)
+        from .engine import invalidate_ledger
+        # update() sends no signals, so drop the cached ledger frames here.
+        invalidate_ledger()
+        return updated
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        fill_display_fields(objs)
+        return super().bulk_create(objs, *args, **kwargs)
+
+
+class ConstructionEntry(TrackedModel):
+    CHANGE_LOG_FIELDS = {'entry_id': 'id', 'project_id': 'project_id'}
+    # Copies of related values that list pages show, so they need no join:
+    # {foreign key: (column, field of the related model)}.
+    DISPLAY_FIELDS = {'supplier': ('supplier_name', 'name'), 'type_description': ('type_code', 'code')}
 
-class ConstructionEntry(models.Model):
     LM_CHOICES = [
         ('L', 'Labor'),
         ('M', 'Materials'),
@@ -40,6 +147,8 @@ class ConstructionEntry(models.Model):
         ('SR In Store', 'SR In Store'),
     ]
 
+    # Indexed through the composite indexes below, which all lead with it.
+    project = models.ForeignKey(Project, on_delete=models.PROTECT, related_name='entries', db_index=False)
     date = models.DateField(null=True, blank=True)
     description = models.CharField(max_length=500, blank=True, default='')
     stage = models.CharField(max_length=20, blank=True, default='')
@@ -63,17 +172,136 @@ class ConstructionEntry(models.Model):
         TypeDescription, on_delete=models.SET_NULL, null=True, blank=True,
         verbose_name='Type'
     )
+    # Bumped by every save and update; see save(expected_version=...).
+    version = models.PositiveIntegerField(default=1, editable=False)
+    # DISPLAY_FIELDS copies, kept in step by save(), EntryQuerySet and the
+    # Supplier and TypeDescription save() and delete().
+    supplier_name = models.CharField(max_length=200, blank=True, default='', editable=False)
+    type_code = models.CharField(max_length=10, blank=True, default='', editable=False)
+
+    objects = EntryQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Construction Entry"
         verbose_name_plural = "Construction Entries"
         ordering = ['date', 'id']
+        indexes = [
+            models.Index(fields=['project', 'date']),
+            models.Index(fields=['project', 'supplier', 'date']),
+        ]
 
     def __str__(self):
         return f"{self.date} - {self.description[:50]}"
 
+    @property
+    def invoice_key(self):
+        return (self.project_id, self.supplier_id, self.invoice_number)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember which invoice the row belonged to when loaded, so a save
+        # that moves it can refresh the old invoice summary too.
+        if {'project_id', 'supplier_id', 'invoice_number'} <= instance.__dict__.keys():
+            instance._loaded_invoice_key = instance.invoice_key
+        return instance
+
+    def save(self, *args, expected_version=None, **kwargs):
+        """
+        Save, bumping the version in the row. With `expected_version` the
+        UPDATE only matches the row while it still has that version, so a
+        concurrent edit raises EntryConflict instead of being overwritten;
+        no row is read or locked to check it.
+        """
+        self.check_period_open()
+        loaded = getattr(self, '_loaded_values', {})
+        changed = [
+            name for name in self.DISPLAY_FIELDS
+            if self._state.adding or loaded.get(name) != getattr(self, self._meta.get_field(name).attname)
+        ]
+        fill_display_fields([self], changed)
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            display_columns = [
+                self.DISPLAY_FIELDS[name][0] for name in changed
+                if name in update_fields or self._meta.get_field(name).attname in update_fields
+            ]
+            kwargs['update_fields'] = {*update_fields, *display_columns}
+        self._expected_version = expected_version
+        try:
+            super().save(*args, **kwargs)
+        finally:
+            self._expected_version = None
+
+    def _do_update(self, base_qs, using, pk_val, values, *args, **kwargs):
+        # Every UPDATE bumps the stored version, like EntryQuerySet.update(),
+        # rather than writing the one this instance happened to load.
+        version = self._meta.get_field('version')
+        values = [value for value in values if value[0] is not version]
+        values.append((version, None, models.F('version') + 1))
+        expected = getattr(self, '_expected_version', None)
+        if expected is None:
+            updated = super()._do_update(base_qs, using, pk_val, values, *args, **kwargs)
+            # Read back on first use, so a save still needs no SELECT.
+            self.__dict__.pop('version', None)
+            return updated
+        updated = super()._do_update(base_qs.filter(version=expected), using, pk_val, values, *args, **kwargs)
+        if not updated:
+            # Raised rather than returned, or save() would fall back to an INSERT.
+            raise EntryConflict(f'Entry #{pk_val} was changed by someone else.')
+        self.version = expected + 1
+        return updated
+
+    def delete(self, *args, **kwargs):
+        self.check_period_open()
+        return super().delete(*args, **kwargs)
+
+    def check_period_open(self):
+        """Raise PeriodClosed if the entry is, or was loaded, dated inside a closed period."""
+        from .periods import closed_through, is_closed
+
+        through = closed_through(self.project_id)
+        if is_closed(through, self.date, getattr(self, '_loaded_values', {}).get('date')):
+            raise PeriodClosed(f'Entries dated up to {through:%Y-%m-%d} are closed.')
+
+
+def fill_display_fields(entries, names=None):
+    """
+    Set the DISPLAY_FIELDS copies of `entries` (of the foreign keys in
+    `names`, default all) from their related objects, reading the ones not
+    already loaded with one query per foreign key.
+    """
+    for name, (column, source) in ConstructionEntry.DISPLAY_FIELDS.items():
+        if names is not None and name not in names:
+            continue
+        field = ConstructionEntry._meta.get_field(name)
+        missing = {
+            getattr(e, field.attname) for e in entries
+            if getattr(e, field.attname) is not None and not field.is_cached(e)
+        }
+        values = dict(field.related_model.objects.filter(pk__in=missing).values_list('pk', source)) if missing else {}
+        for e in entries:
+            pk = getattr(e, field.attname)
+            if pk is None:
+                value = ''
+            elif field.is_cached(e):
+                value = getattr(getattr(e, name), source)
+            else:
+                value = values.get(pk, '')
+            setattr(e, column, value)
+
 
 class EntryChangeLog(models.Model):
+    """
+    A create, edit, split or delete of a ledger record (see tracking.py).
+
+    `model` and `object_id` name the record and outlive it; `entry` links
+    entry changes to the entry while it exists. Supplier and type changes
+    are logged under the project they were made from.
+    """
+
     ACTION_CHOICES = [
         ('create', 'Create'),
         ('edit',   'Edit'),
@@ -81,13 +309,23 @@ class EntryChangeLog(models.Model):
         ('split',  'Split'),
     ]
 
+    MODEL_CHOICES = [
+        ('constructionentry', 'Entry'),
+        ('supplier', 'Supplier'),
+        ('typedescription', 'Type'),
+    ]
+
+    model = models.CharField(max_length=30, choices=MODEL_CHOICES, default='constructionentry')
+    object_id = models.IntegerField(null=True, blank=True)
     entry = models.ForeignKey(
         ConstructionEntry,
         on_delete=models.SET_NULL,
         null=True, blank=True,
         related_name='change_logs',
+        db_index=False,
     )
-    entry_id_snapshot = models.IntegerField(null=True, blank=True)
+    # Kept with the log so deleted entries still show in their project's audit log.
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, null=True, blank=True)
     user = models.ForeignKey(
         get_user_model(),
         on_delete=models.SET_NULL,
@@ -100,8 +338,217 @@ class EntryChangeLog(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['project', 'timestamp']),
+            models.Index(fields=['entry', '-timestamp', '-id']),
+            # audit_log filters; on PostgreSQL `changes` also has a GIN index (migration 0012).
+            models.Index(fields=['project', 'user', 'timestamp']),
+            models.Index(fields=['project', 'action', 'timestamp']),
+            models.Index(fields=['project', 'model', 'object_id']),
+        ]
         verbose_name = "Entry Change Log"
         verbose_name_plural = "Entry Change Logs"
 
     def __str__(self):
-        return f"{self.timestamp:%Y-%m-%d %H:%M} — {self.action} entry #{self.entry_id_snapshot}"
+        return f"{self.timestamp:%Y-%m-%d %H:%M} — {self.action} {self.get_model_display().lower()} #{self.object_id}"
+
+
+class Job(models.Model):
+    KIND_CHOICES = [
+        ('import_workbook', 'Import workbook'),
+        ('export_entries', 'Export entries'),
+        ('detect_duplicates', 'Detect duplicates'),
+        ('rebuild_invoice_summaries', 'Rebuild invoice summaries'),
+    ]
+
+    STATUS_CHOICES = [
+        ('uploaded', 'Awaiting confirmation'),
+        ('queued',  'Queued'),
+        ('running', 'Running'),
+        ('done',    'Done'),
+        ('failed',  'Failed'),
+    ]
+
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, null=True, blank=True)
+    params = models.JSONField(default=dict, blank=True)
+    file = models.FileField(upload_to='jobs/input/', blank=True)
+    result_file = models.FileField(upload_to='jobs/results/', blank=True)
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(null=True, blank=True)
+    message = models.CharField(max_length=500, blank=True)
+    # Last workbook row committed by an import; a resumed import continues after it.
+    last_row = models.PositiveIntegerField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    created_by = models.ForeignKey(
+        get_user_model(),
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['project', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.pk} ({self.status})"
+
+    @property
+    def percent(self):
+        if not self.total:
+            return 100 if self.status == 'done' else 0
+        return min(100, int(self.progress * 100 / self.total))
+
+    def set_progress(self, progress, total=None, message=None):
+        """Persist progress without overwriting other fields of the row."""
+        self.progress = progress
+        self.heartbeat_at = timezone.now()
+        fields = {'progress': progress, 'heartbeat_at': self.heartbeat_at}
+        if total is not None:
+            self.total = fields['total'] = total
+        if message is not None:
+            self.message = fields['message'] = message[:500]
+        Job.objects.filter(pk=self.pk).update(**fields)
+
+    def set_last_row(self, row):
+        """Record the last committed workbook row; call it in the batch's transaction."""
+        self.last_row = row
+        self.heartbeat_at = timezone.now()
+        Job.objects.filter(pk=self.pk).update(last_row=row, heartbeat_at=self.heartbeat_at)
+
+
+class DuplicateSuspect(models.Model):
+    REASON_CHOICES = [
+        ('invoice', 'Same supplier and invoice #'),
+        ('amount',  'Same supplier and cost within a few days'),
+    ]
+
+    STATUS_CHOICES = [
+        ('open',      'Open'),
+        ('dismissed', 'Not a duplicate'),
+    ]
+
+    # `entry` is the later row of the pair, `original` the earlier one.
+    entry = models.ForeignKey(ConstructionEntry, on_delete=models.CASCADE, related_name='duplicate_suspects')
+    original = models.ForeignKey(ConstructionEntry, on_delete=models.CASCADE, related_name='+')
+    reason = models.CharField(max_length=10, choices=REASON_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='open')
+    created_at = models.DateTimeField(auto_now_add=True)
+    reviewed_by = models.ForeignKey(
+        get_user_model(),
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+    )
+    reviewed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at', 'id']
+        constraints = [
+            models.UniqueConstraint(fields=['entry', 'original', 'reason'], name='unique_duplicate_suspect'),
+        ]
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+    def __str__(self):
+        return f"#{self.entry_id} duplicates #{self.original_id} ({self.reason})"
+
+
+class InvoiceSummary(models.Model):
+    """Per project, supplier and invoice number totals, kept up to date by reconciliation.py."""
+
+    STATUS_CHOICES = [
+        ('matched',  'Matched'),
+        ('mismatch', 'Invoiced amount differs'),
+        ('open',     'Not invoiced yet'),
+        ('paid',     'Paid, no invoice'),
+    ]
+    UNRECONCILED = ['mismatch', 'open']
+
+    project = models.ForeignKey(Project, on_delete=models.CASCADE)
+    supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE)
+    invoice_number = models.CharField(max_length=50)
+    entry_count = models.PositiveIntegerField()
+    inv_count = models.PositiveIntegerField()
+    cost_total = models.DecimalField(max_digits=20, decimal_places=2, null=True, blank=True)
+    invoiced_total = models.DecimalField(max_digits=20, decimal_places=2, null=True, blank=True)
+    difference = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    first_date = models.DateField(null=True, blank=True)
+    last_date = models.DateField(null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['supplier__name', 'invoice_number']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['project', 'supplier', 'invoice_number'], name='unique_invoice_summary',
+            ),
+        ]
+        indexes = [models.Index(fields=['project', 'status', 'last_date'])]
+
+    def __str__(self):
+        return f"{self.supplier} / {self.invoice_number} ({self.status})"
+
+
+class PeriodClose(models.Model):
+    """
+    A closed period of a project: its entries dated from `start` (the day
+    after the previous close, or the beginning) to `end` are locked and
+    their totals frozen into PeriodTotal rows (see periods.py).
+    """
+
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='period_closes')
+    start = models.DateField(null=True, blank=True)
+    end = models.DateField()
+    entry_count = models.PositiveIntegerField(default=0)
+    cost_total = models.DecimalField(max_digits=20, decimal_places=2, null=True, blank=True)
+    closed_by = models.ForeignKey(
+        get_user_model(),
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+    )
+    closed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['project', '-end']
+        constraints = [
+            models.UniqueConstraint(fields=['project', 'end'], name='unique_period_close'),
+        ]
+
+    def __str__(self):
+        return f"{self.project} closed through {self.end:%Y-%m-%d}"
+
+
+class PeriodTotal(models.Model):
+    """Frozen totals of a closed period's entries sharing an L/M, posted status, type and supplier."""
+
+    close = models.ForeignKey(PeriodClose, on_delete=models.CASCADE, related_name='totals')
+    lm = models.CharField(max_length=5, blank=True)
+    posted = models.CharField(max_length=10, blank=True)
+    type_description = models.ForeignKey(TypeDescription, on_delete=models.SET_NULL, null=True, blank=True)
+    supplier = models.ForeignKey(Supplier, on_delete=models.SET_NULL, null=True, blank=True)
+    entry_count = models.PositiveIntegerField()
+    cost_total = models.DecimalField(max_digits=20, decimal_places=2, null=True, blank=True)
+    first_date = models.DateField(null=True, blank=True)
+    last_date = models.DateField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.close}: {self.lm or '-'} / {self.supplier_id or '-'} ({self.entry_count})"
+
+
+class UserPreference(models.Model):
+    """A user's display settings (see preferences.py)."""
+
+    user = models.OneToOneField(get_user_model(), on_delete=models.CASCADE, related_name='ledger_preference')
+    entry_page_size = models.PositiveIntegerField(default=25)
+    # Keys of preferences.ENTRY_COLUMNS shown by entry_list.
+    entry_columns = models.JSONField(default=list, blank=True)
+
+    def __str__(self):
+        return f"Preferences of {self.user}"
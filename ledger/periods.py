@@ -0,0 +1,121 @@
+"""
+Fiscal period close.
+
+Closing a period freezes the totals of a project's entries dated up to its
+end into PeriodTotal rows, one per L/M, posted status, type and supplier,
+and locks those entries: ConstructionEntry.save() and delete() raise
+PeriodClosed for them. Each close starts the day after the previous one,
+so the closed part of a project is always "dated on or before the last
+close's end" (`closed_through`). Undated entries are never closed.
+
+Aggregates over a project then add the frozen rows to a live query over
+the open period only (`ledger_groups`). Supplier merges move the frozen
+rows along with the entries, so totals by supplier still agree.
+"""
+import datetime
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q, Sum
+
+from .filters import filter_entries
+from .models import ConstructionEntry, PeriodClose, PeriodTotal, Project
+
+GROUP_FIELDS = ['lm', 'posted', 'type_description_id', 'supplier_id']
+# entry_list filters the frozen rows can answer, and the fields they match.
+SNAPSHOT_FILTERS = {'supplier': 'supplier_id', 'type': 'type_description_id', 'lm': 'lm', 'posted': 'posted'}
+
+_missing = object()
+
+
+def closed_through(project_id):
+    """
+    The end of the project's last closed period, or None. Not cached: entry
+    writes are locked by it, and a per-process cache would miss closes and
+    reopens made by other workers.
+    """
+    return PeriodClose.objects.filter(project_id=project_id).aggregate(end=Max('end'))['end']
+
+
+def is_closed(through, *dates):
+    """Whether any of `dates` falls inside the periods closed through `through`."""
+    return through is not None and any(d is not None and d <= through for d in dates)
+
+
+def sum_totals(values):
+    """Sum Decimal totals like SQL SUM: None unless some value is present."""
+    values = [v for v in values if v is not None]
+    return sum(values) if values else None
+
+
+def close_period(project, end, user=None):
+    """Close the project's open entries dated up to `end`. Returns the PeriodClose."""
+    with transaction.atomic():
+        # Serializes closes of the project, so each starts where the last ended.
+        Project.objects.select_for_update().filter(pk=project.pk).first()
+        previous = PeriodClose.objects.filter(project=project).aggregate(end=Max('end'))['end']
+        if previous is not None and end <= previous:
+            raise ValueError(f'Entries up to {previous:%Y-%m-%d} are already closed.')
+        entries = ConstructionEntry.objects.filter(project=project, date__lte=end)
+        if previous is not None:
+            entries = entries.filter(date__gt=previous)
+        groups = list(
+            entries.order_by().values(*GROUP_FIELDS)
+            .annotate(count=Count('id'), total=Sum('cost'), min_date=Min('date'), max_date=Max('date'))
+        )
+        close = PeriodClose.objects.create(
+            project=project, start=previous and previous + datetime.timedelta(days=1), end=end,
+            entry_count=sum(g['count'] for g in groups), cost_total=sum_totals(g['total'] for g in groups),
+            closed_by=user,
+        )
+        PeriodTotal.objects.bulk_create([
+            PeriodTotal(
+                close=close, **{name: g[name] for name in GROUP_FIELDS}, entry_count=g['count'],
+                cost_total=g['total'], first_date=g['min_date'], last_date=g['max_date'],
+            )
+            for g in groups
+        ], batch_size=1000)
+    return close
+
+
+def reopen_period(close):
+    """Reopen the project's last closed period, unlocking its entries."""
+    with transaction.atomic():
+        Project.objects.select_for_update().filter(pk=close.project_id).first()
+        last = PeriodClose.objects.filter(project_id=close.project_id).order_by('-end').first()
+        if last is None or last.pk != close.pk:
+            raise ValueError('Only the last closed period can be reopened.')
+        close.delete()
+
+
+def ledger_groups(project, filters=None, through=_missing):
+    """
+    Totals of the project's entries per GROUP_FIELDS: the frozen rows of the
+    closed periods plus a grouped query over the open period. Each group is
+    a dict with the GROUP_FIELDS, `count`, `total`, `min_date` and
+    `max_date`; a group may appear once from each side. `filters` may only
+    use SNAPSHOT_FILTERS.
+    """
+    filters = {name: value for name, value in (filters or {}).items() if value}
+    if through is _missing:
+        through = closed_through(project.pk)
+    live = filter_entries(ConstructionEntry.objects.filter(project=project), filters)
+    groups = []
+    if through is not None:
+        live = live.filter(Q(date__gt=through) | Q(date__isnull=True))
+        # Only closes up to `through`, so no period is counted twice.
+        frozen = PeriodTotal.objects.filter(
+            close__project=project, close__end__lte=through,
+            **{SNAPSHOT_FILTERS[name]: value for name, value in filters.items()},
+        )
+        groups += (
+            frozen.order_by().values(*GROUP_FIELDS)
+            .annotate(
+                count=Sum('entry_count'), total=Sum('cost_total'),
+                min_date=Min('first_date'), max_date=Max('last_date'),
+            )
+        )
+    groups += (
+        live.order_by().values(*GROUP_FIELDS)
+        .annotate(count=Count('id'), total=Sum('cost'), min_date=Min('date'), max_date=Max('date'))
+    )
+    return groups
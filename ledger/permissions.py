@@ -0,0 +1,129 @@
+"""
+Cached authorization.
+
+With LEDGER_CACHE_PERMISSIONS on, CachedModelBackend answers permission
+checks (permission_required, the `perms` template variable) from the cache
+instead of joining the user's groups and permissions on every request.
+Cached sets live under a version token that signals.py replaces once a
+change to a membership or a group's permissions commits, so it applies
+from the next request on. Only turn it on with a cache every worker shares.
+
+With LEDGER_CACHE_USERS on, it also keeps the user loaded for each request
+in the cache; signals.py drops it when the user is saved or deleted.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.db import transaction
+
+from .forms import LEDGER_PERMISSIONS
+
+PERMISSIONS_TIMEOUT = 60 * 60
+VERSION_KEY = 'ledger:perms:version'
+
+
+def _version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+async def _aversion():
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        await cache.aadd(VERSION_KEY, time.time_ns(), None)
+        version = await cache.aget(VERSION_KEY)
+    return version
+
+
+def _permissions_key(user_obj, version):
+    # Superuser status is part of the key: it is a field, not a membership.
+    return f'ledger:perms:{version}:{user_obj.pk}:{int(user_obj.is_superuser)}'
+
+
+def invalidate_permissions():
+    # After commit, so a rolled-back change keeps the cache and no request
+    # can cache the old permissions again.
+    transaction.on_commit(lambda: cache.set(VERSION_KEY, time.time_ns(), None))
+
+
+def _user_key(user_id):
+    return f'ledger:user:{user_id}'
+
+
+def invalidate_user(user_id):
+    # After commit, so no request can cache the old row again.
+    transaction.on_commit(lambda: cache.delete(_user_key(user_id)))
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        if not settings.LEDGER_CACHE_USERS:
+            return super().get_user(user_id)
+        key = _user_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, PERMISSIONS_TIMEOUT)
+        return user
+
+    async def aget_user(self, user_id):
+        if not settings.LEDGER_CACHE_USERS:
+            return await super().aget_user(user_id)
+        key = _user_key(user_id)
+        user = await cache.aget(key)
+        if user is None:
+            user = await super().aget_user(user_id)
+            if user is not None:
+                await cache.aset(key, user, PERMISSIONS_TIMEOUT)
+        return user
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not settings.LEDGER_CACHE_PERMISSIONS:
+            return super().get_all_permissions(user_obj, obj)
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, '_perm_cache'):
+            key = _permissions_key(user_obj, _version())
+            perms = cache.get(key)
+            if perms is None:
+                perms = super().get_all_permissions(user_obj)
+                cache.set(key, perms, PERMISSIONS_TIMEOUT)
+            user_obj._perm_cache = perms
+        return user_obj._perm_cache
+
+    async def aget_all_permissions(self, user_obj, obj=None):
+        if not settings.LEDGER_CACHE_PERMISSIONS:
+            return await super().aget_all_permissions(user_obj, obj)
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, '_perm_cache'):
+            key = _permissions_key(user_obj, await _aversion())
+            perms = await cache.aget(key)
+            if perms is None:
+                perms = {
+                    *await self.aget_user_permissions(user_obj),
+                    *await self.aget_group_permissions(user_obj),
+                }
+                await cache.aset(key, perms, PERMISSIONS_TIMEOUT)
+            user_obj._perm_cache = perms
+        return user_obj._perm_cache
+
+
+def ledger_permission_ids():
+    """Return {codename: Permission id} for LEDGER_PERMISSIONS."""
+    key = f'ledger:perms:ids:{_version()}'
+    ids = cache.get(key)
+    if ids is None:
+        ids = dict(Permission.objects.filter(
+            content_type__app_label='ledger',
+            codename__in=[code for code, _, _ in LEDGER_PERMISSIONS],
+        ).values_list('codename', 'id'))
+        cache.set(key, ids, PERMISSIONS_TIMEOUT)
+    return ids
@@ -0,0 +1,87 @@
+"""
+Per-user entry_list settings: how many rows a page shows and which columns.
+
+The settings are saved in UserPreference and cached per user. entry_list
+loads only the model fields its chosen columns show (`entry_list_fields`),
+so long text such as notes is read only by users who show it.
+"""
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import UserPreference
+
+PREFERENCES_TIMEOUT = 60 * 60
+PAGE_SIZES = [25, 50, 100, 250, 500]
+DEFAULT_PAGE_SIZE = 25
+
+# (key, label, kind, model field shown, sort field or None). `kind` picks
+# how the table cell renders the value.
+ENTRY_COLUMNS = [
+    ('date',           'Date',          'date',     'date',           'date'),
+    ('description',    'Description',   'long',     'description',    'description'),
+    ('supplier',       'Supplier',      'supplier', 'supplier_name',  'supplier_name'),
+    ('type',           'Type',          'text',     'type_code',      'type_code'),
+    ('lm',             'L/M',           'lm',       'lm',             'lm'),
+    ('cost',           'Cost',          'money',    'cost',           'cost'),
+    ('posted',         'Posted',        'text',     'posted',         None),
+    ('stage',          'Stage',         'text',     'stage',          'stage'),
+    ('lc_stage',       'LC-Stage',      'text',     'lc_stage',       'lc_stage'),
+    ('estimate',       'Estimate',      'money',    'estimate',       'estimate'),
+    ('qty',            'QTY',           'number',   'qty',            'qty'),
+    ('supplies_cost',  'Supplies Cost', 'money',    'supplies_cost',  'supplies_cost'),
+    ('tax_fees',       'Tax/Fees',      'money',    'tax_fees',       'tax_fees'),
+    ('invoiced_amt',   'Invoiced Amt',  'money',    'invoiced_amt',   'invoiced_amt'),
+    ('supervisor',     'Supervisor',    'text',     'supervisor',     'supervisor'),
+    ('invoice_number', 'Invoice #',     'text',     'invoice_number', 'invoice_number'),
+    ('delivery_type',  'Delivery Type', 'text',     'delivery_type',  'delivery_type'),
+    ('materials',      'Materials',     'text',     'materials',      'materials'),
+    ('book_number',    'Book #',        'text',     'book_number',    'book_number'),
+    ('notes',          'Notes',         'long',     'notes',          None),
+]
+DEFAULT_COLUMNS = ['date', 'description', 'supplier', 'type', 'lm', 'cost', 'posted']
+
+ENTRY_COLUMN_CHOICES = [(key, label) for key, label, _, _, _ in ENTRY_COLUMNS]
+_COLUMNS_BY_KEY = {
+    key: {'key': key, 'label': label, 'kind': kind, 'field': field, 'sort': sort}
+    for key, label, kind, field, sort in ENTRY_COLUMNS
+}
+
+
+def _preferences_key(user_id):
+    return f'ledger:prefs:{user_id}'
+
+
+def entry_list_preferences(user):
+    """Return (page size, [column dicts]) of the user's entry_list, in table order."""
+    key = _preferences_key(user.pk)
+    prefs = cache.get(key)
+    if prefs is None:
+        preference = UserPreference.objects.filter(user=user).first()
+        prefs = (
+            (preference.entry_page_size, preference.entry_columns) if preference
+            else (DEFAULT_PAGE_SIZE, DEFAULT_COLUMNS)
+        )
+        cache.set(key, prefs, PREFERENCES_TIMEOUT)
+    page_size, keys = prefs
+    if page_size not in PAGE_SIZES:
+        page_size = DEFAULT_PAGE_SIZE
+    # Columns keep the ENTRY_COLUMNS order; unknown keys (removed columns) are dropped.
+    columns = [_COLUMNS_BY_KEY[key] for key, *_ in ENTRY_COLUMNS if key in keys] or [
+        _COLUMNS_BY_KEY[key] for key in DEFAULT_COLUMNS
+    ]
+    return page_size, columns
+
+
+def save_entry_list_preferences(user, page_size, column_keys):
+    UserPreference.objects.update_or_create(
+        user=user, defaults={'entry_page_size': page_size, 'entry_columns': list(column_keys)},
+    )
+    transaction.on_commit(lambda: cache.delete(_preferences_key(user.pk)))
+
+
+def entry_list_fields(columns):
+    """The model fields entry_list loads for `columns`: their values plus what links and caching need."""
+    fields = ['version', *(column['field'] for column in columns)]
+    if any(column['kind'] == 'supplier' for column in columns):
+        fields.append('supplier_id')
+    return fields
@@ -0,0 +1,31 @@
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from ledger.models import Project, ConstructionEntry
+from ledger.synthetic import generate_ledger
+from ledger.tests import TEST_STORAGES
+
+@override_settings(STORAGES=TEST_STORAGES)
+class Probe(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser('admin', password='pw')
+        cls.project = Project.objects.create(name='A')
+        generate_ledger(entries=20, suppliers=3, types=2, changelog_density=0.5, seed=1, project=cls.project)
+    def setUp(self):
+        self.client.raise_request_exception = False
+        self.client.force_login(self.user)
+    def test_probe(self):
+        for url in [
+            reverse('ledger:audit_log') + '?user=abc',
+            reverse('ledger:audit_log') + '?model=supplier',
+            reverse('ledger:reconciliation') + '?supplier=abc',
+            reverse('ledger:reconciliation') + '?status=bogus',
+            reverse('ledger:entry_list') + '?supplier=abc',
+            reverse('ledger:entry_list') + '?page=999',
+            reverse('ledger:entry_split', args=[ConstructionEntry.objects.first().pk]) + '?n=abc',
+            reverse('ledger:supplier_detail', args=[99999]),
+            reverse('ledger:supplier_autocomplete') + '?q=',
+        ]:
+            r = self.client.get(url)
+            print(r.status_code, url)
@@ -0,0 +1,48 @@
+"""
+The current project.
+
+Every ledger page shows one project at a time: the one chosen with the
+project switcher, kept in the session, or else the first project the user
+may see. Users see the projects they are members of; superusers see all.
+"""
+from django.core.exceptions import PermissionDenied
+
+from .models import Project
+
+SESSION_KEY = 'ledger_project_id'
+
+
+def user_projects(user):
+    if user.is_superuser:
+        return Project.objects.all()
+    return Project.objects.filter(members=user)
+
+
+def current_project(request):
+    """Return the request's project, or raise PermissionDenied if the user has none."""
+    if not hasattr(request, '_ledger_project'):
+        projects = user_projects(request.user)
+        project_id = request.session.get(SESSION_KEY)
+        project = projects.filter(pk=project_id).first() if project_id else None
+        if project is None:
+            project = projects.first()
+        if project is None:
+            raise PermissionDenied('You are not a member of any project.')
+        request._ledger_project = project
+    return request._ledger_project
+
+
+def set_current_project(request, project):
+    request.session[SESSION_KEY] = project.pk
+    request._ledger_project = project
+
+
+def projects(request):
+    """Template context processor for the project switcher."""
+    if not request.user.is_authenticated:
+        return {}
+    try:
+        project = current_project(request)
+    except PermissionDenied:
+        project = None
+    return {'current_project': project, 'user_projects': user_projects(request.user)}
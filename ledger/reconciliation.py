@@ -0,0 +1,126 @@
+"""
+Posted vs invoiced reconciliation.
+
+Entries of a project sharing a supplier and invoice number form one invoice: the costs
+of its lines should add up to the invoiced amount recorded on them.
+InvoiceSummary holds one row per invoice with the grouped totals. Saving or
+deleting an entry refreshes only the invoices it touches (see signals.py);
+bulk changes refresh the affected suppliers or the whole table.
+"""
+import threading
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Count, Exists, Max, Min, OuterRef, Q, Sum
+
+from .models import ConstructionEntry, InvoiceSummary
+
+CENT = Decimal('0.01')
+# Past this many pending invoices a full rebuild is cheaper than the key filter.
+FULL_REFRESH_KEYS = 500
+SUMMARY_KEY = ['project', 'supplier', 'invoice_number']
+SUMMARY_VALUES = [
+    'entry_count', 'inv_count', 'cost_total', 'invoiced_total', 'difference',
+    'first_date', 'last_date', 'status', 'updated_at',
+]
+
+
+def _status(cost_total, invoiced_total, inv_count):
+    if invoiced_total is None:
+        return 'open' if inv_count else 'paid'
+    if (cost_total or 0).quantize(CENT) == invoiced_total.quantize(CENT):
+        return 'matched'
+    return 'mismatch'
+
+
+def refresh_invoice_summaries(keys=None, supplier_ids=None, project_id=None,
+                              entry_model=ConstructionEntry, summary_model=InvoiceSummary):
+    """
+    Recompute the summaries of the given (project_id, supplier_id,
+    invoice_number) keys, of every invoice of the given suppliers or
+    project, or of all invoices when none is given. Returns the number of
+    summaries written.
+    """
+    entries = entry_model.objects.filter(supplier__isnull=False).exclude(invoice_number='')
+    summaries = summary_model.objects.all()
+    if keys is not None:
+        keys = {(p, s, n) for p, s, n in keys if s and n}
+        if not keys:
+            return 0
+        q = reduce(or_, (Q(project_id=p, supplier_id=s, invoice_number=n) for p, s, n in keys))
+        entries, summaries = entries.filter(q), summaries.filter(q)
+    elif supplier_ids is not None:
+        entries = entries.filter(supplier_id__in=supplier_ids)
+        summaries = summaries.filter(supplier_id__in=supplier_ids)
+    elif project_id is not None:
+        entries = entries.filter(project_id=project_id)
+        summaries = summaries.filter(project_id=project_id)
+
+    groups = (
+        entries.order_by().values('project_id', 'supplier_id', 'invoice_number')
+        .annotate(
+            entry_count=Count('id'),
+            inv_count=Count('id', filter=Q(posted='Inv')),
+            cost_total=Sum('cost'),
+            invoiced_total=Sum('invoiced_amt'),
+            first_date=Min('date'),
+            last_date=Max('date'),
+        )
+    )
+    rows = [
+        summary_model(
+            **g,
+            difference=(g['invoiced_total'] or 0) - (g['cost_total'] or 0),
+            status=_status(g['cost_total'], g['invoiced_total'], g['inv_count']),
+        )
+        for g in groups.iterator(chunk_size=5000)
+    ]
+    with transaction.atomic():
+        # Drop only invoices left without entries and upsert the rest, so two
+        # refreshes of the same invoice cannot both insert it.
+        summaries.exclude(Exists(entries.filter(
+            project_id=OuterRef('project_id'), supplier_id=OuterRef('supplier_id'),
+            invoice_number=OuterRef('invoice_number'),
+        ))).delete()
+        summary_model.objects.bulk_create(
+            rows, batch_size=1000, update_conflicts=True, unique_fields=SUMMARY_KEY, update_fields=SUMMARY_VALUES,
+        )
+    return len(rows)
+
+
+_pending = threading.local()
+
+
+def _refresh_pending():
+    keys, _pending.keys = _pending.keys, set()
+    if len(keys) > FULL_REFRESH_KEYS:
+        refresh_invoice_summaries()
+    else:
+        refresh_invoice_summaries(keys=keys)
+
+
+def schedule_refresh(keys):
+    """
+    Refresh the summaries of `keys` once the current transaction commits.
+    Keys from the whole transaction are collected and refreshed together,
+    so deleting many entries costs one refresh rather than one per row.
+    """
+    if not hasattr(_pending, 'keys'):
+        _pending.keys = set()
+    # Keys left by a rolled-back transaction have lost their callback.
+    registered = bool(_pending.keys) and any(
+        callback[1] is _refresh_pending for callback in transaction.get_connection().run_on_commit
+    )
+    _pending.keys.update(keys)
+    if not registered:
+        transaction.on_commit(_refresh_pending)
+
+
+def summary_entries(summaries):
+    """The entries behind a queryset of InvoiceSummary rows."""
+    return ConstructionEntry.objects.filter(Exists(summaries.filter(
+        project_id=OuterRef('project_id'), supplier_id=OuterRef('supplier_id'),
+        invoice_number=OuterRef('invoice_number'),
+    )))
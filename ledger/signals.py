@@ -0,0 +1,64 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .choices import invalidate_supplier_choices, invalidate_type_choices
+from .engine import invalidate_ledger
+from .models import ConstructionEntry, Supplier, TypeDescription
+from .permissions import invalidate_permissions, invalidate_user
+from .reconciliation import schedule_refresh
+
+
+@receiver([post_save, post_delete], sender=Supplier)
+def supplier_changed(sender, **kwargs):
+    invalidate_supplier_choices()
+    invalidate_ledger()
+
+
+@receiver([post_save, post_delete], sender=TypeDescription)
+def type_description_changed(sender, **kwargs):
+    invalidate_type_choices()
+    invalidate_ledger()
+
+
+@receiver([post_save, post_delete], sender=ConstructionEntry)
+def entry_changed(sender, **kwargs):
+    invalidate_ledger()
+
+
+@receiver(post_save, sender=ConstructionEntry)
+def entry_saved_refresh_invoices(sender, instance, **kwargs):
+    keys = {instance.invoice_key}
+    if hasattr(instance, '_loaded_invoice_key'):
+        keys.add(instance._loaded_invoice_key)
+    instance._loaded_invoice_key = instance.invoice_key
+    schedule_refresh(keys)
+
+
+@receiver(post_delete, sender=ConstructionEntry)
+def entry_deleted_refresh_invoices(sender, instance, **kwargs):
+    schedule_refresh({instance.invoice_key})
+
+
+User = get_user_model()
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def permissions_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_permissions()
+
+
+# Deleting a group or permission drops its memberships without m2m_changed.
+@receiver(post_delete, sender=Group)
+@receiver([post_save, post_delete], sender=Permission)
+def permission_rows_changed(sender, **kwargs):
+    invalidate_permissions()
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
@@ -0,0 +1,296 @@
+"""
+Columnar, read-only snapshot of the ledger for offline analysis.
+
+A snapshot is a directory holding one little-endian binary file per column
+and a `manifest.json` describing them. Every column has one value per row,
+so the files can be memory-mapped and combined directly, e.g.
+
+    manifest = json.load(open('snapshot/manifest.json'))
+    cost = numpy.memmap('snapshot/cost.bin', dtype='<f8', mode='r')
+    supplier = numpy.memmap('snapshot/supplier.bin', dtype='<i4', mode='r')
+    live = numpy.memmap('snapshot/live.bin', dtype='u1', mode='r')
+
+Supplier, type and the short text columns are dictionary-encoded: the file
+holds int32 codes into the column's `dictionary` list in the manifest (-1
+for no supplier/type). `project` holds project ids, named in the
+manifest's `projects` mapping. Numeric columns are float64 with NaN for blanks and
+dates are days since 1970-01-01 (DATE_NULL for blanks).
+
+Snapshots are append-only. `write_snapshot` appends entries created since
+the last run and, for entries named in newer EntryChangeLog rows, clears
+the old row's `live` flag and appends the current version; readers must
+filter on `live == 1`. When the ledger changed in ways the change log does
+not record (an import, a supplier merge) the snapshot is rebuilt.
+"""
+import datetime
+import json
+import mmap
+import os
+import sys
+from array import array
+
+from django.db.models import Max, Q
+
+from .models import ConstructionEntry, EntryChangeLog, Project, Supplier, TypeDescription
+
+SNAPSHOT_FORMAT = 2
+MANIFEST = 'manifest.json'
+EPOCH = datetime.date(1970, 1, 1)
+DATE_NULL = -2 ** 31
+
+NUMERIC_COLUMNS = ['estimate', 'qty', 'supplies_cost', 'tax_fees', 'cost', 'invoiced_amt']
+TEXT_COLUMNS = ['lm', 'posted', 'stage', 'lc_stage']
+
+# column -> (array typecode, numpy dtype)
+COLUMN_TYPES = {
+    'id': ('q', '<i8'),
+    'project': ('i', '<i4'),
+    'date': ('i', '<i4'),
+    'supplier': ('i', '<i4'),
+    'type': ('i', '<i4'),
+    **{name: ('d', '<f8') for name in NUMERIC_COLUMNS},
+    **{name: ('i', '<i4') for name in TEXT_COLUMNS},
+    'live': ('B', 'u1'),
+}
+
+_FIELDS = ['id', 'project_id', 'date', 'supplier_id', 'type_description_id', *NUMERIC_COLUMNS, *TEXT_COLUMNS]
+
+
+def _path(directory, column):
+    return os.path.join(directory, f'{column}.bin')
+
+
+def _read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST)) as fh:
+            manifest = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get('format') == SNAPSHOT_FORMAT else None
+
+
+def _write_manifest(directory, manifest):
+    tmp = os.path.join(directory, MANIFEST + '.tmp')
+    with open(tmp, 'w') as fh:
+        json.dump(manifest, fh, indent=1)
+    os.replace(tmp, os.path.join(directory, MANIFEST))
+
+
+def _read_column(directory, column, rows):
+    values = array(COLUMN_TYPES[column][0])
+    with open(_path(directory, column), 'rb') as fh:
+        values.fromfile(fh, rows)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def _write_column(fh, values):
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    values.tofile(fh)
+
+
+class _Encoder:
+    """Builds the dictionaries of the coded columns, keeping existing codes stable."""
+
+    def __init__(self, dictionaries=None):
+        dictionaries = dictionaries or {}
+        self.supplier_ids = list(dictionaries.get('supplier_ids', []))
+        self.type_ids = list(dictionaries.get('type_ids', []))
+        self.text = {name: list(dictionaries.get(name, [])) for name in TEXT_COLUMNS}
+        self._codes = {
+            'supplier': {pk: code for code, pk in enumerate(self.supplier_ids)},
+            'type': {pk: code for code, pk in enumerate(self.type_ids)},
+            **{name: {v: code for code, v in enumerate(values)} for name, values in self.text.items()},
+        }
+
+    def code(self, column, value, values):
+        codes = self._codes[column]
+        if value not in codes:
+            codes[value] = len(values)
+            values.append(value)
+        return codes[value]
+
+    def dictionaries(self):
+        suppliers = dict(Supplier.objects.filter(pk__in=self.supplier_ids).values_list('pk', 'name'))
+        types = {
+            t.pk: f'{t.code} - {t.description}'
+            for t in TypeDescription.objects.filter(pk__in=self.type_ids)
+        }
+        return {
+            'supplier_ids': self.supplier_ids,
+            'supplier': [suppliers.get(pk, '') for pk in self.supplier_ids],
+            'type_ids': self.type_ids,
+            'type': [types.get(pk, '') for pk in self.type_ids],
+            **self.text,
+        }
+
+
+def _append_entries(directory, entries, encoder, chunk_size=5000):
+    """Append the current version of `entries` to every column; return the row count."""
+    handles = {column: open(_path(directory, column), 'ab') for column in COLUMN_TYPES}
+    appended = 0
+    try:
+        chunk = {column: array(typecode) for column, (typecode, _) in COLUMN_TYPES.items()}
+        for row in entries.order_by('id').values_list(*_FIELDS).iterator(chunk_size=chunk_size):
+            (pk, project_id, date, supplier_id, type_id), numbers, texts = row[:5], row[5:11], row[11:]
+            chunk['id'].append(pk)
+            chunk['project'].append(project_id)
+            chunk['date'].append((date - EPOCH).days if date else DATE_NULL)
+            chunk['supplier'].append(
+                encoder.code('supplier', supplier_id, encoder.supplier_ids) if supplier_id else -1
+            )
+            chunk['type'].append(encoder.code('type', type_id, encoder.type_ids) if type_id else -1)
+            for name, value in zip(NUMERIC_COLUMNS, numbers):
+                chunk[name].append(float('nan') if value is None else float(value))
+            for name, value in zip(TEXT_COLUMNS, texts):
+                chunk[name].append(encoder.code(name, value, encoder.text[name]))
+            chunk['live'].append(1)
+            appended += 1
+            if len(chunk['id']) >= chunk_size:
+                for column, values in chunk.items():
+                    _write_column(handles[column], values)
+                    del values[:]
+        for column, values in chunk.items():
+            _write_column(handles[column], values)
+    finally:
+        for fh in handles.values():
+            fh.close()
+    return appended
+
+
+def _manifest(encoder, rows, live, last_log_id, last_entry_id):
+    dictionaries = encoder.dictionaries()
+    columns = {}
+    for column, (_, dtype) in COLUMN_TYPES.items():
+        columns[column] = {'file': f'{column}.bin', 'dtype': dtype}
+    columns['supplier'].update(dictionary=dictionaries['supplier'], ids=dictionaries['supplier_ids'])
+    columns['type'].update(dictionary=dictionaries['type'], ids=dictionaries['type_ids'])
+    for name in TEXT_COLUMNS:
+        columns[name]['dictionary'] = dictionaries[name]
+    columns['date']['null'] = DATE_NULL
+    return {
+        'format': SNAPSHOT_FORMAT,
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'rows': rows,
+        'live_rows': live,
+        'last_log_id': last_log_id,
+        'last_entry_id': last_entry_id,
+        'projects': {str(pk): name for pk, name in Project.objects.values_list('pk', 'name')},
+        'columns': columns,
+    }
+
+
+def _dictionaries_from_manifest(manifest):
+    columns = manifest['columns']
+    return {
+        'supplier_ids': columns['supplier']['ids'],
+        'type_ids': columns['type']['ids'],
+        **{name: columns[name]['dictionary'] for name in TEXT_COLUMNS},
+    }
+
+
+def _rebuild(directory):
+    for column in COLUMN_TYPES:
+        open(_path(directory, column), 'wb').close()
+    last_log_id = EntryChangeLog.objects.aggregate(m=Max('id'))['m'] or 0
+    last_entry_id = ConstructionEntry.objects.aggregate(m=Max('id'))['m'] or 0
+    encoder = _Encoder()
+    rows = _append_entries(directory, ConstructionEntry.objects.filter(id__lte=last_entry_id), encoder)
+    _write_manifest(directory, _manifest(encoder, rows, rows, last_log_id, last_entry_id))
+    return {'mode': 'full', 'appended': rows, 'retired': 0, 'rows': rows, 'live_rows': rows}
+
+
+def write_snapshot(directory, full=False):
+    """
+    Create or bring up to date the snapshot in `directory`.
+
+    Returns a dict with the `mode` used ('full' or 'incremental') and the
+    numbers of `appended` and `retired` rows, total `rows` and `live_rows`.
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest = None if full else _read_manifest(directory)
+    if manifest is None:
+        return _rebuild(directory)
+
+    rows = manifest['rows']
+    # Drop anything a crashed run appended after the last manifest was written.
+    for column in COLUMN_TYPES:
+        with open(_path(directory, column), 'ab') as fh:
+            fh.truncate(rows * array(COLUMN_TYPES[column][0]).itemsize)
+
+    last_log_id = EntryChangeLog.objects.aggregate(m=Max('id'))['m'] or 0
+    last_entry_id = ConstructionEntry.objects.aggregate(m=Max('id'))['m'] or 0
+    changed = set(
+        EntryChangeLog.objects.filter(id__gt=manifest['last_log_id'], id__lte=last_log_id, model='constructionentry')
+        .exclude(object_id=None)
+        .values_list('object_id', flat=True)
+    )
+
+    ids = _read_column(directory, 'id', rows)
+    live = _read_column(directory, 'live', rows)
+    retired = 0
+    for row, pk in enumerate(ids):
+        if live[row] and pk in changed:
+            live[row] = 0
+            retired += 1
+    with open(_path(directory, 'live'), 'r+b') as fh:
+        _write_column(fh, live)
+
+    encoder = _Encoder(_dictionaries_from_manifest(manifest))
+    appended = _append_entries(
+        directory,
+        ConstructionEntry.objects.filter(id__lte=last_entry_id).filter(
+            Q(id__gt=manifest['last_entry_id']) | Q(id__in=changed)
+        ),
+        encoder,
+    )
+    live_rows = manifest['live_rows'] - retired + appended
+
+    # Bulk deletes (imports) and supplier merges bypass the change log.
+    if (
+        live_rows != ConstructionEntry.objects.filter(id__lte=last_entry_id).count()
+        or Supplier.objects.filter(pk__in=encoder.supplier_ids).count() != len(encoder.supplier_ids)
+    ):
+        return _rebuild(directory)
+
+    _write_manifest(directory, _manifest(encoder, rows + appended, live_rows, last_log_id, last_entry_id))
+    return {
+        'mode': 'incremental', 'appended': appended, 'retired': retired,
+        'rows': rows + appended, 'live_rows': live_rows,
+    }
+
+
+class Snapshot:
+    """Memory-mapped, read-only view of a snapshot directory."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.manifest = _read_manifest(directory)
+        if self.manifest is None:
+            raise FileNotFoundError(f'No ledger snapshot in {directory}')
+        self._maps = {}
+
+    def __len__(self):
+        return self.manifest['rows']
+
+    def column(self, name):
+        """Return a column as a memoryview of its typed values (little-endian hosts)."""
+        if name not in self._maps:
+            typecode = COLUMN_TYPES[name][0]
+            size = len(self) * array(typecode).itemsize
+            if not size:
+                return memoryview(array(typecode))
+            with open(_path(self.directory, name), 'rb') as fh:
+                self._maps[name] = mmap.mmap(fh.fileno(), size, access=mmap.ACCESS_READ)
+        return memoryview(self._maps[name]).cast(COLUMN_TYPES[name][0])
+
+    def dictionary(self, name):
+        return self.manifest['columns'][name]['dictionary']
+
+    def close(self):
+        for m in self._maps.values():
+            m.close()
+        self._maps.clear()
@@ -0,0 +1,31 @@
+// Supplier selectors marked with data-autocomplete-url list only the selected
+// supplier (see ledger/choices.py). Add a search box above each that fills the
+// selector with the suppliers matching what the user types.
+document.querySelectorAll('select[data-autocomplete-url]').forEach(function (select) {
+    var search = document.createElement('input');
+    search.type = 'search';
+    search.className = 'form-control form-control-sm mb-1';
+    search.placeholder = 'Search suppliers...';
+    select.parentElement.insertBefore(search, select);
+
+    var timer;
+    search.addEventListener('input', function () {
+        clearTimeout(timer);
+        timer = setTimeout(function () {
+            var url = select.dataset.autocompleteUrl + '?q=' + encodeURIComponent(search.value);
+            fetch(url, {credentials: 'same-origin'})
+                .then(r => r.json())
+                .then(data => {
+                    // Keep the empty choice and the current selection.
+                    Array.from(select.options).forEach(function (option) {
+                        if (option.value && !option.selected) option.remove();
+                    });
+                    data.results.forEach(function (supplier) {
+                        if (String(supplier.id) !== select.value) {
+                            select.add(new Option(supplier.name, supplier.id));
+                        }
+                    });
+                });
+        }, 250);
+    });
+});
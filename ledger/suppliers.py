@@ -0,0 +1,111 @@
+"""
+Supplier de-duplication.
+
+Names are compared on their normalized form (models.normalize_supplier_name)
+using trigram similarity. SupplierIndex keeps an inverted index from
+trigram to supplier ids, so looking up the suppliers similar to a name only
+scores those sharing at least one trigram with it instead of the whole
+table.
+"""
+from collections import Counter, defaultdict
+
+from django.db import transaction
+
+from .models import ConstructionEntry, PeriodTotal, Supplier, normalize_supplier_name
+from .reconciliation import refresh_invoice_summaries
+
+# Dice coefficient on trigrams above which two names are proposed as one supplier.
+SIMILARITY_THRESHOLD = 0.7
+# Above this, the importer reuses the existing supplier instead of creating one.
+IMPORT_MATCH_THRESHOLD = 0.85
+
+
+def trigrams(normalized):
+    padded = f'  {normalized} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SupplierIndex:
+    """In-memory trigram index over supplier names."""
+
+    def __init__(self, suppliers=()):
+        self.names = {}          # id -> name
+        self.normalized = {}     # id -> normalized name
+        self.by_normalized = {}  # normalized name -> lowest id
+        self.sizes = {}          # id -> number of trigrams
+        self.postings = defaultdict(set)
+        for pk, name, normalized in suppliers:
+            self.add(pk, name, normalized)
+
+    @classmethod
+    def build(cls):
+        return cls(Supplier.objects.order_by('id').values_list('id', 'name', 'normalized_name').iterator())
+
+    def add(self, pk, name, normalized=None):
+        normalized = normalized or normalize_supplier_name(name)
+        self.names[pk] = name
+        self.normalized[pk] = normalized
+        self.by_normalized.setdefault(normalized, pk)
+        grams = trigrams(normalized)
+        self.sizes[pk] = len(grams)
+        for gram in grams:
+            self.postings[gram].add(pk)
+
+    def similar(self, name, threshold=SIMILARITY_THRESHOLD, normalized=None):
+        """Return [(similarity, id)] of suppliers similar to `name`, best first."""
+        normalized = normalized or normalize_supplier_name(name)
+        grams = trigrams(normalized)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        matches = []
+        for pk, count in shared.items():
+            score = 2 * count / (len(grams) + self.sizes[pk])
+            if score >= threshold:
+                matches.append((score, pk))
+        return sorted(matches, key=lambda m: (-m[0], m[1]))
+
+    def match(self, name, threshold=IMPORT_MATCH_THRESHOLD):
+        """Return the id of an existing supplier `name` should be filed under, or None."""
+        normalized = normalize_supplier_name(name)
+        if normalized in self.by_normalized:
+            return self.by_normalized[normalized]
+        matches = self.similar(name, threshold, normalized)
+        return matches[0][1] if matches else None
+
+    def clusters(self, threshold=SIMILARITY_THRESHOLD):
+        """
+        Propose groups of suppliers to merge, in one pass over the index.
+
+        Each supplier not yet grouped becomes a group's centre and takes the
+        ungrouped suppliers similar to it. Groups are not chained through
+        intermediate names, so "A B" and "B C" only meet through "A B C" if
+        both are similar to it. Returns lists of ids, largest group first.
+        """
+        grouped = set()
+        groups = []
+        for pk in sorted(self.names):
+            if pk in grouped:
+                continue
+            members = [pk] + [
+                other for _, other in self.similar(self.names[pk], threshold, self.normalized[pk])
+                if other != pk and other not in grouped
+            ]
+            if len(members) > 1:
+                grouped.update(members)
+                groups.append(members)
+        return sorted(groups, key=lambda ids: (-len(ids), ids))
+
+
+def merge_suppliers(target, sources):
+    """Move every entry of `sources` to `target` and delete them. Returns the entries moved."""
+    source_ids = [s.pk for s in sources if s.pk != target.pk]
+    with transaction.atomic():
+        moved = ConstructionEntry.objects.filter(supplier_id__in=source_ids).update(supplier=target)
+        # Closed periods' totals follow their entries.
+        PeriodTotal.objects.filter(supplier_id__in=source_ids).update(supplier=target)
+        for supplier in Supplier.objects.filter(pk__in=source_ids):
+            supplier.change_note = f'Merged into {target.name}'
+            supplier.delete()
+        refresh_invoice_summaries(supplier_ids=[target.pk])
+    return moved
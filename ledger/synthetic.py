@@ -0,0 +1,216 @@
+"""Synthetic ledger data for load testing, benchmarks and query-count tests."""
+import datetime
+import random
+from decimal import Decimal
+
+from .choices import invalidate_supplier_choices, invalidate_type_choices
+from .engine import invalidate_ledger
+from .importer import HEADER_ROW, WORKBOOK_HEADERS
+from .models import (
+    ConstructionEntry, EntryChangeLog, Project, Supplier, TypeDescription, normalize_supplier_name,
+)
+from .reconciliation import refresh_invoice_summaries
+
+SYNTHETIC_PROJECT = 'Synthetic'
+
+SUPPLIER_WORDS = [
+    'Home Depot', 'Lowes', 'Builders', 'Concrete', 'Electric', 'Plumbing',
+    'Lumber', 'Roofing', 'Hardware', 'Tile', 'Glass', 'Steel', 'Paving',
+    'Drywall', 'HVAC', 'Landscaping', 'Masonry', 'Paint', 'Supply', 'Rental',
+]
+
+TYPE_NAMES = [
+    'Site Preparation', 'Architectural', 'Foundation', 'Framing', 'Roofing',
+    'Electrical', 'Plumbing', 'HVAC', 'Insulation', 'Drywall', 'Flooring',
+    'Cabinetry', 'Painting', 'Landscaping', 'Permits & Fees', 'Utilities',
+]
+
+DESCRIPTION_WORDS = [
+    'lumber', 'rebar', 'concrete', 'blocks', 'wiring', 'conduit', 'pipe',
+    'fittings', 'shingles', 'trusses', 'windows', 'doors', 'tile', 'grout',
+    'paint', 'labor', 'delivery', 'rental', 'fasteners', 'sheathing',
+]
+
+LM_WEIGHTS = [('L', 30), ('M', 55), ('U', 5), ('X', 10)]
+POSTED_WEIGHTS = [('Yes', 70), ('Inv', 20), ('', 10)]
+EDITABLE_FIELDS = ['description', 'cost', 'posted', 'invoice_number', 'notes']
+
+
+def _weighted(rng, weights):
+    values, cum_weights = zip(*weights)
+    return rng.choices(values, weights=cum_weights)[0]
+
+
+def _money(rng, low, high):
+    """Return a log-uniformly distributed amount, so most costs are small."""
+    value = Decimal(str(round(low * (high / low) ** rng.random(), 2)))
+    return value.quantize(Decimal('0.01'))
+
+
+def _build_suppliers(rng, count):
+    names = set(Supplier.objects.values_list('name', flat=True))
+    new = []
+    n = 0
+    while len(names) < count:
+        n += 1
+        name = f"{rng.choice(SUPPLIER_WORDS)} {rng.choice(SUPPLIER_WORDS)} #{n}"
+        if name not in names:
+            names.add(name)
+            new.append(Supplier(name=name, normalized_name=normalize_supplier_name(name)))
+    Supplier.objects.bulk_create(new, ignore_conflicts=True)
+    return list(Supplier.objects.order_by('id').values_list('id', flat=True))
+
+
+def _build_types(count):
+    existing = TypeDescription.objects.count()
+    TypeDescription.objects.bulk_create([
+        TypeDescription(code=str(i + 1), description=TYPE_NAMES[i % len(TYPE_NAMES)])
+        for i in range(existing, count)
+    ])
+    return list(TypeDescription.objects.order_by('id').values_list('id', flat=True))
+
+
+def _build_entry(rng, project, supplier_ids, supplier_weights, type_ids, start, days):
+    supplies_cost = _money(rng, 5, 25000)
+    tax_fees = (supplies_cost * Decimal('0.175')).quantize(Decimal('0.01'))
+    cost = supplies_cost + tax_fees
+    lm = _weighted(rng, LM_WEIGHTS)
+    posted = _weighted(rng, POSTED_WEIGHTS)
+    return ConstructionEntry(
+        project=project,
+        date=start + datetime.timedelta(days=rng.randrange(days)),
+        description=' '.join(rng.sample(DESCRIPTION_WORDS, 3)).capitalize(),
+        stage=f"{rng.randint(1, 5)}.{rng.randint(0, 9)}",
+        lc_stage=f"A{rng.randint(1, 9)}",
+        supplier_id=rng.choices(supplier_ids, weights=supplier_weights)[0],
+        estimate=_money(rng, 5, 30000) if rng.random() < 0.3 else None,
+        qty=Decimal(rng.randint(1, 50)),
+        supplies_cost=supplies_cost,
+        tax_fees=tax_fees,
+        cost=cost,
+        invoiced_amt=cost if posted == 'Inv' else None,
+        posted=posted,
+        lm=lm,
+        supervisor=rng.choice(['', 'Adrian', 'Ron', 'Maria']),
+        invoice_number=f"INV-{rng.randint(1000, 99999)}" if rng.random() < 0.6 else '',
+        delivery_type=rng.choice(['', 'Delivery', 'Pickup', 'SR In Store']),
+        materials='',
+        book_number=str(rng.randint(1, 40)) if rng.random() < 0.2 else '',
+        notes='Synthetic entry' if rng.random() < 0.1 else '',
+        type_description_id=rng.choice(type_ids),
+    )
+
+
+def _build_change_logs(rng, project, entry_ids, density, user):
+    logs = []
+    for entry_id in entry_ids:
+        if rng.random() >= density:
+            continue
+        logs.append(EntryChangeLog(
+            entry_id=entry_id, object_id=entry_id, project=project, user=user, action='create',
+        ))
+        for _ in range(rng.randint(0, 3)):
+            field = rng.choice(EDITABLE_FIELDS)
+            logs.append(EntryChangeLog(
+                entry_id=entry_id, object_id=entry_id, project=project, user=user, action='edit',
+                changes={field: {'old': 'old value', 'new': 'new value'}},
+            ))
+    return logs
+
+
+def generate_ledger(entries, suppliers=200, types=12, changelog_density=0.3,
+                    seed=None, user=None, start_date=None, days=730, batch_size=5000, project=None):
+    """
+    Add `entries` synthetic ConstructionEntry rows to `project`, by default
+    the "Synthetic" project (created if missing).
+
+    Suppliers and types are topped up to the requested counts and reused if
+    they already exist. Supplier usage is Zipf-like so a few suppliers carry
+    most of the entries, as in the real ledger. A `changelog_density`
+    fraction of the new entries get a create log plus up to three edits.
+    Returns a dict of row counts created.
+    """
+    if project is None:
+        project, _ = Project.objects.get_or_create(name=SYNTHETIC_PROJECT)
+    rng = random.Random(seed)
+    start = start_date or datetime.date(2022, 1, 1)
+    supplier_ids = _build_suppliers(rng, suppliers)
+    supplier_weights = [1 / (rank + 1) for rank in range(len(supplier_ids))]
+    type_ids = _build_types(types)
+
+    created_entries = 0
+    created_logs = 0
+    while created_entries < entries:
+        size = min(batch_size, entries - created_entries)
+        batch = ConstructionEntry.objects.bulk_create([
+            _build_entry(rng, project, supplier_ids, supplier_weights, type_ids, start, days)
+            for _ in range(size)
+        ])
+        entry_ids = [e.pk for e in batch]
+        if None in entry_ids:
+            # Backends that cannot return ids from bulk inserts
+            entry_ids = list(
+                ConstructionEntry.objects.order_by('-id').values_list('id', flat=True)[:size]
+            )
+        logs = _build_change_logs(rng, project, entry_ids, changelog_density, user)
+        EntryChangeLog.objects.bulk_create(logs, batch_size=batch_size)
+        created_entries += size
+        created_logs += len(logs)
+
+    # bulk_create sends no signals
+    invalidate_supplier_choices()
+    invalidate_type_choices()
+    invalidate_ledger()
+    refresh_invoice_summaries(project_id=project.pk)
+    return {
+        'entries': created_entries,
+        'change_logs': created_logs,
+        'suppliers': len(supplier_ids),
+        'types': len(type_ids),
+    }
+
+
+def write_workbook(path, rows, suppliers=200, types=12, seed=None):
+    """Write a 'Const Actual' workbook with `rows` synthetic rows for import_excel."""
+    import openpyxl
+
+    rng = random.Random(seed)
+    supplier_names = [
+        f"{rng.choice(SUPPLIER_WORDS)} {rng.choice(SUPPLIER_WORDS)} #{n}" for n in range(suppliers)
+    ]
+    start = datetime.date(2022, 1, 1)
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet('Const Actual')
+    for _ in range(HEADER_ROW - 1):
+        ws.append([])
+    ws.append(WORKBOOK_HEADERS)
+    for _ in range(rows):
+        type_index = rng.randrange(types)
+        supplies_cost = float(_money(rng, 5, 25000))
+        posted = _weighted(rng, POSTED_WEIGHTS)
+        ws.append([
+            datetime.datetime.combine(start + datetime.timedelta(days=rng.randrange(730)), datetime.time()),
+            ' '.join(rng.sample(DESCRIPTION_WORDS, 3)).capitalize(),
+            f"{rng.randint(1, 5)}.{rng.randint(0, 9)}",
+            f"A{rng.randint(1, 9)}",
+            rng.choice(supplier_names),
+            None,
+            rng.randint(1, 50),
+            supplies_cost,
+            round(supplies_cost * 0.175, 2),
+            round(supplies_cost * 1.175, 2),
+            round(supplies_cost * 1.175, 2) if posted == 'Inv' else None,
+            posted,
+            _weighted(rng, LM_WEIGHTS),
+            None,
+            f"INV-{rng.randint(1000, 99999)}",
+            None,
+            None,
+            None,
+            None,
+            TYPE_NAMES[type_index % len(TYPE_NAMES)],
+            str(type_index + 1),
+            TYPE_NAMES[type_index % len(TYPE_NAMES)],
+        ])
+    wb.save(path)
@@ -1,3 +1,1119 @@
-from django.test import TestCase
+import datetime
+import os
+import tempfile
+from io import StringIO
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Count
+from unittest import skipIf
+
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import urls as ledger_urls
+from .forms import LEDGER_PERMISSIONS, EntryEditForm
+from .engine import np
+from .importer import import_workbook, inspect_workbook
+from .jobs import claim_next_job, enqueue, run_job
+from .duplicates import detect_duplicates
+from .models import (
+    ConstructionEntry, DuplicateSuspect, EntryChangeLog, InvoiceSummary, Job, PeriodClose, PeriodClosed, Project,
+    Supplier, TypeDescription, UserPreference, normalize_supplier_name,
+)
+from .periods import close_period, reopen_period
+from .reconciliation import _refresh_pending, refresh_invoice_summaries
+from .snapshot import Snapshot, write_snapshot
+from .suppliers import SupplierIndex, merge_suppliers
+from .synthetic import generate_ledger, write_workbook
+from .tracking import tracking_context
+from .views import _entry_conflict
+
+# Serve static files without the manifest so templates render without collectstatic.
+TEST_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class QueryCountTests(TestCase):
+    """
+    Every ledger URL must issue the same number of queries whatever the
+    ledger size. Each URL is requested against a small fixture, the fixture
+    is grown (more entries, suppliers, change logs, groups and users), and
+    the URL is requested again; a difference points at an N+1 query.
+    """
+
+    # url name -> (fixture attribute used as the pk, extra query string)
+    URLS = {
+        'dashboard': (None, ''),
+        'project_switch': (None, ''),
+        'entry_list': (None, '?sort=supplier_name'),
+        'entry_create': (None, ''),
+        'entry_list_preferences': (None, ''),
+        'entry_detail': ('entry', ''),
+        'entry_edit': ('entry', ''),
+        'entry_split': ('entry', '?n=4'),
+        'entry_change': ('change_log', ''),
+        'duplicate_list': (None, ''),
+        'duplicate_scan': (None, ''),
+        'duplicate_dismiss': ('suspect', ''),
+        'duplicate_delete': ('suspect', ''),
+        'period_list': (None, ''),
+        'period_close': (None, ''),
+        'period_reopen': ('period', ''),
+        'reconciliation': (None, '?status='),
+        'reconciliation_export': (None, '?status='),
+        'reconciliation_rebuild': (None, ''),
+        'audit_log': (None, '?action=edit&field=cost&date_from=2000-01-01'),
+        'user_list': (None, ''),
+        'user_create': (None, ''),
+        'user_edit': ('user', ''),
+        'group_list': (None, ''),
+        'group_create': (None, ''),
+        'group_edit': ('group', ''),
+        'supplier_list': (None, ''),
+        'supplier_autocomplete': (None, '?q=a'),
+        'supplier_duplicates': (None, ''),
+        'supplier_merge': (None, ''),
+        'supplier_detail': ('supplier', ''),
+        'supplier_rename': ('supplier', ''),
+        'job_list': (None, ''),
+        'job_import': (None, ''),
+        'job_export': (None, ''),
+        'job_detail': ('job', ''),
+        'job_confirm': ('job', ''),
+        'job_retry': ('job', ''),
+        'job_status': ('job', ''),
+        'job_download': ('job', ''),
+    }
+    # URLs that only accept POST; they are measured with an empty form.
+    POST_URLS = {
+        'job_import', 'job_export', 'job_confirm', 'job_retry',
+        'duplicate_scan', 'duplicate_dismiss', 'duplicate_delete', 'supplier_merge', 'project_switch',
+        'period_close', 'period_reopen', 'entry_list_preferences', 'reconciliation_rebuild',
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        codenames = [code for code, _, _ in LEDGER_PERMISSIONS]
+        cls.permissions = list(Permission.objects.filter(
+            content_type__app_label='ledger', codename__in=codenames,
+        ))
+        cls.group = Group.objects.create(name='Editor')
+        cls.group.permissions.set(cls.permissions)
+        cls.user = get_user_model().objects.create_user('bookkeeper', password='pw', is_staff=True)
+        cls.user.groups.add(cls.group)
+        cls.project = Project.objects.create(name='Tower A')
+        cls.project.members.add(cls.user)
+
+        generate_ledger(
+            entries=5, suppliers=3, types=2, changelog_density=1, seed=1, user=cls.user, project=cls.project,
+        )
+        cls.entry = ConstructionEntry.objects.filter(supplier__isnull=False).order_by('id').first()
+        cls.supplier = cls.entry.supplier
+        cls.change_log = EntryChangeLog.objects.filter(project=cls.project).first()
+        original = ConstructionEntry.objects.exclude(pk=cls.entry.pk).order_by('id').first()
+        DuplicateSuspect.objects.create(entry=cls.entry, original=original, reason='amount')
+        cls.job = Job.objects.create(
+            kind='import_workbook', status='uploaded', project=cls.project, created_by=cls.user,
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    @property
+    def suspect(self):
+        # A fresh pair for every request: dismissing or deleting uses it up.
+        entry, original = ConstructionEntry.objects.bulk_create([
+            ConstructionEntry(project=self.project, supplier=self.supplier, cost=10),
+            ConstructionEntry(project=self.project, supplier=self.supplier, cost=10),
+        ])
+        return DuplicateSuspect.objects.create(entry=entry, original=original, reason='amount')
+
+    @property
+    def period(self):
+        # A fresh close for every request: reopening deletes it.
+        return PeriodClose.objects.create(project=self.project, end=datetime.date(1999, 12, 31))
+
+    def grow_fixtures(self):
+        generate_ledger(
+            entries=60, suppliers=25, types=8, changelog_density=1, seed=2, user=self.user, project=self.project,
+        )
+        other = Project.objects.create(name='Tower B')
+        other.members.add(self.user)
+        generate_ledger(entries=60, suppliers=25, types=8, changelog_density=1, seed=3, project=other)
+        EntryChangeLog.objects.bulk_create([
+            EntryChangeLog(
+                entry=self.entry, object_id=self.entry.pk, user=self.user, action='edit',
+                changes={'cost': {'old': str(i), 'new': str(i + 1)}},
+            )
+            for i in range(20)
+        ])
+        for i in range(10):
+            group = Group.objects.create(name=f'Group {i}')
+            group.permissions.set(self.permissions)
+            user = get_user_model().objects.create_user(f'user{i}', password='pw')
+            user.groups.add(group, self.group)
+        Job.objects.bulk_create([
+            Job(kind='export_entries', project=self.project, created_by=self.user) for _ in range(10)
+        ])
+        entries = list(ConstructionEntry.objects.filter(project=self.project).order_by('id')[:21])
+        DuplicateSuspect.objects.bulk_create([
+            DuplicateSuspect(entry=entry, original=original, reason='amount')
+            for original, entry in zip(entries, entries[1:])
+        ])
+
+    def url_for(self, name):
+        attr, query = self.URLS[name]
+        args = [getattr(self, attr).pk] if attr else []
+        return reverse(f'ledger:{name}', args=args) + query
+
+    def measure(self):
+        results = {}
+        for name in self.URLS:
+            cache.clear()
+            url = self.url_for(name)
+            with CaptureQueriesContext(connection) as ctx:
+                if name in self.POST_URLS:
+                    response = self.client.post(url)
+                else:
+                    response = self.client.get(url)
+            self.assertLess(response.status_code, 400, f'{url} returned {response.status_code}')
+            results[name] = [q['sql'] for q in ctx.captured_queries]
+        return results
+
+    def test_every_url_is_covered(self):
+        names = {p.name for p in ledger_urls.urlpatterns}
+        self.assertEqual(names - set(self.URLS), set(), 'Add new ledger URLs to QueryCountTests.URLS')
+
+    def test_query_counts_do_not_grow_with_data(self):
+        small = self.measure()
+        self.grow_fixtures()
+        large = self.measure()
+        for name in self.URLS:
+            with self.subTest(url=name):
+                if len(large[name]) != len(small[name]):
+                    self.fail(
+                        f'{self.url_for(name)} issued {len(small[name])} queries on the small '
+                        f'fixture but {len(large[name])} on the large one:\n'
+                        + '\n'.join(f'{i}. {sql}' for i, sql in enumerate(large[name], 1))
+                    )
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class JobTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.project = Project.objects.create(name='Tower A')
+        generate_ledger(entries=30, suppliers=5, types=3, seed=3, project=self.project)
+
+    def test_export_job_writes_filtered_csv(self):
+        supplier = ConstructionEntry.objects.filter(supplier__isnull=False).first().supplier
+        job = enqueue('export_entries', project=self.project, params={'supplier': str(supplier.pk)})
+        job = run_job(claim_next_job())
+        self.assertEqual(job.status, 'done', job.message)
+        self.assertIsNone(claim_next_job())
+
+        job.refresh_from_db()
+        with job.result_file.open('r') as fh:
+            rows = fh.read().splitlines()
+        expected = ConstructionEntry.objects.filter(supplier=supplier).count()
+        self.assertEqual(len(rows), expected + 1)
+        self.assertEqual((job.progress, job.total), (expected, expected))
+
+    def test_rebuild_job_restores_invoice_summaries(self):
+        InvoiceSummary.objects.all().delete()
+        enqueue('rebuild_invoice_summaries', project=self.project)
+        job = run_job(claim_next_job())
+        self.assertEqual(job.status, 'done', job.message)
+        invoices = (
+            ConstructionEntry.objects.filter(project=self.project, supplier__isnull=False).exclude(invoice_number='')
+            .order_by().values('supplier', 'invoice_number').distinct().count()
+        )
+        self.assertTrue(invoices)
+        self.assertEqual(InvoiceSummary.objects.filter(project=self.project).count(), invoices)
+
+    def test_job_views_check_the_permissions_of_the_job_kind(self):
+        user = get_user_model().objects.create_user('visitor', password='pw')
+        self.project.members.add(user)
+        self.client.force_login(user)
+        export = Job.objects.create(kind='export_entries', status='done', project=self.project)
+        rebuild = Job.objects.create(kind='rebuild_invoice_summaries', status='failed', project=self.project)
+        self.assertEqual(self.client.post(reverse('ledger:job_export')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('ledger:job_download', args=[export.pk])).status_code, 403)
+        self.assertEqual(self.client.post(reverse('ledger:job_retry', args=[rebuild.pk])).status_code, 403)
+        rebuild.refresh_from_db()
+        self.assertEqual(rebuild.status, 'failed')
+
+        user.user_permissions.add(Permission.objects.get(codename='view_constructionentry'))
+        self.client.force_login(get_user_model().objects.get(pk=user.pk))
+        self.assertEqual(self.client.post(reverse('ledger:job_export')).status_code, 302)
+        self.assertEqual(self.client.get(reverse('ledger:job_download', args=[export.pk])).status_code, 302)
+        self.assertEqual(self.client.post(reverse('ledger:job_retry', args=[rebuild.pk])).status_code, 403)
+
+    def test_import_resumes_after_last_committed_row(self):
+        path = os.path.join(settings.MEDIA_ROOT, 'ledger.xlsx')
+        write_workbook(path, 25, suppliers=4, types=3, seed=4)
+        errors, preview = inspect_workbook(path, preview_rows=3)
+        self.assertEqual((errors, len(preview)), ([], 3))
+
+        committed = []
+
+        def crash_on_third_batch(row):
+            if len(committed) == 3:
+                raise RuntimeError('worker killed')
+            committed.append(row)
+
+        with self.assertRaises(RuntimeError):
+            import_workbook(path, self.project, checkpoint=crash_on_third_batch, batch_size=10)
+        self.assertEqual(ConstructionEntry.objects.count(), 20)
+
+        import_workbook(path, self.project, resume_after=committed[-1], batch_size=10)
+        self.assertEqual(ConstructionEntry.objects.count(), 25)
+
+
+class SnapshotTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = tmp.name
+        generate_ledger(entries=40, suppliers=5, types=3, changelog_density=0, seed=5)
+
+    def live_costs(self):
+        snapshot = Snapshot(self.directory)
+        try:
+            ids, costs, live = snapshot.column('id'), snapshot.column('cost'), snapshot.column('live')
+            result = {ids[row]: costs[row] for row in range(len(snapshot)) if live[row]}
+            del ids, costs, live
+        finally:
+            snapshot.close()
+        return result
+
+    def db_costs(self):
+        return {pk: float(cost) for pk, cost in ConstructionEntry.objects.values_list('id', 'cost')}
+
+    def test_incremental_update_follows_change_log(self):
+        self.assertEqual(write_snapshot(self.directory)['mode'], 'full')
+        self.assertEqual(self.live_costs(), self.db_costs())
+
+        edited, deleted = ConstructionEntry.objects.order_by('id')[:2]
+        edited.cost = 123
+        edited.save()
+        EntryChangeLog.objects.create(entry=edited, object_id=edited.pk, action='edit')
+        EntryChangeLog.objects.create(object_id=deleted.pk, action='delete')
+        deleted.delete()
+        generate_ledger(entries=3, suppliers=5, types=3, changelog_density=0, seed=6)
+
+        result = write_snapshot(self.directory)
+        self.assertEqual((result['mode'], result['retired'], result['appended']), ('incremental', 2, 4))
+        self.assertEqual(self.live_costs(), self.db_costs())
+
+        ConstructionEntry.objects.filter(pk=edited.pk).delete()  # no change log
+        self.assertEqual(write_snapshot(self.directory)['mode'], 'full')
+        self.assertEqual(self.live_costs(), self.db_costs())
+
+
+@skipIf(np is None, 'numpy is not installed')
+@override_settings(STORAGES=TEST_STORAGES)
+class VectorEngineTests(TestCase):
+    """The numpy engine must give the dashboard and entry_list the same numbers as the ORM."""
+
+    CONTEXT_KEYS = {
+        'dashboard': [
+            'total_entries', 'total_cost', 'total_transfers', 'date_range', 'type_ids', 'type_labels',
+            'type_values', 'lm_codes', 'lm_values', 'transfer_ids', 'transfer_values', 'supplier_ids',
+            'supplier_values',
+        ],
+        'entry_list': ['totals', 'lm_subtotals'],
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('analyst', password='pw')
+        project = Project.objects.create(name='Tower A')
+        project.members.add(cls.user)
+        generate_ledger(entries=200, suppliers=12, types=5, changelog_density=0, seed=7, project=project)
+        # Another project's entries must not reach the totals.
+        generate_ledger(entries=50, suppliers=12, types=5, changelog_density=0, seed=8)
+        cls.supplier = ConstructionEntry.objects.exclude(supplier=None).first().supplier_id
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def context(self, url, engine):
+        cache.clear()
+        with override_settings(LEDGER_VECTOR_ENGINE=engine):
+            response = self.client.get(url)
+        name = response.resolver_match.url_name
+        return {key: response.context[key] for key in self.CONTEXT_KEYS[name]}
+
+    def test_engine_matches_orm(self):
+        urls = [
+            reverse('ledger:dashboard'),
+            reverse('ledger:entry_list'),
+            reverse('ledger:entry_list') + f'?supplier={self.supplier}&posted=Yes&date_from=2022-06-01',
+            reverse('ledger:entry_list') + '?lm=X',
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.context(url, engine=True), self.context(url, engine=False))
+
+    def test_frame_reloads_after_change(self):
+        with override_settings(LEDGER_VECTOR_ENGINE=True):
+            response = self.client.get(reverse('ledger:dashboard'))
+            self.assertEqual(response.context['total_entries'], 200)
+            with self.captureOnCommitCallbacks(execute=True):
+                ConstructionEntry.objects.filter(pk=ConstructionEntry.objects.order_by('id').first().pk).delete()
+            response = self.client.get(reverse('ledger:dashboard'))
+        self.assertEqual(response.context['total_entries'], 199)
+
+    def test_frame_reloads_after_bulk_update(self):
+        url = reverse('ledger:entry_list') + f'?supplier={self.supplier}'
+        with override_settings(LEDGER_VECTOR_ENGINE=True):
+            self.client.get(url)
+            with self.captureOnCommitCallbacks(execute=True):
+                ConstructionEntry.objects.filter(supplier=self.supplier).update(cost=None)
+            response = self.client.get(url)
+        # A supplier whose costs are all NULL totals None, as the ORM's SUM does.
+        self.assertIsNone(response.context['totals']['total_cost'])
+        self.assertEqual(self.context(url, engine=True), self.context(url, engine=False))
+
+
+class DuplicateDetectionTests(TestCase):
+    def test_flags_invoice_and_amount_duplicates(self):
+        a, b = Supplier.objects.bulk_create([Supplier(name='A'), Supplier(name='B')])
+        project, other = Project.objects.bulk_create([Project(name='Tower A'), Project(name='Tower B')])
+        day = datetime.date(2024, 3, 1)
+
+        def entry(supplier, days, cost, invoice='', project=project):
+            return ConstructionEntry.objects.create(
+                project=project, supplier=supplier, date=day + datetime.timedelta(days=days), cost=cost,
+                invoice_number=invoice,
+            )
+
+        original = entry(a, 0, 500, 'INV-1')
+        reentered = entry(a, 40, 500, 'inv-1 ')
+        entry(a, 1, 250, 'INV-1')  # split part: same invoice, different cost
+        near = entry(a, 2, 500)
+        entry(a, 10, 500)  # outside the date window
+        entry(b, 0, 500)  # another supplier
+        entry(a, 0, 500, 'INV-1', project=other)  # another project
+
+        self.assertEqual(detect_duplicates(project), {'found': 2, 'added': 2, 'removed': 0})
+        self.assertEqual(
+            set(DuplicateSuspect.objects.values_list('entry', 'original', 'reason')),
+            {(reentered.pk, original.pk, 'invoice'), (near.pk, original.pk, 'amount')},
+        )
+
+        DuplicateSuspect.objects.filter(reason='amount').update(status='dismissed')
+        reentered.delete()
+        self.assertEqual(detect_duplicates(project), {'found': 1, 'added': 0, 'removed': 0})
+        self.assertEqual(DuplicateSuspect.objects.get().status, 'dismissed')
+
+
+class SupplierDeduplicationTests(TestCase):
+    def test_normalized_name(self):
+        for name in ['Home Depot', 'HOME DEPOT #123', 'Home Depot ', 'Home Depot, Inc.']:
+            self.assertEqual(normalize_supplier_name(name), 'home depot')
+        self.assertEqual(Supplier.objects.create(name='The Lowe\'s Co.').normalized_name, 'lowes')
+
+    def test_index_matches_and_clusters_variants(self):
+        home_depot = Supplier.objects.create(name='Home Depot')
+        carters = Supplier.objects.create(name='Carters')
+        Supplier.objects.create(name='Concrete Plus')
+        carter = Supplier.objects.create(name='Carter & Company')
+        index = SupplierIndex.build()
+
+        self.assertEqual(index.match('HOME DEPOT #123'), home_depot.pk)
+        self.assertEqual(index.match('Home Depott'), home_depot.pk)
+        self.assertIsNone(index.match('Concrete Works'))
+        self.assertEqual(index.clusters(), [[carters.pk, carter.pk]])
+
+    def test_import_reuses_matching_supplier(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'ledger.xlsx')
+            write_workbook(path, 5, suppliers=1, types=1, seed=8)
+            workbook_name = inspect_workbook(path)[1][0][4]  # e.g. "Tile Steel #0"
+            existing = Supplier.objects.create(name=workbook_name.split('#')[0].upper())
+            import_workbook(path, Project.objects.create(name='Tower A'))
+        self.assertEqual(list(Supplier.objects.values_list('pk', flat=True)), [existing.pk])
+        self.assertEqual(ConstructionEntry.objects.filter(supplier=existing).count(), 5)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class ReconciliationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('bookkeeper', password='pw')
+        cls.a, cls.b = Supplier.objects.bulk_create([Supplier(name='A'), Supplier(name='B')])
+        project = Project.objects.create(name='Tower A')
+        project.members.add(cls.user)
+        ConstructionEntry.objects.bulk_create([ConstructionEntry(project=project, **fields) for fields in [
+            dict(supplier=cls.a, invoice_number='1', cost=60, posted='Inv'),
+            dict(supplier=cls.a, invoice_number='1', cost=40, posted='Inv', invoiced_amt=100),
+            dict(supplier=cls.a, invoice_number='2', cost=50, posted='Inv', invoiced_amt=45),
+            dict(supplier=cls.a, invoice_number='3', cost=20, posted='Inv'),
+            dict(supplier=cls.b, invoice_number='1', cost=30, posted='Yes'),
+            dict(supplier=cls.b, cost=99, posted='Inv'),
+            dict(invoice_number='1', cost=99, posted='Inv'),
+        ]])
+        refresh_invoice_summaries()
+
+    def statuses(self):
+        return {
+            (s.supplier.name, s.invoice_number): s.status
+            for s in InvoiceSummary.objects.select_related('supplier')
+        }
+
+    def test_statuses(self):
+        self.assertEqual(self.statuses(), {
+            ('A', '1'): 'matched', ('A', '2'): 'mismatch', ('A', '3'): 'open', ('B', '1'): 'paid',
+        })
+        self.assertEqual(InvoiceSummary.objects.get(status='mismatch').difference, -5)
+
+    def test_writes_refresh_touched_invoices(self):
+        entry = ConstructionEntry.objects.get(supplier=self.a, invoice_number='3')
+        summary = InvoiceSummary.objects.get(supplier=self.a, invoice_number='3')
+        with self.captureOnCommitCallbacks(execute=True):
+            entry.invoiced_amt = 20
+            entry.save()
+        self.assertEqual(self.statuses()[('A', '3')], 'matched')
+        # Upserted in place, so concurrent refreshes of one invoice cannot collide.
+        self.assertEqual(InvoiceSummary.objects.get(supplier=self.a, invoice_number='3').pk, summary.pk)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            entry.supplier = self.b
+            entry.save()
+            ConstructionEntry.objects.filter(supplier=self.a, invoice_number='2').delete()
+        self.assertEqual(callbacks.count(_refresh_pending), 1)
+        self.assertEqual(self.statuses(), {('A', '1'): 'matched', ('B', '1'): 'paid', ('B', '3'): 'matched'})
+
+        merge_suppliers(self.a, [self.b])
+        self.assertEqual(self.statuses(), {('A', '1'): 'mismatch', ('A', '3'): 'matched'})
+        self.assertEqual(InvoiceSummary.objects.get(invoice_number='1').entry_count, 3)
+
+    def test_report_and_export_unreconciled(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('ledger:reconciliation'))
+        self.assertEqual([s.invoice_number for s in response.context['page_obj']], ['2', '3'])
+        self.assertEqual(response.context['totals']['cost_total'], 70)
+        # A malformed supplier id is ignored rather than failing the page.
+        response = self.client.get(reverse('ledger:reconciliation'), {'supplier': 'abc'})
+        self.assertEqual(len(response.context['page_obj']), 2)
+
+    async def test_export_streams_from_an_async_iterator(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('ledger:reconciliation_export'), {'supplier': self.a.pk})
+        self.assertTrue(response.is_async)
+        lines = b''.join([chunk async for chunk in response.streaming_content]).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith('ID,Date'))
+        self.assertIn('45.00', lines[1])
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class ProjectTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('bookkeeper', password='pw')
+        cls.a, cls.b, cls.c = Project.objects.bulk_create([Project(name=name) for name in 'ABC'])
+        cls.user.ledger_projects.add(cls.a, cls.b)
+        for project, entries in [(cls.a, 5), (cls.b, 7), (cls.c, 3)]:
+            generate_ledger(entries=entries, suppliers=3, types=2, changelog_density=0, seed=9, project=project)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_views_show_the_chosen_project(self):
+        dashboard = reverse('ledger:dashboard')
+        self.assertEqual(self.client.get(dashboard).context['total_entries'], 5)
+
+        self.client.post(reverse('ledger:project_switch'), {'project': self.b.pk})
+        self.assertEqual(self.client.get(dashboard).context['total_entries'], 7)
+        other = ConstructionEntry.objects.filter(project=self.a).first()
+        self.assertEqual(self.client.get(reverse('ledger:entry_detail', args=[other.pk])).status_code, 404)
+
+        self.client.post(reverse('ledger:project_switch'), {'project': self.c.pk})
+        self.assertEqual(self.client.get(dashboard).context['current_project'], self.b)
+
+    def test_user_without_projects_is_refused(self):
+        self.client.force_login(get_user_model().objects.create_user('newcomer', password='pw'))
+        self.assertEqual(self.client.get(reverse('ledger:entry_list')).status_code, 403)
+
+    def test_import_replaces_only_its_project(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'ledger.xlsx')
+            write_workbook(path, 4, suppliers=2, types=1, seed=10)
+            import_workbook(path, self.a)
+        self.assertEqual(
+            dict(ConstructionEntry.objects.values_list('project__name').annotate(n=Count('id')).order_by()),
+            {'A': 4, 'B': 7, 'C': 3},
+        )
+
+    def test_generate_ledger_clear_keeps_other_projects(self):
+        close_period(self.a, datetime.date(2100, 12, 31))
+        call_command(
+            'generate_ledger', '--project', 'A', '--clear', '--entries', '2', '--suppliers', '3', '--types', '2',
+            '--changelog-density', '0', '--seed', '1', stdout=StringIO(),
+        )
+        self.assertEqual(
+            dict(ConstructionEntry.objects.values_list('project__name').annotate(n=Count('id')).order_by()),
+            {'A': 2, 'B': 7, 'C': 3},
+        )
+        self.assertFalse(PeriodClose.objects.filter(project=self.a).exists())
+
+
+@override_settings(LEDGER_CACHE_PERMISSIONS=True)
+class PermissionCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(name='Viewer')
+        cls.group.permissions.set(Permission.objects.filter(codename='view_constructionentry'))
+        cls.user = get_user_model().objects.create_user('bookkeeper', password='pw')
+        cls.user.groups.add(cls.group)
+
+    def setUp(self):
+        cache.clear()
+
+    def fresh_user(self):
+        return get_user_model().objects.get(pk=self.user.pk)
+
+    def test_warm_cache_answers_without_queries(self):
+        self.assertTrue(self.fresh_user().has_perm('ledger.view_constructionentry'))
+        user, async_user = self.fresh_user(), self.fresh_user()
+        with self.assertNumQueries(0):
+            self.assertTrue(user.has_perm('ledger.view_constructionentry'))
+            self.assertFalse(user.has_perm('ledger.change_constructionentry'))
+            # Async views check permissions through ahas_perm.
+            self.assertTrue(async_to_sync(async_user.ahas_perm)('ledger.view_constructionentry'))
+
+    def test_changes_invalidate_the_cache_on_commit(self):
+        self.assertFalse(self.fresh_user().has_perm('ledger.change_constructionentry'))
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.group.permissions.add(Permission.objects.get(codename='change_constructionentry'))
+        # Not before the change commits.
+        self.assertFalse(self.fresh_user().has_perm('ledger.change_constructionentry'))
+        for callback in callbacks:
+            callback()
+        self.assertTrue(self.fresh_user().has_perm('ledger.change_constructionentry'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.remove(self.group)
+        self.assertFalse(self.fresh_user().has_perm('ledger.view_constructionentry'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.add(self.group)
+            self.group.delete()
+        self.assertFalse(self.fresh_user().has_perm('ledger.view_constructionentry'))
+
+    @override_settings(LEDGER_CACHE_PERMISSIONS=False)
+    def test_off_without_a_shared_cache(self):
+        self.assertTrue(self.fresh_user().has_perm('ledger.view_constructionentry'))
+        user = self.fresh_user()
+        with self.assertNumQueries(2):
+            self.assertTrue(user.has_perm('ledger.view_constructionentry'))
+
+
+@override_settings(STORAGES=TEST_STORAGES, LEDGER_SUPPLIER_SELECT_LIMIT=2)
+class SupplierSelectTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser('admin', password='pw')
+        Project.objects.create(name='Tower A').members.add(cls.user)
+        cls.suppliers = Supplier.objects.bulk_create([Supplier(name=name) for name in ['Acme', 'Apex', 'Bolt']])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_large_lists_search_through_autocomplete(self):
+        acme = self.suppliers[0]
+        response = self.client.get(reverse('ledger:entry_list') + f'?supplier={acme.pk}')
+        self.assertEqual(response.context['suppliers'], [(acme.pk, 'Acme')])
+        self.assertContains(response, f'data-autocomplete-url="{reverse("ledger:supplier_autocomplete")}"')
+
+        form = self.client.get(reverse('ledger:entry_create')).context['form']
+        self.assertEqual(list(form.fields['supplier'].choices), [('', form.fields['supplier'].empty_label)])
+        self.assertIn('data-autocomplete-url', str(form['supplier']))
+
+        response = self.client.get(reverse('ledger:supplier_autocomplete') + '?q=ap')
+        self.assertEqual(response.json(), {'results': [{'id': self.suppliers[1].pk, 'name': 'Apex'}]})
+
+    @override_settings(LEDGER_SUPPLIER_SELECT_LIMIT=200)
+    def test_small_lists_are_listed_in_full(self):
+        response = self.client.get(reverse('ledger:entry_list'))
+        self.assertEqual(len(response.context['suppliers']), 3)
+        self.assertNotContains(response, 'data-autocomplete-url')
+
+
+class SetupGroupsTests(TestCase):
+    def setup_groups(self, *args):
+        out = StringIO()
+        call_command('setup_groups', *args, stdout=out)
+        return out.getvalue()
+
+    def test_sync_is_idempotent_and_reports_drift(self):
+        self.assertIn('Create group Viewer', self.setup_groups())
+        self.assertEqual(
+            set(Group.objects.get(name='Viewer').permissions.values_list('codename', flat=True)),
+            {'view_constructionentry', 'view_supplier', 'view_typedescription'},
+        )
+        with self.assertNumQueries(2):
+            self.assertIn('up to date', self.setup_groups('--check'))
+
+        editor = Group.objects.get(name='Editor')
+        editor.permissions.remove(Permission.objects.get(codename='add_supplier'))
+        editor.permissions.add(Permission.objects.get(codename='view_job'))
+        with self.assertRaisesMessage(CommandError, '2 changes'):
+            self.setup_groups('--check')
+        self.assertFalse(editor.permissions.filter(codename='add_supplier').exists())
+
+        self.assertTrue(editor.permissions.filter(codename='add_periodclose').exists())
+
+        output = self.setup_groups()
+        self.assertIn('Editor: add add_supplier', output)
+        self.assertIn('Editor: remove view_job', output)
+        self.assertIn('up to date', self.setup_groups())
+
+
+@override_settings(
+    STORAGES=TEST_STORAGES,
+    SESSION_ENGINE='django.contrib.sessions.backends.cached_db',
+    LEDGER_CACHE_USERS=True,
+)
+class SessionCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('bookkeeper', password='pw')
+        Project.objects.create(name='Tower A').members.add(cls.user)
+
+    def test_pages_skip_session_and_user_queries(self):
+        self.client.force_login(self.user)
+        url = reverse('ledger:entry_list')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        tables = ' '.join(q['sql'] for q in ctx.captured_queries)
+        self.assertNotIn('django_session', tables)
+        self.assertNotIn('FROM "auth_user"', tables)
+
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class EntryHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('bookkeeper', password='pw')
+        cls.project = Project.objects.create(name='Tower A')
+        cls.project.members.add(cls.user)
+        cls.entry = ConstructionEntry.objects.create(project=cls.project, description='Lumber')
+        EntryChangeLog.objects.bulk_create([
+            EntryChangeLog(
+                entry=cls.entry, project=cls.project, action='edit',
+                changes={'cost': {'old': str(i), 'new': str(i + 1)}},
+            )
+            for i in range(44)
+        ])
+        cls.wide = EntryChangeLog.objects.create(
+            entry=cls.entry, project=cls.project, action='edit',
+            changes={field: {'old': 'x' * 100, 'new': 'y'} for field in ['notes', 'stage', 'lm', 'qty', 'cost']},
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_history_is_paginated_and_summarized(self):
+        url = reverse('ledger:entry_detail', args=[self.entry.pk])
+        page = self.client.get(url).context['page_obj']
+        # 45 edits and the entry's create.
+        self.assertEqual((page.paginator.count, len(page)), (46, 20))
+        latest = page[0]
+        self.assertEqual(latest.pk, self.wide.pk)
+        self.assertTrue(latest.truncated)
+        self.assertEqual([d['field'] for d in latest.summary], ['notes', 'stage', 'lm'])
+        self.assertLess(len(latest.summary[0]['old']), 100)
+        self.assertFalse(page[1].truncated)
+        self.assertEqual(len(self.client.get(url + '?page=3').context['page_obj']), 6)
+
+        fragment = self.client.get(reverse('ledger:entry_change', args=[self.wide.pk]))
+        self.assertContains(fragment, 'x' * 100)
+        self.assertContains(fragment, '<strong>cost</strong>', html=True)
+
+    def test_full_diff_is_scoped_to_the_project(self):
+        other = Project.objects.create(name='Tower B')
+        log = EntryChangeLog.objects.create(project=other, action='edit', changes={'cost': {'old': '1', 'new': '2'}})
+        self.assertEqual(self.client.get(reverse('ledger:entry_change', args=[log.pk])).status_code, 404)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class AuditLogFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.user = User.objects.create_user('auditor', password='pw')
+        cls.editor = User.objects.create_user('editor', password='pw')
+        cls.project = Project.objects.create(name='Tower A')
+        cls.project.members.add(cls.user, cls.editor)
+        logs = EntryChangeLog.objects.bulk_create([
+            EntryChangeLog(project=cls.project, object_id=1, user=cls.editor, action='edit',
+                           changes={'cost': {'old': '1', 'new': '2'}}),
+            EntryChangeLog(project=cls.project, object_id=2, user=cls.editor, action='edit',
+                           changes={'notes': {'old': '', 'new': 'late'}}),
+            EntryChangeLog(project=cls.project, object_id=3, user=cls.user, action='edit',
+                           changes={'cost': {'old': '5', 'new': '6'}}),
+            EntryChangeLog(project=cls.project, object_id=1, user=cls.editor, action='create'),
+        ])
+        EntryChangeLog.objects.filter(pk=logs[0].pk).update(
+            timestamp=datetime.datetime(2022, 5, 31, 23, 30, tzinfo=datetime.timezone.utc),
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def snapshots(self, **params):
+        page = self.client.get(reverse('ledger:audit_log'), params).context['page_obj']
+        return sorted(log.object_id for log in page)
+
+    def test_filters(self):
+        self.assertEqual(self.snapshots(user=self.editor.pk, field='cost'), [1])
+        self.assertEqual(self.snapshots(action='edit', field='cost'), [1, 3])
+        self.assertEqual(self.snapshots(entry='1, 3'), [1, 1, 3])
+        self.assertEqual(self.snapshots(entry='1', action='create'), [1])
+        self.assertEqual(self.snapshots(date_from='2022-05-01', date_to='2022-05-31'), [1])
+        self.assertEqual(self.snapshots(date_to='2022-05-30'), [])
+        self.assertEqual(self.snapshots(date_from='2022-02-30'), [1, 1, 2, 3])
+        # A malformed user id is ignored rather than failing the page.
+        self.assertEqual(self.snapshots(user='abc', entry='2'), [2])
+
+    def test_user_choices_come_from_the_log(self):
+        admin = get_user_model().objects.create_superuser('admin', password='pw')
+        EntryChangeLog.objects.create(project=self.project, object_id=4, user=admin, action='edit')
+        users = self.client.get(reverse('ledger:audit_log')).context['users']
+        self.assertEqual([name for _, name in users], ['admin', 'auditor', 'editor'])
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class ChangeTrackingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser('admin', password='pw')
+        cls.project = Project.objects.create(name='Tower A')
+        generate_ledger(entries=30, suppliers=3, types=2, changelog_density=0, seed=4, project=cls.project)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_save_diffs_loaded_values_without_reading_the_row(self):
+        entry = ConstructionEntry.objects.first()
+        entry.cost = (entry.cost or 0) + 1
+        entry.notes = 'checked'
+        with CaptureQueriesContext(connection) as ctx, tracking_context(self.user, self.project):
+            entry.save()
+        # Only the closed-period check reads; the entry itself is not read back.
+        self.assertFalse([
+            q for q in ctx.captured_queries
+            if q['sql'].startswith('SELECT') and 'ledger_periodclose' not in q['sql']
+        ])
+        log = entry.change_logs.get()
+        self.assertEqual((log.action, log.user, log.project), ('edit', self.user, self.project))
+        self.assertEqual(set(log.changes), {'cost', 'notes'})
+
+        entry.save()
+        self.assertEqual(entry.change_logs.count(), 1)
+
+    def test_views_log_supplier_and_type_changes(self):
+        supplier, other = Supplier.objects.order_by('id')[:2]
+        self.client.post(reverse('ledger:supplier_rename', args=[supplier.pk]), {'new_name': 'Renamed'})
+        log = EntryChangeLog.objects.get(model='supplier', object_id=supplier.pk)
+        self.assertEqual((log.user, log.project), (self.user, self.project))
+        self.assertEqual(log.changes, {'name': {'old': supplier.name, 'new': 'Renamed'}})
+
+        type_description = TypeDescription.objects.first()
+        type_description.description = 'Framing'
+        type_description.save(update_fields=['description'])
+        self.assertTrue(EntryChangeLog.objects.filter(model='typedescription', changes__has_key='description').exists())
+
+        moved = ConstructionEntry.objects.filter(supplier=other).count()
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(reverse('ledger:supplier_rename', args=[other.pk]), {
+                'new_name': 'Renamed', 'confirm_override': '1',
+            })
+        self.assertEqual(
+            EntryChangeLog.objects.filter(model='constructionentry', changes__has_key='supplier').count(), moved,
+        )
+        inserts = [q for q in ctx.captured_queries if 'INSERT INTO "ledger_entrychangelog"' in q['sql']]
+        # One bulk insert for the moved entries, one for the deleted supplier.
+        self.assertEqual(len(inserts), 2)
+        self.assertEqual(
+            EntryChangeLog.objects.get(model='supplier', object_id=other.pk, action='delete').notes, 'Merged into Renamed',
+        )
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class EntryVersionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser('admin', password='pw')
+        cls.project = Project.objects.create(name='Tower A')
+        generate_ledger(entries=5, suppliers=2, types=2, changelog_density=0, seed=5, project=cls.project)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.entry = ConstructionEntry.objects.first()
+        form = EntryEditForm(instance=self.entry)
+        self.data = {name: '' if form[name].value() is None else form[name].value() for name in form.fields}
+
+    def test_edit_bumps_the_version_without_reading_it_back(self):
+        self.data['notes'] = 'mine'
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('ledger:entry_edit', args=[self.entry.pk]), self.data)
+        self.assertEqual(response.status_code, 302)
+        update = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "ledger_constructionentry"')]
+        self.assertEqual(len(update), 1)
+        self.assertIn('"version" = 1', update[0].split('WHERE')[1].replace("'", ''))
+        self.entry.refresh_from_db()
+        self.assertEqual((self.entry.notes, self.entry.version), ('mine', 2))
+
+        ConstructionEntry.objects.filter(pk=self.entry.pk).update(stage='Roof')
+        self.entry.refresh_from_db()
+        self.assertEqual(self.entry.version, 3)
+
+    def test_concurrent_edit_shows_a_conflict(self):
+        theirs = ConstructionEntry.objects.get(pk=self.entry.pk)
+        theirs.notes = 'theirs'
+        theirs.save()
+        self.data['notes'] = 'mine'
+        url = reverse('ledger:entry_edit', args=[self.entry.pk])
+        response = self.client.post(url, self.data)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.context['conflict'], [{'field': 'notes', 'old': 'theirs', 'new': 'mine'}])
+        self.assertEqual(ConstructionEntry.objects.get(pk=self.entry.pk).notes, 'theirs')
+
+        # Saving again from the conflict page overwrites knowingly.
+        self.data['version'] = response.context['form']['version'].value()
+        self.assertEqual(self.client.post(url, self.data).status_code, 302)
+        self.assertEqual(ConstructionEntry.objects.get(pk=self.entry.pk).notes, 'mine')
+
+    def test_edit_without_a_version_is_a_conflict(self):
+        del self.data['version']
+        self.data['notes'] = 'mine'
+        response = self.client.post(reverse('ledger:entry_edit', args=[self.entry.pk]), self.data)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.context['form']['version'].value(), 1)
+        self.assertEqual(ConstructionEntry.objects.get(pk=self.entry.pk).notes, self.entry.notes)
+
+    def test_conflict_with_a_deleted_entry_says_so(self):
+        request = RequestFactory().post(reverse('ledger:entry_edit', args=[self.entry.pk]), self.data)
+        request.session = self.client.session
+        request._messages = FallbackStorage(request)
+        ConstructionEntry.objects.filter(pk=self.entry.pk).delete()
+        response = _entry_conflict(request, self.entry)
+        self.assertEqual((response.status_code, response.url), (302, reverse('ledger:entry_list')))
+        self.assertIn('was deleted', [str(m) for m in request._messages][0])
+
+    def test_stale_unchecked_save_still_bumps_the_version(self):
+        stale = ConstructionEntry.objects.get(pk=self.entry.pk)
+        ConstructionEntry.objects.get(pk=self.entry.pk).save()
+        self.data['version'] = 2  # an editor who loaded the entry after that save
+        stale.notes = 'stale'
+        stale.save()
+        self.assertEqual(stale.version, 3)
+
+        self.data['notes'] = 'mine'
+        response = self.client.post(reverse('ledger:entry_edit', args=[self.entry.pk]), self.data)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(ConstructionEntry.objects.get(pk=self.entry.pk).notes, 'stale')
+
+
+@override_settings(STORAGES=TEST_STORAGES, LEDGER_VECTOR_ENGINE=False)
+class PeriodCloseTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser('admin', password='pw')
+        cls.project = Project.objects.create(name='Tower A')
+        generate_ledger(entries=80, suppliers=4, types=3, changelog_density=0, seed=6, project=cls.project)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def totals(self):
+        dashboard = self.client.get(reverse('ledger:dashboard')).context
+        entries = self.client.get(reverse('ledger:entry_list') + '?lm=M').context
+        return {
+            'entries': dashboard['total_entries'],
+            'cost': dashboard['total_cost'],
+            'transfers': dashboard['total_transfers'],
+            'dates': dashboard['date_range'],
+            'types': dict(zip(dashboard['type_ids'], dashboard['type_values'])),
+            'lm': dict(zip(dashboard['lm_codes'], dashboard['lm_values'])),
+            'suppliers': dict(zip(dashboard['supplier_ids'], dashboard['supplier_values'])),
+            'supplier_transfers': dict(zip(dashboard['transfer_ids'], dashboard['transfer_values'])),
+            'materials': (entries['totals'], entries['lm_subtotals']),
+        }
+
+    def test_close_freezes_totals_and_locks_entries(self):
+        before = self.totals()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('ledger:period_close'), {'month': '2022-12'})
+        self.assertEqual(response.status_code, 302)
+        close = PeriodClose.objects.get(project=self.project)
+        closed = ConstructionEntry.objects.filter(project=self.project, date__lte=datetime.date(2022, 12, 31))
+        self.assertEqual((close.start, close.entry_count), (None, closed.count()))
+        self.assertEqual(self.totals(), before)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('ledger:dashboard'))
+        # No query aggregates the closed year's entries.
+        self.assertFalse([
+            q for q in ctx.captured_queries
+            if 'SUM("ledger_constructionentry"."cost")' in q['sql'] and '"date" >' not in q['sql']
+        ])
+
+        entry = closed.first()
+        form = EntryEditForm(instance=entry)
+        data = {name: '' if form[name].value() is None else form[name].value() for name in form.fields}
+        data['notes'] = 'late change'
+        response = self.client.post(reverse('ledger:entry_edit', args=[entry.pk]), data)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].non_field_errors())
+        split = {'num_splits': 2, 'form-TOTAL_FORMS': 2, 'form-INITIAL_FORMS': 0}
+        for i in range(2):
+            split.update({f'form-{i}-{name}': value for name, value in data.items() if name != 'version'})
+        response = self.client.post(reverse('ledger:entry_split', args=[entry.pk]), split)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(all(form.non_field_errors() for form in response.context['formset']))
+        with self.assertRaises(PeriodClosed):
+            entry.delete()
+        open_entry = ConstructionEntry.objects.filter(project=self.project, date__gt=close.end).first()
+        open_entry.date = datetime.date(2022, 6, 1)
+        with self.assertRaises(PeriodClosed):
+            open_entry.save()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('ledger:period_reopen', args=[close.pk]))
+        self.assertFalse(PeriodClose.objects.exists())
+        self.assertEqual(self.client.post(reverse('ledger:entry_edit', args=[entry.pk]), data).status_code, 302)
+
+    def test_merge_moves_frozen_totals(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            close_period(self.project, datetime.date(2023, 6, 30), self.user)
+        target, source = Supplier.objects.order_by('id')[:2]
+        merge_suppliers(target, [source])
+        before = self.totals()['suppliers']
+        with self.captureOnCommitCallbacks(execute=True):
+            reopen_period(PeriodClose.objects.get())
+        self.assertEqual(self.totals()['suppliers'], before)
+
+
+@override_settings(STORAGES=TEST_STORAGES, LEDGER_VECTOR_ENGINE=False)
+class DisplayFieldTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser('admin', password='pw')
+        cls.project = Project.objects.create(name='Tower A')
+        generate_ledger(entries=40, suppliers=4, types=3, changelog_density=0, seed=7, project=cls.project)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def assertCopiesMatch(self):
+        for entry in ConstructionEntry.objects.select_related('supplier', 'type_description'):
+            self.assertEqual(entry.supplier_name, entry.supplier.name if entry.supplier else '')
+            self.assertEqual(entry.type_code, entry.type_description.code if entry.type_description else '')
+
+    def test_copies_follow_renames_merges_and_edits(self):
+        self.assertCopiesMatch()
+        supplier, other, third = Supplier.objects.order_by('id')[:3]
+        self.client.post(reverse('ledger:supplier_rename', args=[supplier.pk]), {'new_name': 'Renamed'})
+        supplier.refresh_from_db()
+        merge_suppliers(supplier, [other])
+        type_description = TypeDescription.objects.first()
+        type_description.code = 'ZZ'
+        type_description.save()
+        entry = ConstructionEntry.objects.filter(supplier=supplier).first()
+        entry.supplier_id = third.pk
+        entry.save()
+        third.delete()
+        self.assertCopiesMatch()
+        self.assertTrue(ConstructionEntry.objects.filter(supplier_name='Renamed').exists())
+
+    def test_list_pages_do_not_join(self):
+        supplier = Supplier.objects.first()
+        for url in [
+            reverse('ledger:entry_list') + '?sort=supplier_name',
+            reverse('ledger:dashboard'),
+            reverse('ledger:supplier_detail', args=[supplier.pk]) + '?sort=type_code',
+        ]:
+            with self.subTest(url=url), CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.client.get(url).status_code, 200)
+                entry_joins = [
+                    q['sql'] for q in ctx.captured_queries
+                    if 'JOIN "ledger_supplier"' in q['sql']
+                    or ('JOIN "ledger_typedescription"' in q['sql'] and 'SUM(' not in q['sql'])
+                ]
+                self.assertEqual(entry_joins, [])
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class EntryListPreferenceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser('admin', password='pw')
+        cls.project = Project.objects.create(name='Tower A')
+        generate_ledger(entries=120, suppliers=4, types=3, changelog_density=0, seed=8, project=cls.project)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def row_query(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        rows = [q['sql'] for q in ctx.captured_queries if 'LIMIT' in q['sql'] and '"ledger_constructionentry"."id"' in q['sql']]
+        self.assertEqual(len(rows), 1)
+        return response, rows[0]
+
+    def test_page_size_and_columns_are_saved_and_narrow_the_query(self):
+        url = reverse('ledger:entry_list')
+        response, sql = self.row_query(url)
+        self.assertEqual(len(response.context['page_obj']), 25)
+        self.assertNotIn('"notes"', sql)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('ledger:entry_list_preferences'), {
+                'page_size': 100, 'columns': ['date', 'cost'], 'query': 'lm=M',
+            })
+        self.assertRedirects(response, url + '?lm=M', fetch_redirect_response=False)
+        response, sql = self.row_query(url + '?sort=description')
+        self.assertEqual(len(response.context['page_obj']), 100)
+        self.assertEqual([c['key'] for c in response.context['columns']], ['date', 'cost'])
+        self.assertNotIn('"description",', sql)
+        self.assertNotIn('"supplier_name"', sql)
+
+        self.client.post(reverse('ledger:entry_list_preferences'), {'page_size': 25})
+        self.assertEqual(UserPreference.objects.get(user=self.user).entry_columns, ['date', 'cost'])
+
+    def test_first_column_links_to_the_entry(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('ledger:entry_list_preferences'), {
+                'page_size': 25, 'columns': ['supplier', 'lm', 'cost'],
+            })
+        response = self.client.get(reverse('ledger:entry_list'))
+        for entry in response.context['page_obj']:
+            self.assertContains(response, f'href="{reverse("ledger:entry_detail", args=[entry.pk])}"', count=1)
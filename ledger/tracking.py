@@ -0,0 +1,215 @@
+"""
+Change tracking for the ledger models.
+
+Models inheriting TrackedModel remember their tracked field values as
+loaded from the database (`from_db`), so `save()` diffs them against the
+current values without reading the row again and writes one
+EntryChangeLog row per create, changed save or delete. Their querysets'
+`update()` logs batch updates with one SELECT of the old values and one
+bulk insert of logs, whatever the number of rows. bulk_create() and
+queryset delete() (imports, synthetic data) are not logged.
+
+Logs record the acting user and project of the current request (see
+change_tracking_middleware) or of `tracking_context()`, which jobs and
+commands use.
+"""
+import contextvars
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction
+from django.core.exceptions import PermissionDenied
+from django.db import models, transaction
+from django.db.models.expressions import Combinable
+from django.utils.decorators import sync_and_async_middleware
+
+_request = contextvars.ContextVar('ledger_tracking_request', default=None)
+_actor = contextvars.ContextVar('ledger_tracking_actor', default=None)
+
+
+@contextmanager
+def tracking_context(user=None, project=None):
+    """Attribute changes made inside the block to `user` and `project` (instances or ids)."""
+    token = _actor.set((getattr(user, 'pk', user), getattr(project, 'pk', project)))
+    try:
+        yield
+    finally:
+        _actor.reset(token)
+
+
+@sync_and_async_middleware
+def change_tracking_middleware(get_response):
+    """Make the request's user and project the actor of changes made while serving it."""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            token = _request.set(request)
+            try:
+                return await get_response(request)
+            finally:
+                _request.reset(token)
+    else:
+        def middleware(request):
+            token = _request.set(request)
+            try:
+                return get_response(request)
+            finally:
+                _request.reset(token)
+    return middleware
+
+
+def current_actor():
+    """Return (user id, project id) for new change logs; either may be None."""
+    actor = _actor.get()
+    if actor is not None:
+        return actor
+    request = _request.get()
+    if request is None:
+        return None, None
+    from .projects import current_project
+
+    if not request.user.is_authenticated:
+        return None, None
+    try:
+        # Usually resolved by the view already, so no query.
+        project = current_project(request)
+    except PermissionDenied:
+        project = None
+    return request.user.pk, getattr(project, 'pk', None)
+
+
+def display(value):
+    return '' if value is None else str(value)
+
+
+def _diff(old, new):
+    return {'old': display(old), 'new': display(new)}
+
+
+def _new_log(model, pk, action, changes=None, notes='', row=None):
+    """An unsaved EntryChangeLog; `row` maps the model's CHANGE_LOG_FIELDS attnames to values."""
+    from .models import EntryChangeLog
+
+    user_id, project_id = current_actor()
+    fields = {'project_id': project_id}
+    fields.update({log_field: row[attname] for log_field, attname in model.CHANGE_LOG_FIELDS.items()})
+    return EntryChangeLog(
+        model=model._meta.model_name, object_id=pk, user_id=user_id, action=action,
+        changes=changes or {}, notes=notes, **fields,
+    )
+
+
+class TrackedQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        from .models import EntryChangeLog
+
+        tracked = [
+            (name, attname) for name, attname in self.model.tracked_fields() if name in kwargs or attname in kwargs
+        ]
+        if not tracked:
+            return super().update(**kwargs)
+        extra = list(self.model.CHANGE_LOG_FIELDS.values())
+        columns = [attname for _, attname in tracked]
+        with transaction.atomic(using=self.db, savepoint=False):
+            old = {row[0]: row for row in self.values_list('pk', *columns, *extra)}
+            updated = super().update(**kwargs)
+            if any(isinstance(kwargs.get(name, kwargs.get(attname)), Combinable) for name, attname in tracked):
+                # F() and other expressions: read back what they produced.
+                new = dict(self.model._base_manager.using(self.db).filter(pk__in=old).values_list('pk', *columns))
+            else:
+                values = []
+                for name, attname in tracked:
+                    value = kwargs[name] if name in kwargs else kwargs[attname]
+                    if isinstance(value, models.Model):
+                        value = value.pk
+                    elif value is not None:
+                        value = self.model._meta.get_field(name).to_python(value)
+                    values.append(value)
+                new = {pk: values for pk in old}
+            logs = []
+            for pk, (_, *old_values) in old.items():
+                changes = {
+                    name: _diff(before, after)
+                    for (name, _), before, after in zip(tracked, old_values, new[pk])
+                    if before != after
+                }
+                if changes:
+                    row = dict(zip(extra, old_values[len(columns):]))
+                    logs.append(_new_log(self.model, pk, 'edit', changes, row=row))
+            EntryChangeLog.objects.bulk_create(logs, batch_size=1000)
+        return updated
+
+
+class TrackedModel(models.Model):
+    """
+    Abstract base for models whose writes are logged to EntryChangeLog.
+
+    Set `change_action` or `change_note` on an instance before save() or
+    delete() to log something other than a plain create/edit/delete.
+    """
+
+    # Fields to diff; empty means every editable concrete field but the pk.
+    TRACKED_FIELDS = ()
+    # EntryChangeLog fields copied from the tracked row: {log field: attname}.
+    CHANGE_LOG_FIELDS = {}
+
+    objects = TrackedQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def tracked_fields(cls):
+        """[(field name, attname)] of the tracked fields."""
+        if '_tracked_fields' not in cls.__dict__:
+            fields = [
+                f for f in cls._meta.concrete_fields
+                if not f.primary_key and f.editable and (not cls.TRACKED_FIELDS or f.name in cls.TRACKED_FIELDS)
+            ]
+            cls._tracked_fields = [(f.name, f.attname) for f in fields]
+        return cls._tracked_fields
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Deferred fields are left out: they cannot be diffed without a query.
+        loaded = dict(zip(field_names, values))
+        instance._loaded_values = {
+            name: loaded[attname] for name, attname in cls.tracked_fields() if attname in loaded
+        }
+        return instance
+
+    def tracked_changes(self, fields=None):
+        """{field: {'old': ..., 'new': ...}} of tracked fields changed since loading."""
+        loaded = getattr(self, '_loaded_values', {})
+        changes = {}
+        for name, attname in self.tracked_fields():
+            if name in loaded and (fields is None or name in fields or attname in fields):
+                new = self.__dict__.get(attname)
+                if loaded[name] != new:
+                    changes[name] = _diff(loaded[name], new)
+        return changes
+
+    def _log(self, action, changes=None):
+        row = {attname: getattr(self, attname) for attname in self.CHANGE_LOG_FIELDS.values()}
+        _new_log(
+            type(self), self.pk, getattr(self, 'change_action', None) or action, changes,
+            getattr(self, 'change_note', ''), row,
+        ).save()
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        update_fields = kwargs.get('update_fields')
+        changes = None if adding else self.tracked_changes(update_fields)
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            super().save(*args, **kwargs)
+            if adding or changes:
+                self._log('create' if adding else 'edit', changes)
+        loaded = getattr(self, '_loaded_values', {})
+        for name, attname in self.tracked_fields():
+            if update_fields is None or name in update_fields or attname in update_fields:
+                loaded[name] = self.__dict__.get(attname)
+        self._loaded_values = loaded
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            self._log('delete')
+            return super().delete(*args, **kwargs)
@@ -5,11 +5,24 @@ app_name = 'ledger'
 
 urlpatterns = [
     path('', views.dashboard, name='dashboard'),
+    path('projects/switch/', views.project_switch, name='project_switch'),
     path('entries/', views.entry_list, name='entry_list'),
     path('entries/new/', views.entry_create, name='entry_create'),
+    path('entries/preferences/', views.entry_list_preferences_save, name='entry_list_preferences'),
     path('entries/<int:pk>/', views.entry_detail, name='entry_detail'),
     path('entries/<int:pk>/edit/', views.entry_edit, name='entry_edit'),
     path('entries/<int:pk>/split/', views.entry_split, name='entry_split'),
+    path('entries/changes/<int:pk>/', views.entry_change, name='entry_change'),
+    path('duplicates/', views.duplicate_list, name='duplicate_list'),
+    path('duplicates/scan/', views.duplicate_scan, name='duplicate_scan'),
+    path('duplicates/<int:pk>/dismiss/', views.duplicate_dismiss, name='duplicate_dismiss'),
+    path('duplicates/<int:pk>/delete/', views.duplicate_delete, name='duplicate_delete'),
+    path('periods/', views.period_list, name='period_list'),
+    path('periods/close/', views.period_close, name='period_close'),
+    path('periods/<int:pk>/reopen/', views.period_reopen, name='period_reopen'),
+    path('reconciliation/', views.reconciliation, name='reconciliation'),
+    path('reconciliation/export/', views.reconciliation_export, name='reconciliation_export'),
+    path('reconciliation/rebuild/', views.reconciliation_rebuild, name='reconciliation_rebuild'),
     path('audit-log/', views.audit_log, name='audit_log'),
     path('users/', views.user_list, name='user_list'),
     path('users/new/', views.user_create, name='user_create'),
@@ -17,7 +30,18 @@ urlpatterns = [
     path('groups/', views.group_list, name='group_list'),
     path('groups/new/', views.group_create, name='group_create'),
     path('groups/<int:pk>/edit/', views.group_edit, name='group_edit'),
+    path('jobs/', views.job_list, name='job_list'),
+    path('jobs/import/', views.job_import, name='job_import'),
+    path('jobs/export/', views.job_export, name='job_export'),
+    path('jobs/<int:pk>/', views.job_detail, name='job_detail'),
+    path('jobs/<int:pk>/confirm/', views.job_confirm, name='job_confirm'),
+    path('jobs/<int:pk>/retry/', views.job_retry, name='job_retry'),
+    path('jobs/<int:pk>/status/', views.job_status, name='job_status'),
+    path('jobs/<int:pk>/download/', views.job_download, name='job_download'),
     path('suppliers/', views.supplier_list, name='supplier_list'),
+    path('suppliers/duplicates/', views.supplier_duplicates, name='supplier_duplicates'),
+    path('suppliers/merge/', views.supplier_merge, name='supplier_merge'),
+    path('suppliers/autocomplete/', views.supplier_autocomplete, name='supplier_autocomplete'),
     path('suppliers/<int:pk>/', views.supplier_detail, name='supplier_detail'),
     path('suppliers/<int:pk>/rename/', views.supplier_rename, name='supplier_rename'),
 ]
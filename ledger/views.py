@@ -1,78 +1,240 @@
+import asyncio
+import csv
+import os
 from decimal import Decimal, ROUND_HALF_UP
-
-from django.shortcuts import render, get_object_or_404, redirect
-from django.db.models import Sum, Count, Q, Min, Max
+from itertools import islice
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, get_object_or_404, redirect, aget_object_or_404
+from django.urls import reverse
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
+from django.utils.text import Truncator
+from django.views.decorators.http import require_POST
+from django.db.models import Exists, OuterRef, Sum, Count, Q, Min, Max
+from django.db import transaction
 from django.core.paginator import Paginator
 from django.forms import formset_factory
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required, permission_required
 from django.core.exceptions import PermissionDenied
 
-from .models import ConstructionEntry, Supplier, TypeDescription, EntryChangeLog
+from .choices import choices_version, supplier_choices, supplier_select_choices, type_choices
+from .duplicates import dismiss_suspect
+from .engine import get_frame
+from .filters import (
+    audit_filter_values, entry_filter_values, filter_entries, filter_logs, filter_summaries,
+    reconciliation_filter_values,
+)
+from .importer import WORKBOOK_HEADERS
+from .jobs import EXPORT_COLUMNS, enqueue
+from .permissions import ledger_permission_ids
+from .models import (
+    ConstructionEntry, EntryConflict, Supplier, TypeDescription, EntryChangeLog, Job, DuplicateSuspect,
+    InvoiceSummary, PeriodClose,
+)
+from .periods import SNAPSHOT_FILTERS, closed_through, close_period, ledger_groups, reopen_period, sum_totals
+from .preferences import ENTRY_COLUMNS, entry_list_fields, entry_list_preferences, save_entry_list_preferences
+from .projects import current_project, set_current_project, user_projects
+from .reconciliation import summary_entries
+from .suppliers import SupplierIndex, merge_suppliers
 from django.contrib import messages
 
-from django.contrib.auth.models import Group, Permission
-from django.contrib.contenttypes.models import ContentType
+from django.contrib.auth.models import Group
 
-from .forms import ConstructionEntryForm, UserCreateForm, UserEditForm, GroupForm, LEDGER_PERMISSIONS
+from .forms import (
+    ConstructionEntryForm, EntryEditForm, UserCreateForm, UserEditForm, GroupForm, WorkbookUploadForm, ImportConfirmForm,
+    PeriodCloseForm, EntryListPreferencesForm, LEDGER_PERMISSIONS,
+)
 
 
-@login_required
-def dashboard(request):
-    entries = ConstructionEntry.objects.all()
-    total_entries = entries.count()
-    total_cost = entries.exclude(lm='X').aggregate(total=Sum('cost'))['total'] or 0
-    total_transfers = entries.filter(lm='X').aggregate(total=Sum('cost'))['total'] or 0
-    total_suppliers = Supplier.objects.count()
-    date_range = entries.aggregate(min_date=Min('date'), max_date=Max('date'))
+# The read-heavy pages below are async views: their independent queries are
+# gathered, and the ASGI worker keeps serving other requests while they run.
+# Templates are rendered in a sync thread because the auth context processor
+# and the perms proxy query lazily.
 
-    # Cost by TypeDescription
+async def _alist(queryset):
+    return [obj async for obj in queryset]
+
+
+def _get_page(paginator, number):
+    """Return the requested page with its rows already fetched."""
+    page = paginator.get_page(number)
+    page.object_list = list(page.object_list)
+    return page
+
+
+_arender = sync_to_async(render)
+
+# Entry columns the list templates show; supplier_name and type_code spare
+# them the joins to suppliers and types.
+RECENT_ENTRY_COLUMNS = ['date', 'description', 'supplier_name', 'type_code', 'lm', 'cost']
+SUPPLIER_ENTRY_COLUMNS = ['date', 'description', 'type_code', 'lm', 'cost', 'posted']
+
+
+def _dashboard_totals_from_frame(frame):
+    """The dashboard aggregates computed from the in-process ledger arrays."""
+    type_labels = dict(type_choices())
+    supplier_names = dict(supplier_choices())
+    transfer = frame.lm_mask('X')
+    by_type = frame.group_totals('type', mask=~transfer & (frame.type != 0))
+    by_supplier = frame.group_totals('supplier', mask=~transfer & (frame.supplier != 0))
+    transfers_by_supplier = frame.group_totals('supplier', mask=transfer & (frame.supplier != 0))
+
+    def by_total(groups):
+        rows = [(pk, supplier_names.get(pk, ''), total) for pk, (total, _) in groups.items()]
+        return sorted(rows, key=lambda row: row[2] or 0, reverse=True)
+
+    return {
+        'total_entries': len(frame),
+        'total_cost': frame.total(mask=~transfer),
+        'total_transfers': frame.total(mask=transfer),
+        'date_range': frame.date_range(),
+        # type_choices is ordered by code, like the ORM query
+        'types': [(pk, label, by_type[pk][0]) for pk, label in type_labels.items() if pk in by_type],
+        'lm': sorted(
+            (code, total) for code, (total, _) in
+            frame.group_totals('lm', mask=frame.lm_mask('L', 'M', 'U')).items()
+        ),
+        'transfers': by_total(transfers_by_supplier),
+        'suppliers': by_total(by_supplier),
+    }
+
+
+def _dashboard_totals_from_periods(project, through):
+    """The dashboard aggregates from the closed periods' frozen totals and the open period's entries."""
+    groups = ledger_groups(project, through=through)
+    type_labels = dict(type_choices())
+    supplier_names = dict(supplier_choices())
+    by_type, by_lm, by_supplier, transfers = {}, {}, {}, {}
+    for g in groups:
+        if g['lm'] == 'X':
+            if g['supplier_id']:
+                transfers.setdefault(g['supplier_id'], []).append(g['total'])
+            continue
+        if g['type_description_id']:
+            by_type.setdefault(g['type_description_id'], []).append(g['total'])
+        if g['lm'] in ('L', 'M', 'U'):
+            by_lm.setdefault(g['lm'], []).append(g['total'])
+        if g['supplier_id']:
+            by_supplier.setdefault(g['supplier_id'], []).append(g['total'])
+
+    def by_total(totals):
+        rows = [(pk, supplier_names.get(pk, ''), sum_totals(values)) for pk, values in totals.items()]
+        return sorted(rows, key=lambda row: row[2] or 0, reverse=True)
+
+    dates = [g['min_date'] for g in groups if g['min_date']] + [g['max_date'] for g in groups if g['max_date']]
+    return {
+        'total_entries': sum(g['count'] for g in groups),
+        'total_cost': sum_totals(g['total'] for g in groups if g['lm'] != 'X'),
+        'total_transfers': sum_totals(g['total'] for g in groups if g['lm'] == 'X'),
+        'date_range': {'min_date': min(dates, default=None), 'max_date': max(dates, default=None)},
+        'types': [
+            (pk, label, sum_totals(by_type[pk])) for pk, label in type_labels.items() if pk in by_type
+        ],
+        'lm': [(code, sum_totals(values)) for code, values in sorted(by_lm.items())],
+        'transfers': by_total(transfers),
+        'suppliers': by_total(by_supplier),
+    }
+
+
+async def _dashboard_totals_from_db(project):
+    entries = ConstructionEntry.objects.filter(project=project)
     type_costs = (
         entries.filter(type_description__isnull=False).exclude(lm='X')
         .values('type_description_id', 'type_description__code', 'type_description__description')
         .annotate(total=Sum('cost'))
         .order_by('type_description__code')
     )
-    type_labels = [f"{t['type_description__code']} - {t['type_description__description']}" for t in type_costs]
-    type_values = [float(t['total'] or 0) for t in type_costs]
-    type_ids = [t['type_description_id'] for t in type_costs]
-
-    # Cost by L/M category
     lm_costs = (
         entries.filter(lm__in=['L', 'M', 'U'])
         .values('lm')
         .annotate(total=Sum('cost'))
         .order_by('lm')
     )
-    lm_map = {'L': 'Labor', 'M': 'Materials', 'U': 'Utility'}
-    lm_labels = [lm_map.get(c['lm'], c['lm']) for c in lm_costs]
-    lm_values = [float(c['total'] or 0) for c in lm_costs]
-    lm_codes = [c['lm'] for c in lm_costs]
-
-    # Transfers by Supplier
     transfer_costs = (
         entries.filter(lm='X', supplier__isnull=False)
-        .values('supplier_id', 'supplier__name')
+        .values('supplier_id', 'supplier_name')
         .annotate(total=Sum('cost'))
         .order_by('-total')
     )
-    transfer_labels = [t['supplier__name'] for t in transfer_costs]
-    transfer_values = [float(t['total'] or 0) for t in transfer_costs]
-    transfer_ids = [t['supplier_id'] for t in transfer_costs]
-
-    # Cost by Supplier (excluding transfers)
     supplier_costs = (
         entries.filter(supplier__isnull=False).exclude(lm='X')
-        .values('supplier_id', 'supplier__name')
+        .values('supplier_id', 'supplier_name')
         .annotate(total=Sum('cost'))
         .order_by('-total')
     )
-    supplier_labels = [s['supplier__name'] for s in supplier_costs]
-    supplier_values = [float(s['total'] or 0) for s in supplier_costs]
-    supplier_ids = [s['supplier_id'] for s in supplier_costs]
+    (
+        total_entries, cost, transfers, date_range,
+        type_costs, lm_costs, transfer_costs, supplier_costs,
+    ) = await asyncio.gather(
+        entries.acount(),
+        entries.exclude(lm='X').aaggregate(total=Sum('cost')),
+        entries.filter(lm='X').aaggregate(total=Sum('cost')),
+        entries.aaggregate(min_date=Min('date'), max_date=Max('date')),
+        _alist(type_costs),
+        _alist(lm_costs),
+        _alist(transfer_costs),
+        _alist(supplier_costs),
+    )
+    return {
+        'total_entries': total_entries,
+        'total_cost': cost['total'],
+        'total_transfers': transfers['total'],
+        'date_range': date_range,
+        'types': [
+            (t['type_description_id'], f"{t['type_description__code']} - {t['type_description__description']}",
+             t['total'])
+            for t in type_costs
+        ],
+        'lm': [(c['lm'], c['total']) for c in lm_costs],
+        'transfers': [(t['supplier_id'], t['supplier_name'], t['total']) for t in transfer_costs],
+        'suppliers': [(s['supplier_id'], s['supplier_name'], s['total']) for s in supplier_costs],
+    }
+
+
+@login_required
+async def dashboard(request):
+    project = await sync_to_async(current_project)(request)
+    entries = ConstructionEntry.objects.filter(project=project)
+    recent_entries = entries.only(*RECENT_ENTRY_COLUMNS).order_by('-date', '-id')[:10]
+    frame, suppliers, recent_entries = await asyncio.gather(
+        sync_to_async(get_frame)(project),
+        entries.aaggregate(count=Count('supplier', distinct=True)),
+        _alist(recent_entries),
+    )
+    total_suppliers = suppliers['count']
+    if frame is not None:
+        totals = await sync_to_async(_dashboard_totals_from_frame)(frame)
+    elif (through := await sync_to_async(closed_through)(project.pk)) is not None:
+        totals = await sync_to_async(_dashboard_totals_from_periods)(project, through)
+    else:
+        totals = await _dashboard_totals_from_db(project)
+    total_entries = totals['total_entries']
+    total_cost = totals['total_cost'] or 0
+    total_transfers = totals['total_transfers'] or 0
+    date_range = totals['date_range']
 
-    # Recent entries
-    recent_entries = entries.select_related('supplier', 'type_description').order_by('-date', '-id')[:10]
+    # Cost by TypeDescription
+    type_ids = [pk for pk, _, _ in totals['types']]
+    type_labels = [label for _, label, _ in totals['types']]
+    type_values = [float(total or 0) for _, _, total in totals['types']]
+
+    # Cost by L/M category
+    lm_map = {'L': 'Labor', 'M': 'Materials', 'U': 'Utility'}
+    lm_codes = [code for code, _ in totals['lm']]
+    lm_labels = [lm_map.get(code, code) for code in lm_codes]
+    lm_values = [float(total or 0) for _, total in totals['lm']]
+
+    # Transfers by Supplier
+    transfer_ids = [pk for pk, _, _ in totals['transfers']]
+    transfer_labels = [name for _, name, _ in totals['transfers']]
+    transfer_values = [float(total or 0) for _, _, total in totals['transfers']]
+
+    # Cost by Supplier (excluding transfers)
+    supplier_ids = [pk for pk, _, _ in totals['suppliers']]
+    supplier_labels = [name for _, name, _ in totals['suppliers']]
+    supplier_values = [float(total or 0) for _, _, total in totals['suppliers']]
 
     context = {
         'total_entries': total_entries,
@@ -94,111 +256,200 @@ def dashboard(request):
         'supplier_ids': supplier_ids,
         'recent_entries': recent_entries,
     }
-    return render(request, 'ledger/dashboard.html', context)
+    return await _arender(request, 'ledger/dashboard.html', context)
+
+
+def _entry_totals_from_frame(frame, filters):
+    mask = frame.mask(filters)
+    totals = {'total_cost': frame.total(mask=mask), 'entry_count': int(mask.sum())}
+    by_lm = frame.group_totals('lm', mask=mask & frame.lm_mask('L', 'M', 'U', 'X'))
+    lm_subtotals = [
+        {'lm': code, 'total': total, 'count': count} for code, (total, count) in sorted(by_lm.items())
+    ]
+    return totals, lm_subtotals
+
+
+def _entry_totals_from_periods(project, filters, through):
+    groups = ledger_groups(project, filters, through)
+    totals = {'total_cost': sum_totals(g['total'] for g in groups), 'entry_count': sum(g['count'] for g in groups)}
+    by_lm = {}
+    for g in groups:
+        if g['lm'] in ('L', 'M', 'U', 'X'):
+            by_lm.setdefault(g['lm'], []).append(g)
+    lm_subtotals = [
+        {'lm': code, 'total': sum_totals(g['total'] for g in rows), 'count': sum(g['count'] for g in rows)}
+        for code, rows in sorted(by_lm.items())
+    ]
+    return totals, lm_subtotals
+
+
+async def _entry_totals_from_db(entries):
+    lm_subtotals = (
+        entries.filter(lm__in=['L', 'M', 'U', 'X'])
+        .values('lm')
+        .annotate(total=Sum('cost'), count=Count('id'))
+        .order_by('lm')
+    )
+    return await asyncio.gather(
+        entries.aaggregate(total_cost=Sum('cost'), entry_count=Count('id')),
+        _alist(lm_subtotals),
+    )
 
 
 @login_required
-def entry_list(request):
-    entries = ConstructionEntry.objects.select_related('supplier', 'type_description').all()
+async def entry_list(request):
+    project = await sync_to_async(current_project)(request)
+    entries = ConstructionEntry.objects.filter(project=project)
 
     # Filtering
-    supplier_id = request.GET.get('supplier')
-    type_id = request.GET.get('type')
-    lm = request.GET.get('lm')
-    posted = request.GET.get('posted')
-    date_from = request.GET.get('date_from')
-    date_to = request.GET.get('date_to')
-    search = request.GET.get('search', '').strip()
-
-    if supplier_id:
-        entries = entries.filter(supplier_id=supplier_id)
-    if type_id:
-        entries = entries.filter(type_description_id=type_id)
-    if lm:
-        entries = entries.filter(lm=lm)
-    if posted:
-        entries = entries.filter(posted=posted)
-    if date_from:
-        entries = entries.filter(date__gte=date_from)
-    if date_to:
-        entries = entries.filter(date__lte=date_to)
-    if search:
-        entries = entries.filter(
-            Q(description__icontains=search) |
-            Q(notes__icontains=search) |
-            Q(invoice_number__icontains=search)
-        )
+    filters = entry_filter_values(request.GET)
+    entries = filter_entries(entries, filters)
 
     # Sorting
     sort = request.GET.get('sort', 'date')
     direction = request.GET.get('dir', 'asc')
-    valid_sorts = ['date', 'description', 'supplier__name', 'cost', 'lm', 'type_description__code']
+    valid_sorts = [sort for *_, sort in ENTRY_COLUMNS if sort]
     if sort not in valid_sorts:
         sort = 'date'
     order_prefix = '-' if direction == 'desc' else ''
     entries = entries.order_by(f'{order_prefix}{sort}', 'id')
 
-    # Pagination
-    paginator = Paginator(entries, 25)
+    # Pagination, loading only the user's columns; the entry version keys
+    # the cached table row fragments
+    page_size, columns = await sync_to_async(entry_list_preferences)(request.user)
+    paginator = Paginator(entries.only(*entry_list_fields(columns)), page_size)
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
 
     # Totals & L/M subtotals (on filtered queryset, before pagination)
-    totals = entries.aggregate(total_cost=Sum('cost'), entry_count=Count('id'))
     lm_map = {'L': 'Labor', 'M': 'Materials', 'U': 'Utility', 'X': 'Transfer'}
-    lm_subtotals = (
-        entries.filter(lm__in=['L', 'M', 'U', 'X'])
-        .values('lm')
-        .annotate(total=Sum('cost'), count=Count('id'))
-        .order_by('lm')
+    frame = await sync_to_async(get_frame)(project)
+    if frame is not None and frame.can_filter(filters):
+        totals_query = sync_to_async(_entry_totals_from_frame)(frame, filters)
+    elif (
+        not any(value for name, value in filters.items() if name not in SNAPSHOT_FILTERS)
+        and (through := await sync_to_async(closed_through)(project.pk)) is not None
+    ):
+        totals_query = sync_to_async(_entry_totals_from_periods)(project, filters, through)
+    else:
+        totals_query = _entry_totals_from_db(entries)
+    page_obj, (totals, lm_subtotals), (suppliers, supplier_search), types, version = await asyncio.gather(
+        sync_to_async(_get_page)(paginator, page_number),
+        totals_query,
+        sync_to_async(supplier_select_choices)(filters['supplier']),
+        sync_to_async(type_choices)(),
+        sync_to_async(choices_version)(),
     )
     lm_subtotals = [
         {'code': s['lm'], 'label': lm_map.get(s['lm'], s['lm']), 'total': s['total'], 'count': s['count']}
         for s in lm_subtotals
     ]
-
-    # Filter options
-    suppliers = Supplier.objects.order_by('name')
-    types = TypeDescription.objects.order_by('code')
+    for e in page_obj.object_list:
+        e.cells = [(column, getattr(e, column['field'])) for column in columns]
 
     context = {
         'page_obj': page_obj,
+        'columns': columns,
+        'columns_key': ','.join(column['key'] for column in columns),
+        'preferences_form': EntryListPreferencesForm(initial={
+            'page_size': page_size, 'columns': [column['key'] for column in columns],
+        }),
+        'filter_query': urlencode(filters),
         'suppliers': suppliers,
+        'supplier_search': supplier_search,
         'types': types,
+        'choices_version': version,
         'totals': totals,
         'lm_subtotals': lm_subtotals,
         'current_filters': {
-            'supplier': supplier_id or '',
-            'type': type_id or '',
-            'lm': lm or '',
-            'posted': posted or '',
-            'date_from': date_from or '',
-            'date_to': date_to or '',
-            'search': search,
+            **filters,
             'sort': sort,
             'dir': direction,
         },
         'total_filtered': paginator.count,
     }
-    return render(request, 'ledger/entry_list.html', context)
+    return await _arender(request, 'ledger/entry_list.html', context)
+
+
+@login_required
+@require_POST
+def entry_list_preferences_save(request):
+    form = EntryListPreferencesForm(request.POST)
+    if form.is_valid():
+        save_entry_list_preferences(request.user, form.cleaned_data['page_size'], form.cleaned_data['columns'])
+    else:
+        messages.error(request, ' '.join(error for errors in form.errors.values() for error in errors))
+    # Back to the list as it was, filters and sort included.
+    return redirect(f"{reverse('ledger:entry_list')}?{request.POST.get('query', '')}")
+
+
+HISTORY_PAGE_SIZE = 20
+# Changed fields shown per history row; the full diff is loaded on demand.
+HISTORY_SUMMARY_FIELDS = 3
+HISTORY_VALUE_CHARS = 40
+
+
+def _related_labels():
+    """Names for the supplier and type ids that change logs record, from the cached choices."""
+    return {'supplier': dict(supplier_choices()), 'type_description': dict(type_choices())}
+
+
+def _change_rows(changes, labels, limit=None):
+    """[{'field', 'old', 'new'}] for a change log's diff, with related ids shown by name."""
+    items = list(changes.items()) if isinstance(changes, dict) else []
+    rows = []
+    for field, diff in items[:limit]:
+        diff = diff if isinstance(diff, dict) else {'new': diff}
+        row = {'field': field}
+        for side in ('old', 'new'):
+            value = '' if diff.get(side) is None else str(diff[side])
+            if field in labels and value.isdigit():
+                value = labels[field].get(int(value), value)
+            row[side] = value
+        rows.append(row)
+    return rows
+
+
+def _summarize_changes(log, labels):
+    """Set log.summary to the first changed fields with shortened values, and log.truncated."""
+    log.summary = _change_rows(log.changes, labels, HISTORY_SUMMARY_FIELDS)
+    log.truncated = len(log.changes or {}) > HISTORY_SUMMARY_FIELDS
+    for row in log.summary:
+        for side in ('old', 'new'):
+            short = Truncator(row[side]).chars(HISTORY_VALUE_CHARS)
+            log.truncated = log.truncated or short != row[side]
+            row[side] = short
 
 
 @login_required
 def entry_detail(request, pk):
     entry = get_object_or_404(
         ConstructionEntry.objects.select_related('supplier', 'type_description'),
-        pk=pk
+        pk=pk, project=current_project(request),
     )
-    change_logs = entry.change_logs.select_related('user').order_by('-timestamp')
-    return render(request, 'ledger/entry_detail.html', {'entry': entry, 'change_logs': change_logs})
+    # Served by the (entry, -timestamp, -id) index: only the page is read.
+    change_logs = entry.change_logs.select_related('user').order_by('-timestamp', '-id')
+    page_obj = Paginator(change_logs, HISTORY_PAGE_SIZE).get_page(request.GET.get('page'))
+    labels = _related_labels()
+    for log in page_obj:
+        _summarize_changes(log, labels)
+    return render(request, 'ledger/entry_detail.html', {'entry': entry, 'page_obj': page_obj})
+
+
+@login_required
+def entry_change(request, pk):
+    """The full diff of one change log, as an HTML fragment for the entry history."""
+    log = get_object_or_404(EntryChangeLog, pk=pk, project=current_project(request))
+    return render(request, 'ledger/entry_change.html', {'rows': _change_rows(log.changes, _related_labels())})
 
 
 @login_required
 def supplier_list(request):
+    # Suppliers are shared; the counts and totals are the current project's.
+    in_project = Q(constructionentry__project=current_project(request))
     suppliers = (
         Supplier.objects.annotate(
-            entry_count=Count('constructionentry'),
-            total_cost=Sum('constructionentry__cost'),
+            entry_count=Count('constructionentry', filter=in_project),
+            total_cost=Sum('constructionentry__cost', filter=in_project),
         )
     )
 
@@ -218,16 +469,24 @@ def supplier_list(request):
 
 
 @login_required
-def supplier_detail(request, pk):
-    supplier = get_object_or_404(Supplier, pk=pk)
+def supplier_autocomplete(request):
+    """Return up to 20 suppliers whose name contains ?q=, as JSON."""
+    query = request.GET.get('q', '').strip().lower()
+    results = []
+    for pk, name in supplier_choices():
+        if query in name.lower():
+            results.append({'id': pk, 'name': name})
+            if len(results) == 20:
+                break
+    return JsonResponse({'results': results})
+
+
+@login_required
+async def supplier_detail(request, pk):
+    project = await sync_to_async(current_project)(request)
     entries = (
         ConstructionEntry.objects
-        .filter(supplier=supplier)
-        .select_related('type_description')
-    )
-    totals = entries.aggregate(
-        total_cost=Sum('cost'),
-        entry_count=Count('id'),
+        .filter(project=project, supplier_id=pk)
     )
 
     lm_map = {'L': 'Labor', 'M': 'Materials', 'U': 'Utility', 'X': 'Transfer'}
@@ -237,20 +496,26 @@ def supplier_detail(request, pk):
         .annotate(total=Sum('cost'), count=Count('id'))
         .order_by('lm')
     )
-    lm_subtotals = [
-        {'code': s['lm'], 'label': lm_map.get(s['lm'], s['lm']), 'total': s['total'], 'count': s['count']}
-        for s in lm_subtotals
-    ]
 
     sort = request.GET.get('sort', 'date')
     direction = request.GET.get('dir', 'desc')
-    valid_sorts = ['date', 'description', 'type_description__code', 'lm', 'cost', 'posted']
+    valid_sorts = ['date', 'description', 'type_code', 'lm', 'cost', 'posted']
     if sort not in valid_sorts:
         sort = 'date'
     order_prefix = '-' if direction == 'desc' else ''
-    entries = entries.order_by(f'{order_prefix}{sort}', 'id')
 
-    return render(request, 'ledger/supplier_detail.html', {
+    supplier, totals, lm_subtotals, entries = await asyncio.gather(
+        aget_object_or_404(Supplier, pk=pk),
+        entries.aaggregate(total_cost=Sum('cost'), entry_count=Count('id')),
+        _alist(lm_subtotals),
+        _alist(entries.only(*SUPPLIER_ENTRY_COLUMNS).order_by(f'{order_prefix}{sort}', 'id')),
+    )
+    lm_subtotals = [
+        {'code': s['lm'], 'label': lm_map.get(s['lm'], s['lm']), 'total': s['total'], 'count': s['count']}
+        for s in lm_subtotals
+    ]
+
+    return await _arender(request, 'ledger/supplier_detail.html', {
         'supplier': supplier,
         'entries': entries,
         'totals': totals,
@@ -263,54 +528,63 @@ def supplier_detail(request, pk):
 @login_required
 @permission_required('ledger.change_constructionentry', raise_exception=True)
 def entry_edit(request, pk):
-    entry = get_object_or_404(ConstructionEntry, pk=pk)
+    entry = get_object_or_404(ConstructionEntry, pk=pk, project=current_project(request))
     if request.method == 'POST':
-        old_values = {
-            f: str(getattr(entry, f)) if getattr(entry, f) is not None else ''
-            for f in ConstructionEntryForm.Meta.fields
-        }
-        form = ConstructionEntryForm(request.POST, instance=entry)
+        form = EntryEditForm(request.POST, instance=entry)
         if form.is_valid():
-            form.save()
-            changes = {
-                f: {'old': old_values[f], 'new': str(getattr(entry, f)) if getattr(entry, f) is not None else ''}
-                for f in ConstructionEntryForm.Meta.fields
-                if (str(getattr(entry, f)) if getattr(entry, f) is not None else '') != old_values[f]
-            }
-            if changes:
-                _log_entry_change(entry, request.user, 'edit', changes)
+            if form.cleaned_data['version'] is None:
+                # Nothing to check the edit against, so it cannot overwrite silently.
+                return _entry_conflict(request, entry)
+            try:
+                # Its own block, so a conflict rolls back only the attempted save.
+                with transaction.atomic():
+                    form.save(commit=False).save(expected_version=form.cleaned_data['version'])
+            except EntryConflict:
+                return _entry_conflict(request, entry)
             return redirect('ledger:entry_detail', pk=entry.pk)
     else:
-        form = ConstructionEntryForm(instance=entry)
+        form = EntryEditForm(instance=entry)
     return render(request, 'ledger/entry_edit.html', {'form': form, 'entry': entry})
 
 
+def _entry_conflict(request, mine):
+    """
+    Re-render the edit form after a concurrent edit won: the user's values
+    against the saved ones, and the current version so saving again
+    overwrites them knowingly.
+    """
+    current = ConstructionEntry.objects.filter(pk=mine.pk).first()
+    if current is None:
+        messages.error(request, f'Entry #{mine.pk} was deleted by someone else; your changes were not saved.')
+        return redirect('ledger:entry_list')
+    changes = {
+        name: {'old': getattr(current, attname), 'new': getattr(mine, attname)}
+        for name, attname in ConstructionEntry.tracked_fields()
+        if getattr(current, attname) != getattr(mine, attname)
+    }
+    data = request.POST.copy()
+    data['version'] = current.version
+    return render(request, 'ledger/entry_edit.html', {
+        'form': EntryEditForm(data, instance=current),
+        'entry': current,
+        'conflict': _change_rows(changes, _related_labels()),
+    }, status=409)
+
+
 @login_required
 @permission_required('ledger.add_constructionentry', raise_exception=True)
 def entry_create(request):
     if request.method == 'POST':
-        form = ConstructionEntryForm(request.POST)
+        # The project is set first so the form can refuse dates in its closed periods.
+        form = ConstructionEntryForm(request.POST, instance=ConstructionEntry(project=current_project(request)))
         if form.is_valid():
             entry = form.save()
-            _log_entry_change(entry, request.user, 'create')
             return redirect('ledger:entry_detail', pk=entry.pk)
     else:
         form = ConstructionEntryForm()
     return render(request, 'ledger/entry_create.html', {'form': form})
 
 
-def _log_entry_change(entry, user, action, changes=None, notes=''):
-    """Record a create/edit/split action on a ConstructionEntry."""
-    EntryChangeLog.objects.create(
-        entry=entry,
-        entry_id_snapshot=entry.pk if entry else None,
-        user=user,
-        action=action,
-        changes=changes or {},
-        notes=notes,
-    )
-
-
 def _divide_amount(amount, n):
     """Divide a decimal amount into n parts, putting any remainder on the first."""
     if amount is None:
@@ -328,7 +602,7 @@ def _divide_amount(amount, n):
 def entry_split(request, pk):
     entry = get_object_or_404(
         ConstructionEntry.objects.select_related('supplier', 'type_description'),
-        pk=pk,
+        pk=pk, project=current_project(request),
     )
     money_fields = ['cost', 'supplies_cost', 'tax_fees', 'invoiced_amt', 'estimate']
 
@@ -336,11 +610,19 @@ def entry_split(request, pk):
         num_splits = int(request.POST.get('num_splits', 2))
         SplitFormSet = formset_factory(ConstructionEntryForm, extra=0)
         formset = SplitFormSet(request.POST)
+        for form in formset:
+            # Before validation, so clean() checks closed periods as in
+            # entry_edit. The parts replace the entry, so its date counts
+            # as their saved date.
+            form.instance.project = entry.project
+            form.instance.date = entry.date
         if formset.is_valid():
-            for form in formset:
-                form.save()
-            _log_entry_change(entry, request.user, 'split', notes=f"Split into {num_splits} parts")
-            entry.delete()
+            with transaction.atomic():
+                for form in formset:
+                    form.save()
+                entry.change_action = 'split'
+                entry.change_note = f"Split into {num_splits} parts"
+                entry.delete()
             return redirect('ledger:entry_list')
         return render(request, 'ledger/entry_split.html', {
             'entry': entry,
@@ -384,6 +666,204 @@ def entry_split(request, pk):
     })
 
 
+@login_required
+def duplicate_list(request):
+    project = current_project(request)
+    suspects = (
+        DuplicateSuspect.objects.filter(entry__project=project, status='open')
+        .select_related('entry__supplier', 'original')
+        .order_by('entry__supplier__name', 'entry__date', 'id')
+    )
+    paginator = Paginator(suspects, 25)
+    last_scan = Job.objects.filter(project=project, kind='detect_duplicates').order_by('-created_at').first()
+    return render(request, 'ledger/duplicate_list.html', {
+        'page_obj': paginator.get_page(request.GET.get('page')),
+        'last_scan': last_scan,
+    })
+
+
+@login_required
+@permission_required('ledger.change_constructionentry', raise_exception=True)
+@require_POST
+def duplicate_scan(request):
+    job = enqueue('detect_duplicates', project=current_project(request), user=request.user)
+    messages.success(request, 'Duplicate detection queued.')
+    return redirect('ledger:job_detail', pk=job.pk)
+
+
+@login_required
+@permission_required('ledger.change_constructionentry', raise_exception=True)
+@require_POST
+def duplicate_dismiss(request, pk):
+    suspect = get_object_or_404(DuplicateSuspect, pk=pk, entry__project=current_project(request), status='open')
+    dismiss_suspect(suspect, request.user)
+    messages.success(request, f'Entry #{suspect.entry_id} marked as not a duplicate.')
+    return redirect('ledger:duplicate_list')
+
+
+@login_required
+@permission_required('ledger.delete_constructionentry', raise_exception=True)
+@require_POST
+def duplicate_delete(request, pk):
+    """Delete the later entry of a suspected pair; its other suspects go with it."""
+    suspect = get_object_or_404(
+        DuplicateSuspect.objects.select_related('entry'), pk=pk, entry__project=current_project(request), status='open',
+    )
+    entry = suspect.entry
+    entry_pk = entry.pk
+    entry.change_note = f'Duplicate of entry #{suspect.original_id}'
+    entry.delete()
+    messages.success(request, f'Entry #{entry_pk} deleted as a duplicate of #{suspect.original_id}.')
+    return redirect('ledger:duplicate_list')
+
+
+@login_required
+def period_list(request, form=None):
+    project = current_project(request)
+    return render(request, 'ledger/period_list.html', {
+        'closes': PeriodClose.objects.filter(project=project).select_related('closed_by'),
+        'form': form or PeriodCloseForm(project=project),
+    })
+
+
+@login_required
+@permission_required('ledger.add_periodclose', raise_exception=True)
+@require_POST
+def period_close(request):
+    project = current_project(request)
+    form = PeriodCloseForm(request.POST, project=project)
+    if not form.is_valid():
+        return period_list(request, form)
+    try:
+        close = close_period(project, form.end, request.user)
+    except ValueError as e:
+        messages.error(request, str(e))
+    else:
+        messages.success(request, f'Closed {close.entry_count} entries through {close.end:%Y-%m-%d}.')
+    return redirect('ledger:period_list')
+
+
+@login_required
+@permission_required('ledger.delete_periodclose', raise_exception=True)
+@require_POST
+def period_reopen(request, pk):
+    close = get_object_or_404(PeriodClose, pk=pk, project=current_project(request))
+    try:
+        reopen_period(close)
+    except ValueError as e:
+        messages.error(request, str(e))
+    else:
+        messages.success(request, f'Reopened the period ending {close.end:%Y-%m-%d}.')
+    return redirect('ledger:period_list')
+
+
+@login_required
+def reconciliation(request):
+    filters = reconciliation_filter_values(request.GET)
+    summaries = filter_summaries(
+        InvoiceSummary.objects.filter(project=current_project(request)).select_related('supplier'), filters,
+    )
+    totals = summaries.aggregate(
+        invoice_count=Count('id'),
+        cost_total=Sum('cost_total'),
+        invoiced_total=Sum('invoiced_total'),
+        difference=Sum('difference'),
+    )
+    paginator = Paginator(summaries, 50)
+    suppliers, supplier_search = supplier_select_choices(filters['supplier'])
+    return render(request, 'ledger/reconciliation.html', {
+        'page_obj': paginator.get_page(request.GET.get('page')),
+        'totals': totals,
+        'suppliers': suppliers,
+        'supplier_search': supplier_search,
+        'status_choices': InvoiceSummary.STATUS_CHOICES,
+        'current_filters': filters,
+        'filter_query': urlencode(filters),
+    })
+
+
+# Rows read from the database per step of reconciliation_export.
+EXPORT_CHUNK = 2000
+
+
+class _Echo:
+    """File-like object whose write() returns the line, so csv.writer can feed a stream."""
+
+    def write(self, value):
+        return value
+
+
+@login_required
+async def reconciliation_export(request):
+    """Stream the entries of the filtered invoices as CSV, without building the file first."""
+    project = await sync_to_async(current_project)(request)
+    summaries = filter_summaries(
+        InvoiceSummary.objects.filter(project=project), reconciliation_filter_values(request.GET),
+    )
+    fields = [field for field, _ in EXPORT_COLUMNS]
+    rows = (
+        summary_entries(summaries).order_by('supplier__name', 'invoice_number', 'date', 'id')
+        .values_list(*fields).iterator(chunk_size=EXPORT_CHUNK)
+    )
+    read_chunk = sync_to_async(lambda: list(islice(rows, EXPORT_CHUNK)))
+    writer = csv.writer(_Echo())
+
+    # An async generator, so ASGI servers send each chunk as it is read;
+    # Django would collect a sync one into a list first.
+    async def lines():
+        yield writer.writerow([label for _, label in EXPORT_COLUMNS])
+        while chunk := await read_chunk():
+            for row in chunk:
+                yield writer.writerow(['' if v is None else v for v in row])
+
+    response = StreamingHttpResponse(lines(), content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="reconciliation.csv"'
+    return response
+
+
+@login_required
+@permission_required('ledger.change_constructionentry', raise_exception=True)
+@require_POST
+def reconciliation_rebuild(request):
+    job = enqueue('rebuild_invoice_summaries', project=current_project(request), user=request.user)
+    messages.success(request, 'Invoice summary rebuild queued.')
+    return redirect('ledger:job_detail', pk=job.pk)
+
+
+@login_required
+@permission_required('ledger.change_supplier', raise_exception=True)
+def supplier_duplicates(request):
+    """Clusters of suppliers with similar names, proposed for merging."""
+    clusters = SupplierIndex.build().clusters()
+    ids = [pk for cluster in clusters for pk in cluster]
+    suppliers = Supplier.objects.filter(pk__in=ids).annotate(entry_count=Count('constructionentry'))
+    by_id = {s.pk: s for s in suppliers}
+    clusters = [
+        sorted((by_id[pk] for pk in cluster if pk in by_id), key=lambda s: (-s.entry_count, s.name))
+        for cluster in clusters
+    ]
+    return render(request, 'ledger/supplier_duplicates.html', {'clusters': [c for c in clusters if len(c) > 1]})
+
+
+@login_required
+@permission_required('ledger.change_supplier', raise_exception=True)
+@require_POST
+def supplier_merge(request):
+    target_id = request.POST.get('target', '')
+    target = Supplier.objects.filter(pk=target_id).first() if target_id.isdigit() else None
+    merge_ids = [pk for pk in request.POST.getlist('merge') if pk.isdigit()]
+    sources = list(Supplier.objects.filter(pk__in=merge_ids).exclude(pk=target.pk)) if target else []
+    if not sources:
+        messages.error(request, 'Choose the supplier to keep and at least one other to merge into it.')
+        return redirect('ledger:supplier_duplicates')
+    moved = merge_suppliers(target, sources)
+    messages.success(
+        request,
+        f'Merged {", ".join(s.name for s in sources)} into "{target.name}"; {moved} entries reassigned.',
+    )
+    return redirect('ledger:supplier_duplicates')
+
+
 @login_required
 @permission_required('ledger.change_supplier', raise_exception=True)
 def supplier_rename(request, pk):
@@ -409,8 +889,7 @@ def supplier_rename(request, pk):
 
         if existing and confirm:
             # Merge: reassign all entries to existing supplier, delete this one
-            ConstructionEntry.objects.filter(supplier=supplier).update(supplier=existing)
-            supplier.delete()
+            merge_suppliers(existing, [supplier])
             messages.success(request, f'Merged "{supplier.name}" into "{existing.name}". All entries reassigned.')
             return redirect('ledger:supplier_detail', pk=existing.pk)
 
@@ -425,18 +904,37 @@ def supplier_rename(request, pk):
 
 
 @login_required
-def audit_log(request):
-    logs = EntryChangeLog.objects.select_related('entry', 'user').order_by('-timestamp')
-    paginator = Paginator(logs, 50)
-    page_obj = paginator.get_page(request.GET.get('page'))
-    return render(request, 'ledger/audit_log.html', {'page_obj': page_obj})
+async def audit_log(request):
+    project = await sync_to_async(current_project)(request)
+    filters = audit_filter_values(request.GET)
+    logs = filter_logs(EntryChangeLog.objects.filter(project=project), filters)
+    paginator = Paginator(logs.select_related('user').order_by('-timestamp'), 50)
+    page_obj, users = await asyncio.gather(
+        sync_to_async(_get_page)(paginator, request.GET.get('page')),
+        # Everyone with a log in the project, including superusers who are
+        # not members; each check is a lookup on the (project, user) index.
+        _alist(
+            get_user_model().objects
+            .filter(Exists(EntryChangeLog.objects.filter(project=project, user_id=OuterRef('pk'))))
+            .order_by('username').values_list('id', 'username')
+        ),
+    )
+    return await _arender(request, 'ledger/audit_log.html', {
+        'page_obj': page_obj,
+        'users': users,
+        'action_choices': EntryChangeLog.ACTION_CHOICES,
+        'model_choices': EntryChangeLog.MODEL_CHOICES,
+        'field_names': ConstructionEntryForm.Meta.fields,
+        'current_filters': filters,
+        'filter_query': urlencode(filters),
+    })
 
 
 @login_required
 def user_list(request):
     if not request.user.is_staff:
         raise PermissionDenied
-    users = get_user_model().objects.prefetch_related('groups').order_by('username')
+    users = get_user_model().objects.prefetch_related('groups', 'ledger_projects').order_by('username')
     return render(request, 'ledger/user_list.html', {'users': users})
 
 
@@ -474,13 +972,9 @@ def user_edit(request, pk):
 
 def _group_form_initial(group):
     """Return initial permission codenames for a group, filtered to ledger permissions."""
-    known = {code for code, _, _ in LEDGER_PERMISSIONS}
-    return list(
-        group.permissions
-        .filter(content_type__app_label='ledger')
-        .values_list('codename', flat=True)
-        .filter(codename__in=known)
-    )
+    codes = {pk: code for code, pk in ledger_permission_ids().items()}
+    granted = Group.permissions.through.objects.filter(group=group).values_list('permission_id', flat=True)
+    return [codes[pk] for pk in granted if pk in codes]
 
 
 def _perm_categories(checked_codes):
@@ -500,30 +994,23 @@ def _perm_categories(checked_codes):
 
 def _save_group_permissions(group, codenames):
     """Set a group's permissions to the given ledger codenames."""
-    perms = Permission.objects.filter(
-        codename__in=codenames,
-        content_type__app_label='ledger',
-    )
-    group.permissions.set(perms)
+    ids = ledger_permission_ids()
+    group.permissions.set([ids[code] for code in codenames if code in ids])
 
 
 @login_required
 def group_list(request):
     if not request.user.is_staff:
         raise PermissionDenied
-    groups = Group.objects.prefetch_related('permissions').annotate(
-        member_count=Count('user')
-    ).order_by('name')
-    known_codes = {code for code, _, _ in LEDGER_PERMISSIONS}
+    groups = Group.objects.annotate(member_count=Count('user')).order_by('name')
     perm_labels = {code: label for code, label, _ in LEDGER_PERMISSIONS}
-    group_data = []
-    for g in groups:
-        active = [
-            perm_labels[p.codename]
-            for p in g.permissions.all()
-            if p.codename in known_codes
-        ]
-        group_data.append({'group': g, 'active_perms': active})
+    labels = {pk: perm_labels[code] for code, pk in ledger_permission_ids().items()}
+    granted = {}
+    for group_id, permission_id in Group.permissions.through.objects.filter(
+        permission_id__in=labels,
+    ).order_by('permission_id').values_list('group_id', 'permission_id'):
+        granted.setdefault(group_id, []).append(labels[permission_id])
+    group_data = [{'group': g, 'active_perms': granted.get(g.pk, [])} for g in groups]
     return render(request, 'ledger/group_list.html', {'group_data': group_data})
 
 
@@ -588,3 +1075,136 @@ def group_edit(request, pk):
         'perm_categories': _perm_categories(checked),
         'is_create': False,
     })
+
+
+# Permissions needed to start, retry or download each kind of job; they match
+# the views that queue the job.
+JOB_PERMISSIONS = {
+    'import_workbook': ['ledger.add_constructionentry', 'ledger.delete_constructionentry'],
+    'export_entries': ['ledger.view_constructionentry'],
+    'detect_duplicates': ['ledger.change_constructionentry'],
+    'rebuild_invoice_summaries': ['ledger.change_constructionentry'],
+}
+
+
+def _can_run(user, kind):
+    return user.has_perms(JOB_PERMISSIONS[kind])
+
+
+def _can_import(user):
+    return _can_run(user, 'import_workbook')
+
+
+@login_required
+def job_list(request):
+    jobs = Job.objects.filter(project=current_project(request)).select_related('created_by').order_by('-created_at')[:50]
+    return render(request, 'ledger/job_list.html', {
+        'jobs': jobs,
+        'upload_form': WorkbookUploadForm() if _can_import(request.user) else None,
+    })
+
+
+@login_required
+@require_POST
+def job_import(request):
+    """Store an uploaded workbook and show its preview; nothing is imported until confirmed."""
+    if not _can_import(request.user):
+        raise PermissionDenied
+    form = WorkbookUploadForm(request.POST, request.FILES)
+    project = current_project(request)
+    if not form.is_valid():
+        jobs = Job.objects.filter(project=project).select_related('created_by').order_by('-created_at')[:50]
+        return render(request, 'ledger/job_list.html', {'jobs': jobs, 'upload_form': form})
+    job = enqueue(
+        'import_workbook', project=project, user=request.user, file=form.cleaned_data['file'],
+        params={'preview': form.preview}, status='uploaded',
+    )
+    return redirect('ledger:job_detail', pk=job.pk)
+
+
+@login_required
+@require_POST
+def job_confirm(request, pk):
+    if not _can_import(request.user):
+        raise PermissionDenied
+    job = get_object_or_404(Job, pk=pk, project=current_project(request), kind='import_workbook')
+    form = ImportConfirmForm(request.POST)
+    if not form.is_valid():
+        messages.error(request, "Tick the box to confirm that the workbook replaces the project's entries.")
+    elif Job.objects.filter(pk=pk, status='uploaded').update(status='queued'):
+        messages.success(request, 'Import queued.')
+    return redirect('ledger:job_detail', pk=pk)
+
+
+@login_required
+@require_POST
+def job_retry(request, pk):
+    """Queue a failed job again; an import continues after its last committed row."""
+    job = get_object_or_404(Job, pk=pk, project=current_project(request))
+    if not _can_run(request.user, job.kind):
+        raise PermissionDenied
+    if Job.objects.filter(pk=pk, status='failed').update(status='queued', finished_at=None):
+        messages.success(request, 'Job queued again.')
+    return redirect('ledger:job_detail', pk=pk)
+
+
+@login_required
+@require_POST
+def job_export(request):
+    if not _can_run(request.user, 'export_entries'):
+        raise PermissionDenied
+    job = enqueue(
+        'export_entries', project=current_project(request), user=request.user,
+        params=entry_filter_values(request.POST),
+    )
+    messages.success(request, 'Export queued.')
+    return redirect('ledger:job_detail', pk=job.pk)
+
+
+@login_required
+def job_detail(request, pk):
+    job = get_object_or_404(Job.objects.select_related('created_by'), pk=pk, project=current_project(request))
+    return render(request, 'ledger/job_detail.html', {
+        'job': job,
+        'headers': WORKBOOK_HEADERS,
+        'confirm_form': ImportConfirmForm() if job.status == 'uploaded' and _can_import(request.user) else None,
+    })
+
+
+@login_required
+def job_status(request, pk):
+    job = get_object_or_404(Job, pk=pk, project=current_project(request))
+    return JsonResponse({
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'progress': job.progress,
+        'total': job.total,
+        'percent': job.percent,
+        'message': job.message,
+        'finished': job.status in ('done', 'failed'),
+        'has_result': bool(job.result_file),
+        'last_row': job.last_row,
+    })
+
+
+@login_required
+def job_download(request, pk):
+    job = get_object_or_404(Job, pk=pk, project=current_project(request))
+    if not _can_run(request.user, job.kind):
+        raise PermissionDenied
+    if not job.result_file:
+        messages.error(request, 'This job has no file to download.')
+        return redirect('ledger:job_detail', pk=pk)
+    return FileResponse(job.result_file.open('rb'), as_attachment=True, filename=os.path.basename(job.result_file.name))
+
+
+@login_required
+@require_POST
+def project_switch(request):
+    project_id = request.POST.get('project', '')
+    project = user_projects(request.user).filter(pk=project_id).first() if project_id.isdigit() else None
+    if project is None:
+        messages.error(request, 'Choose one of your projects.')
+    else:
+        set_current_project(request, project)
+    return redirect('ledger:dashboard')